@@ -3,6 +3,12 @@ ASGI config for la_rose_boutique project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served in production by gunicorn with uvicorn workers (see Procfile):
+
+    gunicorn la_rose_boutique.asgi:application -k uvicorn.workers.UvicornWorker
+
+The cart and stock JSON views are async; the other views still run in a thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
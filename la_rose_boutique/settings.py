@@ -6,6 +6,7 @@ Generated by 'django-admin startproject' using Django 4.2.24.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv # Importe la fonction de lecture
 
 # Charge les variables d'environnement du fichier .env
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'store.cart.CartMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -71,6 +73,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'store.context_processors.cart_processor',
+                'store.context_processors.shop_config_processor',
             ],
         },
     },
@@ -88,6 +91,74 @@ DATABASES = {
 }
 
 
+# -----------------------------------------------
+# CACHE PARTAGÉ ENTRE LES WORKERS GUNICORN
+# -----------------------------------------------
+# Redis si REDIS_URL est fourni, sinon un cache fichier commun à tous les workers de la machine.
+# (Le cache mémoire par défaut de Django est propre à chaque processus : il ne permet pas
+# d'invalider le cache du catalogue dans tous les workers.)
+# Les versions qui invalident le cache sont tenues en base (store.cache) : le cache fichier
+# reste correct entre workers, mais Redis est recommandé en production.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tempfile.gettempdir(), 'la_rose_boutique_cache'),
+            # Le défaut (300 entrées) ne couvre pas les pages du catalogue, les fiches de
+            # variantes et les sessions : au-delà, le cache élimine un tiers de ses fichiers.
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+
+# Sessions lues depuis le cache partagé (écrites aussi en base) : le panier ne coûte plus
+# une requête sur django_session à chaque page.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Durée de vie (secondes) des pages du catalogue en cache ; invalidées dès qu'un article change
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 600))
+
+# Nombre d'articles par page (pagination par curseur de la boutique et de l'admin du catalogue)
+STORE_PAGE_SIZE = 24
+ADMIN_PRODUCT_PAGE_SIZE = 50
+# Nombre de commandes par page de la liste des commandes (admin)
+ADMIN_ORDER_PAGE_SIZE = 50
+
+# Durée de vie (secondes) des statistiques de ventes en cache ; recalculées dès qu'une commande change
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 3600))
+
+
+# -----------------------------------------------
+# FLUX SSE DU STOCK
+# -----------------------------------------------
+# À n'activer que si l'application est servie en ASGI : sous un worker WSGI synchrone,
+# chaque connexion ouverte bloquerait un worker. Les pages repassent sinon au polling.
+STOCK_STREAM_ENABLED = os.environ.get('STOCK_STREAM_ENABLED', 'False') == 'True'
+# Durée maximale (secondes) d'une connexion ; le navigateur se reconnecte ensuite automatiquement
+STOCK_STREAM_MAX_AGE = int(os.environ.get('STOCK_STREAM_MAX_AGE', 300))
+
+# Stockage du panier (quantités par variante) : session (en base, défaut),
+# cookie signé (store.cart.SignedCookieCartBackend) ou cache (store.cart.CacheCartBackend)
+CART_BACKEND = os.environ.get('CART_BACKEND', 'store.cart.SessionCartBackend')
+# Durée de vie (secondes) du panier pour les stockages cookie et cache
+CART_MAX_AGE = int(os.environ.get('CART_MAX_AGE', 60 * 60 * 24 * 30))
+# Durée (secondes) de réservation du stock des articles mis au panier (voir store/reservations.py)
+STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 15 * 60))
+
+# Clés d'idempotence des POST (voir store/idempotency.py) : durée de conservation des réponses,
+# et attente maximale (secondes) d'un renvoi arrivé pendant le traitement de la première requête
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 10 * 60))
+IDEMPOTENCY_WAIT = 10
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Statistiques de ventes : meilleures ventes (chiffre d'affaires et unités), chiffre
+d'affaires par jour ou par semaine et par catégorie, panier moyen.
+
+Les colonnes utiles des articles de commande sont lues directement depuis le curseur,
+par blocs de CHUNK_SIZE lignes, dans des tableaux NumPy (sans conversion ligne à ligne
+par l'ORM) ; les regroupements sont ensuite vectorisés (np.unique + np.bincount) au lieu
+d'une boucle Python par article. Les montants sont calculés en centimes entiers par la
+base (int64), donc sans erreur d'arrondi ; le jour local est calculé par NumPy.
+
+Le rapport complet (sales_report) est mis en cache sous la version du cumul des ventes
+(orders.sales.sales_watermark) : il n'est recalculé qu'après une écriture de commande.
+Les commandes annulées sont exclues.
+"""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from store.models import Category, Product
+
+from .models import Order, OrderItem
+from .sales import sales_watermark
+
+# Lignes lues par bloc (mémoire bornée pendant la lecture)
+CHUNK_SIZE = 20000
+
+EXCLUDED_STATUSES = ('Cancelled',)
+
+# Identifiant utilisé pour les articles ou catégories supprimés depuis la commande
+MISSING_ID = -1
+
+ITEM_COLUMNS = {
+    'product': np.int64,
+    'category': np.int64,
+    'created_at': 'datetime64[us]',
+    'quantity': np.int64,
+    'revenue': np.int64,
+}
+
+ORDER_COLUMNS = {
+    'item_count': np.int64,
+    'items_total': np.int64,
+    'total': np.int64,
+}
+
+
+def _cents(expression):
+    """Montant Decimal -> centimes entiers, calculé par la base."""
+    return Cast(Round(expression * 100), IntegerField())
+
+
+def _utc_values(column):
+    """Instants UTC sans fuseau (chaînes SQLite ou datetime, éventuellement avec fuseau)."""
+    if column and isinstance(column[0], datetime) and column[0].tzinfo is not None:
+        return [value.astimezone(dt_timezone.utc).replace(tzinfo=None) for value in column]
+    return column
+
+
+def fetch_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Lignes brutes du curseur, par blocs de `chunk_size` : les valeurs ne passent pas par
+    les conversions ligne à ligne de l'ORM (Decimal, dates), faites ensuite par NumPy.
+    Le queryset ne doit sélectionner que des annotations (voir _select).
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+
+def load_columns(chunks, dtypes):
+    """Assemble les blocs de lignes en un tableau NumPy par colonne : {nom: tableau}, dans l'ordre de `dtypes`."""
+    arrays = {name: [] for name in dtypes}
+    for rows in chunks:
+        for (name, dtype), column in zip(dtypes.items(), zip(*rows)):
+            if np.dtype(dtype).kind == 'M':
+                column = _utc_values(column)
+            arrays[name].append(np.array(column, dtype=dtype))
+    return {
+        name: np.concatenate(arrays[name]) if arrays[name] else np.empty(0, dtype=dtype)
+        for name, dtype in dtypes.items()
+    }
+
+
+def _select(queryset, expressions):
+    # Uniquement des annotations (alias neutres), dans l'ordre voulu : l'ordre du SELECT est alors garanti
+    aliases = [f"column_{i}" for i in range(len(expressions))]
+    return queryset.order_by().annotate(**dict(zip(aliases, expressions))).values_list(*aliases)
+
+
+def _since_start(since):
+    """Début (aware) du jour local `since` : filtre sur created_at qui peut utiliser l'index."""
+    return timezone.make_aware(datetime.combine(since, datetime.min.time()))
+
+
+def local_days(instants):
+    """
+    Jour local (fuseau courant) de chaque instant UTC. Le décalage horaire est calculé une fois
+    par heure distincte (changements d'heure compris), puis appliqué à tout le tableau.
+    """
+    tz = timezone.get_current_timezone()
+    hours, index = np.unique(instants.astype('datetime64[h]'), return_inverse=True)
+    offsets = np.array([
+        tz.utcoffset(hour.item().replace(tzinfo=dt_timezone.utc).astimezone(tz).replace(tzinfo=None))
+        for hour in hours
+    ], dtype='timedelta64[us]')
+    return (instants + offsets[index]).astype('datetime64[D]')
+
+
+def item_columns(since=None, chunk_size=CHUNK_SIZE):
+    """
+    Colonnes des articles vendus (depuis la date `since`) : produit, catégorie, jour local,
+    quantité et montant de la ligne en centimes.
+    """
+    items = OrderItem.objects.exclude(order__status__in=EXCLUDED_STATUSES)
+    if since is not None:
+        items = items.filter(order__created_at__gte=_since_start(since))
+    columns = load_columns(fetch_chunks(_select(items, [
+        Coalesce(F('product_id'), Value(MISSING_ID)),
+        Coalesce(F('product__category_id'), Value(MISSING_ID)),
+        F('order__created_at'),
+        F('quantity'),
+        _cents(F('price') * F('quantity')),
+    ]), chunk_size), ITEM_COLUMNS)
+    columns['day'] = local_days(columns.pop('created_at'))
+    return columns
+
+
+def order_columns(since=None, chunk_size=CHUNK_SIZE):
+    """Colonnes des commandes (depuis la date `since`) : lignes, unités, montant des articles."""
+    orders = Order.objects.exclude(status__in=EXCLUDED_STATUSES)
+    if since is not None:
+        orders = orders.filter(created_at__gte=_since_start(since))
+    return load_columns(fetch_chunks(_select(orders, [
+        F('item_count'), F('items_total'), _cents(F('total_price')),
+    ]), chunk_size), ORDER_COLUMNS)
+
+
+# =========================================================================
+# Agrégations vectorisées
+# =========================================================================
+
+def group_sums(keys, *weights):
+    """
+    Regroupe par clé : retourne (clés distinctes triées, somme de chaque tableau de `weights`).
+    Équivalent vectorisé d'un dictionnaire {clé: total} rempli ligne à ligne.
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [
+        np.bincount(inverse, weights=values, minlength=len(unique)).astype(np.int64)
+        for values in weights
+    ]
+
+
+def best_sellers(columns, by='revenue', limit=10):
+    """
+    Articles les plus vendus, triés par chiffre d'affaires (by='revenue') ou par unités (by='units').
+    Retourne [(id de produit, unités, centimes), ...].
+    """
+    products, (units, revenue) = group_sums(columns['product'], columns['quantity'], columns['revenue'])
+    ranking = revenue if by == 'revenue' else units
+    # Tri décroissant stable (à égalité : plus petit id d'abord)
+    top = np.argsort(-ranking, kind='stable')[:limit]
+    return [(int(products[i]), int(units[i]), int(revenue[i])) for i in top]
+
+
+def period_starts(days, period='day'):
+    """Premier jour de la période (jour ou semaine commençant le lundi) de chaque date."""
+    if period == 'week':
+        # Le 1er janvier 1970 (jour 0) était un jeudi : décalage de 3 jours vers le lundi
+        ordinals = days.astype(np.int64)
+        return (ordinals - (ordinals + 3) % 7).astype('datetime64[D]')
+    return days
+
+
+def revenue_by_period(columns, period='day'):
+    """
+    Chiffre d'affaires par période et par catégorie : (périodes, catégories, matrice de centimes)
+    où matrice[i, j] est le montant de la période i pour la catégorie j.
+    """
+    periods, period_index = np.unique(period_starts(columns['day'], period), return_inverse=True)
+    categories, category_index = np.unique(columns['category'], return_inverse=True)
+    cells = period_index * len(categories) + category_index
+    matrix = np.bincount(
+        cells, weights=columns['revenue'], minlength=len(periods) * len(categories),
+    ).astype(np.int64).reshape(len(periods), len(categories))
+    return periods, categories, matrix
+
+
+def basket_stats(columns):
+    """Panier moyen : nombre de commandes, lignes, unités et montant (centimes) moyens par commande."""
+    count = len(columns['total'])
+    if not count:
+        return {'orders': 0, 'lines': 0.0, 'units': 0.0, 'amount': 0}
+    return {
+        'orders': count,
+        'lines': float(columns['item_count'].mean()),
+        'units': float(columns['items_total'].mean()),
+        'amount': int(round(columns['total'].mean())),
+    }
+
+
+# =========================================================================
+# Rapport mis en cache pour le tableau de bord
+# =========================================================================
+
+def _money(cents):
+    return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+
+def compute_report(since=None, period='day', limit=10):
+    """Calcule le rapport complet (sans cache) ; les montants sont des Decimal."""
+    items = item_columns(since)
+    by_revenue = best_sellers(items, 'revenue', limit)
+    by_units = best_sellers(items, 'units', limit)
+    periods, categories, matrix = revenue_by_period(items, period)
+
+    # Noms des articles classés et des catégories : deux requêtes
+    product_ids = {product_id for product_id, units, revenue in by_revenue + by_units}
+    product_names = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'name'))
+    category_names = dict(Category.objects.filter(id__in=categories.tolist()).values_list('id', 'name'))
+
+    def sellers(ranking):
+        return [
+            {
+                'product_id': product_id,
+                'name': product_names.get(product_id, "Article supprimé"),
+                'units': units,
+                'revenue': _money(revenue),
+            }
+            for product_id, units, revenue in ranking
+        ]
+
+    basket = basket_stats(order_columns(since))
+    return {
+        'best_sellers_by_revenue': sellers(by_revenue),
+        'best_sellers_by_units': sellers(by_units),
+        'categories': [category_names.get(int(category_id), "Sans catégorie") for category_id in categories],
+        'periods': [
+            {
+                'start': period_start.item(),
+                'total': _money(row.sum()),
+                'by_category': [_money(cents) for cents in row],
+            }
+            for period_start, row in zip(periods, matrix)
+        ],
+        'basket': {**basket, 'amount': _money(basket['amount'])},
+        'lines': len(items['quantity']),
+    }
+
+
+def sales_report(days=90, period='day', limit=10):
+    """
+    Rapport des `days` derniers jours (tout l'historique si days vaut None), mis en cache
+    sous la version du cumul des ventes : relu sans calcul tant qu'aucune commande ne change.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1) if days else None
+    key = f"analytics:report:{sales_watermark()}:{since}:{period}:{limit}"
+    report = cache.get(key)
+    if report is None:
+        report = compute_report(since, period, limit)
+        cache.set(key, report, timeout=getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 3600))
+    return report
@@ -5,3 +5,7 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders' # C'est le nom de l'application (l'étiquette)
     verbose_name = 'Gestion des Commandes' # Nom convivial pour l'Admin Django
+
+    def ready(self):
+        # Enregistre les récepteurs de signaux (cumul quotidien des ventes)
+        from . import signals  # noqa: F401
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Export des commandes et de leurs articles en CSV ou JSONL, en flux.
+
+Les commandes (jointes à leurs articles) sont lues par values_list(...).iterator(chunk_size)
+et écrites ligne par ligne par des générateurs : la mémoire utilisée ne dépend pas du
+nombre de commandes exportées. Utilisé par la vue admin_order_export et par la commande
+export_orders.
+
+- CSV : une ligne par article (colonnes de la commande répétées) ; une commande sans
+  article donne une ligne aux colonnes d'article vides.
+- JSONL : un objet JSON par commande, avec la liste de ses articles.
+
+Sous ASGI, StreamingHttpResponse lit un itérateur synchrone en entier avant d'envoyer le
+premier octet : la vue lui passe alors aexport_lines, qui produit les lignes par blocs.
+"""
+
+import csv
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby, islice
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import Order
+
+FORMATS = ('csv', 'jsonl')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+CHUNK_SIZE = 2000
+
+ORDER_FIELDS = (
+    'id', 'created_at', 'status', 'full_name', 'email', 'phone_number',
+    'address_line_1', 'address_line_2', 'city', 'postal_code', 'country',
+    'payment_method', 'payment_id', 'total_price', 'shipping_cost', 'tax',
+    'item_count', 'items_total',
+)
+
+ITEM_FIELDS = ('product_id', 'product_name', 'size', 'color', 'quantity', 'price')
+
+# En-têtes CSV : champs de la commande, puis ceux de l'article préfixés par item_
+CSV_HEADER = [f"order_{name}" if name == 'id' else name for name in ORDER_FIELDS] + [
+    f"item_{name}" for name in ITEM_FIELDS
+]
+
+
+class ExportError(ValueError):
+    """Filtre d'export invalide (statut, date ou format)."""
+
+
+def parse_filters(status=None, start=None, end=None):
+    """
+    Valide les filtres (chaînes, ex : paramètres GET ou options de commande) et retourne
+    (statut, premier jour, dernier jour) ; lève ExportError si l'un d'eux est invalide.
+    """
+    statuses = {code for code, label in Order.ORDER_STATUS_CHOICES}
+    if status and status not in statuses:
+        raise ExportError(f"Statut inconnu : {status}. Valeurs possibles : {', '.join(sorted(statuses))}.")
+    days = []
+    for value in (start, end):
+        try:
+            days.append(date.fromisoformat(value) if value else None)
+        except ValueError:
+            raise ExportError(f"Date invalide : {value} (format attendu AAAA-MM-JJ).")
+    if days[0] and days[1] and days[0] > days[1]:
+        raise ExportError("La date de début est postérieure à la date de fin.")
+    return status or None, days[0], days[1]
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def export_rows(status=None, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Tuples (champs de la commande..., champs de l'article...) triés par commande puis article,
+    lus par blocs de `chunk_size` lignes. `start` et `end` (dates) sont inclus.
+    """
+    orders = Order.objects.all()
+    if status:
+        orders = orders.filter(status=status)
+    if start:
+        orders = orders.filter(created_at__gte=_day_start(start))
+    if end:
+        orders = orders.filter(created_at__lt=_day_start(end + timedelta(days=1)))
+    return orders.order_by('id', 'items__id').values_list(
+        *ORDER_FIELDS, *(f"items__{name}" for name in ITEM_FIELDS),
+    ).iterator(chunk_size=chunk_size)
+
+
+def _plain(value):
+    """Valeur exportable : dates en heure locale ISO 8601, montants en chaîne exacte."""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : write() renvoie la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Génère le CSV ligne par ligne (en-tête compris)."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def jsonl_lines(rows):
+    """Génère un objet JSON par commande (avec ses articles), une commande par ligne."""
+    order_size = len(ORDER_FIELDS)
+    for order_id, order_rows in groupby(rows, key=lambda row: row[0]):
+        record = None
+        for row in order_rows:
+            if record is None:
+                record = {name: _plain(value) for name, value in zip(ORDER_FIELDS, row)}
+                record['items'] = []
+            item = row[order_size:]
+            # Jointure externe : une commande sans article donne une ligne d'article vide
+            if any(value is not None for value in item):
+                record['items'].append({name: _plain(value) for name, value in zip(ITEM_FIELDS, item)})
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_lines(export_format, rows):
+    if export_format not in FORMATS:
+        raise ExportError(f"Format inconnu : {export_format} (csv ou jsonl).")
+    return csv_lines(rows) if export_format == 'csv' else jsonl_lines(rows)
+
+
+async def aexport_lines(lines, block_size=CHUNK_SIZE):
+    """
+    Itérateur asynchrone sur les lignes d'export (serveur ASGI) : chaque bloc de `block_size`
+    lignes est produit par sync_to_async, dans le thread de la requête (même connexion à la
+    base), puis envoyé avant la lecture du suivant.
+    """
+    next_block = sync_to_async(lambda: ''.join(islice(lines, block_size)))
+    try:
+        while True:
+            block = await next_block()
+            if not block:
+                return
+            yield block
+    finally:
+        # Client déconnecté ou export terminé : le curseur est fermé dans le même thread
+        await sync_to_async(lines.close)()
+
+
+def export_filename(export_format, status=None, start=None, end=None):
+    parts = ['commandes', status, start and start.isoformat(), end and end.isoformat()]
+    return '_'.join(part.lower() for part in parts if part) + f'.{export_format}'
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from orders.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recalcule le cumul quotidien des ventes (DailySales) depuis toutes les commandes."
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Cumul des ventes recalculé : {rows} lignes (jour, statut)."))
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Mesure le moteur de statistiques (orders/analytics.py) sur des articles de commande synthétiques.
+
+Les commandes et articles générés sont écrits dans une transaction annulée à la fin :
+la base n'est pas modifiée. Le rapport compare, sur les mêmes lignes :
+- la lecture en tableaux NumPy par blocs puis les agrégations vectorisées ;
+- une agrégation ligne à ligne en Python (dictionnaires) sur les mêmes colonnes,
+et vérifie que les deux donnent les mêmes résultats. Exemple :
+
+    python manage.py benchmark_analytics --lines 1000000
+"""
+
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from orders import analytics
+from orders.models import Order, OrderItem
+from store.models import Category, Product
+
+MARKER = 'Benchmark statistiques'
+
+
+class Command(BaseCommand):
+    help = "Compare agrégations NumPy et boucle Python sur N articles de commande synthétiques (rien n'est conservé)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1000000, help="Nombre d'articles de commande générés.")
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par les commandes.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.generate(options)
+            self.stdout.write(f"Génération : {options['lines']} articles en {time.perf_counter() - start:.1f} s")
+            self.measure()
+            # Rien de ce qui a été généré n'est conservé
+            transaction.set_rollback(True)
+
+    def generate(self, options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        Category.objects.bulk_create([
+            Category(name=f"{MARKER} {i}", slug=f"benchmark-statistiques-{i}") for i in range(options['categories'])
+        ])
+        categories = list(Category.objects.filter(name__startswith=MARKER))
+        Product.objects.bulk_create([
+            Product(
+                category=rng.choice(categories), name=f"{MARKER} article {i}", slug=f"benchmark-statistiques-article-{i}",
+                price=Decimal(rng.randrange(500, 20000)) / 100, description=MARKER, is_active=False,
+            )
+            for i in range(options['products'])
+        ], batch_size=batch_size)
+        products = list(Product.objects.filter(description=MARKER).values_list('id', 'name', 'price'))
+
+        # created_at est normalement fixé à l'enregistrement : les dates sont réparties sur la période
+        created_at = Order._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            now = timezone.now()
+            remaining = options['lines']
+            while remaining > 0:
+                # Commandes de 1 à 5 lignes, créées par lot avec leurs articles
+                baskets = []
+                while remaining > 0 and len(baskets) < batch_size // 3:
+                    size = min(rng.randint(1, 5), remaining)
+                    baskets.append([(rng.choice(products), rng.randint(1, 4)) for _ in range(size)])
+                    remaining -= size
+                orders = Order.objects.bulk_create([
+                    Order(
+                        full_name=MARKER, email='benchmark@example.com', phone_number='0', address_line_1='-',
+                        city='-', postal_code='-', country='-',
+                        status=rng.choice(('Pending', 'Processing', 'Shipped', 'Completed', 'Completed', 'Cancelled')),
+                        created_at=now - timedelta(days=rng.randrange(options['days']), minutes=rng.randrange(1440)),
+                        total_price=sum(price * quantity for (_, _, price), quantity in basket),
+                        item_count=len(basket), items_total=sum(quantity for _, quantity in basket),
+                    )
+                    for basket in baskets
+                ], batch_size=batch_size)
+                if orders[0].pk is None:
+                    # Base sans RETURNING : ids relus (derniers créés)
+                    ids = Order.objects.filter(full_name=MARKER).order_by('-id').values_list('id', flat=True)
+                    for order, pk in zip(orders, reversed(list(ids[:len(orders)]))):
+                        order.pk = pk
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order, product_id=product_id, product_name=name, quantity=quantity,
+                        price=price, size='TU',
+                    )
+                    for order, basket in zip(orders, baskets)
+                    for (product_id, name, price), quantity in basket
+                ], batch_size=batch_size)
+        finally:
+            created_at.auto_now_add = True
+
+    def measure(self):
+        timings = {}
+
+        start = time.perf_counter()
+        columns = analytics.item_columns()
+        orders = analytics.order_columns()
+        timings['lecture NumPy (par blocs)'] = time.perf_counter() - start
+        memory = sum(array.nbytes for array in columns.values()) + sum(array.nbytes for array in orders.values())
+
+        start = time.perf_counter()
+        vectorized = {
+            'revenue': analytics.best_sellers(columns, 'revenue', 10),
+            'units': analytics.best_sellers(columns, 'units', 10),
+            'day': self.period_table(*analytics.revenue_by_period(columns, 'day')),
+            'week': self.period_table(*analytics.revenue_by_period(columns, 'week')),
+            'basket': self.rounded(analytics.basket_stats(orders)),
+        }
+        timings['agrégation NumPy'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows, order_rows = self.python_rows()
+        timings['lecture Python (listes)'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        looped = self.python_aggregates(rows, order_rows)
+        timings['agrégation Python ligne à ligne'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analytics.compute_report(period='week')
+        timings['rapport complet (sans cache)'] = time.perf_counter() - start
+
+        self.stdout.write(f"Lignes lues : {len(columns['quantity'])}, tableaux NumPy : {memory / 1024 / 1024:.1f} Mo")
+        for label, seconds in timings.items():
+            self.stdout.write(f"  {label:<34} {seconds * 1000:>10.1f} ms")
+        speedup = timings['agrégation Python ligne à ligne'] / max(timings['agrégation NumPy'], 1e-9)
+        self.stdout.write(f"Agrégation : NumPy {speedup:.1f} fois plus rapide que la boucle Python")
+
+        if vectorized == looped:
+            self.stdout.write(self.style.SUCCESS("Résultats identiques (NumPy et boucle Python)."))
+        else:
+            mismatched = [name for name in vectorized if vectorized[name] != looped[name]]
+            self.stdout.write(self.style.ERROR(f"Résultats différents : {', '.join(mismatched)}"))
+
+    def rounded(self, basket):
+        # Moyennes comparées à 1e-6 près (ordre de sommation différent entre NumPy et Python)
+        return {key: round(value, 6) if isinstance(value, float) else value for key, value in basket.items()}
+
+    def period_table(self, periods, categories, matrix):
+        """{(début de période, catégorie): centimes} pour les cellules non nulles."""
+        return {
+            (periods[i].item(), int(categories[j])): int(matrix[i, j])
+            for i, j in zip(*matrix.nonzero())
+        }
+
+    def python_rows(self):
+        items = OrderItem.objects.exclude(order__status__in=analytics.EXCLUDED_STATUSES).order_by()
+        rows = list(items.values_list(
+            Coalesce(F('product_id'), Value(analytics.MISSING_ID)),
+            Coalesce(F('product__category_id'), Value(analytics.MISSING_ID)),
+            TruncDate('order__created_at'),
+            'quantity',
+            'price',
+        ).iterator(chunk_size=analytics.CHUNK_SIZE))
+        order_rows = list(
+            Order.objects.exclude(status__in=analytics.EXCLUDED_STATUSES).order_by()
+            .values_list('item_count', 'items_total', 'total_price').iterator(chunk_size=analytics.CHUNK_SIZE)
+        )
+        return rows, order_rows
+
+    def python_aggregates(self, rows, order_rows):
+        """Mêmes statistiques calculées ligne à ligne, avec des dictionnaires."""
+        per_product = defaultdict(lambda: [0, 0])
+        per_day = defaultdict(int)
+        per_week = defaultdict(int)
+        for product_id, category_id, day, quantity, price in rows:
+            cents = int((price * quantity * 100).to_integral_value())
+            totals = per_product[product_id]
+            totals[0] += quantity
+            totals[1] += cents
+            per_day[day, category_id] += cents
+            per_week[day - timedelta(days=day.weekday()), category_id] += cents
+
+        def top(index):
+            ranked = sorted(per_product.items(), key=lambda item: (-item[1][index], item[0]))[:10]
+            return [(product_id, units, revenue) for product_id, (units, revenue) in ranked]
+
+        count = len(order_rows)
+        basket = {'orders': 0, 'lines': 0.0, 'units': 0.0, 'amount': 0}
+        if count:
+            basket = {
+                'orders': count,
+                'lines': sum(row[0] for row in order_rows) / count,
+                'units': sum(row[1] for row in order_rows) / count,
+                'amount': int(round(sum(int(row[2] * 100) for row in order_rows) / count)),
+            }
+        return {
+            'revenue': top(1),
+            'units': top(0),
+            'day': {key: cents for key, cents in per_day.items() if cents},
+            'week': {key: cents for key, cents in per_week.items() if cents},
+            'basket': self.rounded(basket),
+        }
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Exporte les commandes et leurs articles en CSV ou JSONL, en flux (mémoire constante).
+
+    python manage.py export_orders --format jsonl --status Completed --start 2025-01-01 --end 2025-12-31 -o ventes.jsonl
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.export import CHUNK_SIZE, FORMATS, ExportError, export_lines, export_rows, parse_filters
+
+
+class Command(BaseCommand):
+    help = "Exporte les commandes (avec leurs articles) en CSV ou JSONL, filtrables par statut et par période."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--status', help="Code du statut (Pending, Processing, Shipped, Completed, Cancelled).")
+        parser.add_argument('--start', help="Premier jour inclus (AAAA-MM-JJ).")
+        parser.add_argument('--end', help="Dernier jour inclus (AAAA-MM-JJ).")
+        parser.add_argument('-o', '--output', help="Fichier de sortie (sortie standard par défaut).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Lignes lues par bloc.")
+
+    def handle(self, *args, **options):
+        try:
+            status, start, end = parse_filters(options['status'], options['start'], options['end'])
+        except ExportError as error:
+            raise CommandError(error)
+
+        lines = export_lines(options['format'], export_rows(status, start, end, options['chunk_size']))
+        if not options['output']:
+            sys.stdout.writelines(lines)
+            return
+        # newline='' : les fins de ligne du CSV (\r\n) sont écrites telles quelles
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            count = 0
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"{count} ligne(s) écrite(s) dans {options['output']}."))
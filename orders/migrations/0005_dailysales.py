@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:02
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Cumul initial calculé depuis les commandes existantes (même calcul que orders.sales.rebuild)
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySales = apps.get_model('orders', 'DailySales')
+
+    rows = {}
+    orders = (
+        Order.objects.annotate(day=TruncDate('created_at')).values('day', 'status')
+        .annotate(count=Count('pk'), revenue=Sum('total_price')).order_by()
+    )
+    for row in orders:
+        rows[row['day'], row['status']] = DailySales(
+            day=row['day'], status=row['status'], orders_count=row['count'],
+            revenue=row['revenue'] or Decimal('0.00'),
+        )
+    items = (
+        OrderItem.objects.annotate(day=TruncDate('order__created_at')).values('day', 'order__status')
+        .annotate(quantity=Sum('quantity')).order_by()
+    )
+    for row in items:
+        if (row['day'], row['order__status']) in rows:
+            rows[row['day'], row['order__status']].items_sold = row['quantity'] or 0
+    DailySales.objects.bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_delete_financialtransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('Pending', 'En Attente de Paiement'), ('Processing', 'En Cours de Traitement'), ('Shipped', 'Expédiée'), ('Completed', 'Livrée/Payée'), ('Cancelled', 'Annulée')], max_length=20)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('items_sold', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ventes du jour',
+                'verbose_name_plural': 'Ventes par jour',
+                'ordering': ('-day', 'status'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('day', 'status'), name='orders_dailysales_day_status_uniq'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
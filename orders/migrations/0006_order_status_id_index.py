@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_dailysales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'id'], name='orders_order_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Résumé des articles des commandes existantes, en une seule requête UPDATE
+    from django.db.models import Count, OuterRef, Subquery, Sum, Value
+    from django.db.models.functions import Coalesce
+
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        item_count=Coalesce(Subquery(items.annotate(lines=Count('pk')).values('lines')), Value(0)),
+        items_total=Coalesce(Subquery(items.annotate(units=Sum('quantity')).values('units')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_status_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de lignes'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_total',
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre d'unités"),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0007_order_item_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_status', models.CharField(choices=[('Pending', 'En Attente de Paiement'), ('Processing', 'En Cours de Traitement'), ('Shipped', 'Expédiée'), ('Completed', 'Livrée/Payée'), ('Cancelled', 'Annulée')], max_length=20)),
+                ('new_status', models.CharField(choices=[('Pending', 'En Attente de Paiement'), ('Processing', 'En Cours de Traitement'), ('Shipped', 'Expédiée'), ('Completed', 'Livrée/Payée'), ('Cancelled', 'Annulée')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Changement de statut',
+                'verbose_name_plural': 'Historique des statuts',
+                'ordering': ('-changed_at', '-id'),
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@
 from django.db import models
 from store.models import Product  # Importez le modèle Product depuis l'application 'store'
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from decimal import Decimal  # Pour une gestion précise de l'argent
 
 User = get_user_model()
@@ -35,6 +36,15 @@ class Order(models.Model):
         ('Cancelled', 'Annulée'),
     )
 
+    # Transitions autorisées : statut actuel -> statuts possibles (orders/transitions.py)
+    STATUS_TRANSITIONS = {
+        'Pending': ('Processing', 'Shipped', 'Completed', 'Cancelled'),
+        'Processing': ('Shipped', 'Completed', 'Cancelled'),
+        'Shipped': ('Completed', 'Cancelled'),
+        'Completed': ('Cancelled',),
+        'Cancelled': ('Pending',),
+    }
+
     # Liens
     user = models.ForeignKey(User, related_name='orders', on_delete=models.SET_NULL, null=True, blank=True)
 
@@ -59,15 +69,40 @@ class Order(models.Model):
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     tax = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
 
+    # Résumé des articles, dénormalisé : écrit à la création (store.checkout.place_order)
+    # puis recalculé à chaque modification d'un article (orders/signals.py)
+    item_count = models.PositiveIntegerField(default=0, verbose_name="Nombre de lignes")
+    items_total = models.PositiveIntegerField(default=0, verbose_name="Nombre d'unités")
+
     # Paiement
     payment_method = models.CharField(max_length=50, blank=True, null=True)
     payment_id = models.CharField(max_length=250, blank=True, null=True)
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            # Liste admin filtrée par statut, paginée par id décroissant
+            models.Index(fields=['status', 'id'], name='orders_order_status_id_idx'),
+        ]
         verbose_name = 'Commande'
         verbose_name_plural = 'Commandes'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémorise le statut et le montant chargés pour reporter leur changement dans le cumul des ventes
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_total_price = instance.__dict__.get('total_price')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        # Les valeurs relues (ex : après un changement par lot) deviennent les valeurs chargées
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
+        if fields is None or 'total_price' in fields:
+            self._loaded_total_price = self.total_price
+
     def __str__(self):
         return f"Order {self.id} - {self.full_name}"
 
@@ -79,6 +114,22 @@ class Order(models.Model):
         """Retourne uniquement le prix total des articles (sans livraison ni taxes)."""
         return self.total_price
 
+    @classmethod
+    def statuses_allowed_to(cls, new_status):
+        """Statuts depuis lesquels une commande peut passer à `new_status`."""
+        return [status for status, targets in cls.STATUS_TRANSITIONS.items() if new_status in targets]
+
+    def allowed_statuses(self):
+        """Statuts vers lesquels cette commande peut passer."""
+        return self.STATUS_TRANSITIONS.get(self.status, ())
+
+    def refresh_item_summary(self):
+        """Recalcule item_count et items_total depuis les articles et les enregistre."""
+        summary = self.items.aggregate(lines=models.Count('id'), units=models.Sum('quantity'))
+        self.item_count = summary['lines']
+        self.items_total = summary['units'] or 0
+        Order.objects.filter(pk=self.pk).update(item_count=self.item_count, items_total=self.items_total)
+
 
 class OrderItem(models.Model):
     # Liens
@@ -97,9 +148,54 @@ class OrderItem(models.Model):
         verbose_name_plural = 'Articles de Commande'
 
     def __str__(self):
-        return f"{self.quantity} x {self.product_name} in Order {self.order.id}"
+        return f"{self.quantity} x {self.product_name} in Order {self.order_id}"
 
     def get_cost(self):
         return self.price * self.quantity
 
 
+
+
+class DailySales(models.Model):
+    """
+    Cumul des ventes par jour (date de création des commandes) et par statut, tenu à jour
+    dans la transaction de chaque création, changement de statut ou suppression de commande
+    (voir orders/sales.py). Le tableau de bord lit ce cumul au lieu de parcourir les commandes.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    orders_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    items_sold = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ('-day', 'status')
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='orders_dailysales_day_status_uniq'),
+        ]
+        verbose_name = 'Ventes du jour'
+        verbose_name_plural = 'Ventes par jour'
+
+    def __str__(self):
+        return f"{self.day} {self.status} : {self.orders_count} commandes, {self.revenue}"
+
+
+class OrderStatusHistory(models.Model):
+    """
+    Historique des changements de statut, en ajout seul : une ligne par commande et par
+    transition, écrite dans la transaction du changement (orders/transitions.py, ou le
+    récepteur post_save pour un order.save()).
+    """
+    order = models.ForeignKey(Order, related_name='status_history', on_delete=models.CASCADE)
+    old_status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    new_status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('-changed_at', '-id')
+        verbose_name = 'Changement de statut'
+        verbose_name_plural = 'Historique des statuts'
+
+    def __str__(self):
+        return f"Commande {self.order_id} : {self.old_status} -> {self.new_status}"
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Cumul quotidien des ventes (table DailySales).
+
+Chaque commande compte dans la ligne (jour de création, statut) : 1 commande, son
+total_price (prix des articles) et ses unités (Order.items_total). Le cumul est modifié
+dans la transaction qui modifie la commande :
+- création : récepteur post_save (orders/signals.py) ;
+- changement de statut ou de montant : récepteur post_save (order.save()), ou
+  statuses_changed(), appelé par orders/transitions.py pour un lot ;
+- modification des articles : items_changed(), appelé avec le nouveau résumé des articles ;
+- suppression : récepteur pre_delete.
+
+Le tableau de bord lit ce cumul (une ligne par jour et par statut) au lieu de parcourir
+toutes les commandes. La commande backfill_sales_rollup le recalcule depuis les commandes.
+
+Chaque écriture du cumul change, après validation, sa version dans le cache partagé
+(sales_watermark) : les statistiques calculées (orders/analytics.py) y sont associées.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from store.cache import bump_version, get_version
+
+from .models import DailySales, Order
+
+SALES_VERSION_KEY = 'sales:version'
+
+
+def sales_watermark():
+    """Version courante du cumul des ventes (change à chaque écriture validée)."""
+    return get_version(SALES_VERSION_KEY)
+
+
+def bump_sales_watermark():
+    return bump_version(SALES_VERSION_KEY)
+
+
+def _new_deltas():
+    # (jour, statut) -> [commandes, chiffre d'affaires, unités]
+    return defaultdict(lambda: [0, Decimal('0.00'), 0])
+
+
+def apply_deltas(deltas):
+    """Ajoute les écarts {(jour, statut): [commandes, chiffre, unités]} au cumul."""
+    with transaction.atomic():
+        transaction.on_commit(bump_sales_watermark)
+        for (day, status), (orders, revenue, items) in deltas.items():
+            if not (orders or revenue or items):
+                continue
+            changes = {
+                'orders_count': F('orders_count') + orders,
+                'revenue': F('revenue') + revenue,
+                'items_sold': F('items_sold') + items,
+            }
+            # Écriture d'abord (verrou pris tout de suite), création si la ligne n'existe pas encore
+            if DailySales.objects.filter(day=day, status=status).update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    DailySales.objects.create(
+                        day=day, status=status, orders_count=orders, revenue=revenue, items_sold=items,
+                    )
+            except IntegrityError:
+                # Ligne créée entre-temps par une autre transaction
+                DailySales.objects.filter(day=day, status=status).update(**changes)
+
+
+def record_order(order):
+    """Compte une nouvelle commande."""
+    apply_deltas({
+        (timezone.localdate(order.created_at), order.status): [1, order.total_price, order.items_total],
+    })
+
+
+def order_changed(order, old_status, old_total_price):
+    """
+    Retire la commande de la ligne de son ancien statut (avec son ancien total_price) et
+    l'ajoute à celle de son statut actuel : couvre un changement de statut, de montant, ou les deux.
+    """
+    day = timezone.localdate(order.created_at)
+    deltas = _new_deltas()
+    for status, sign, total_price in ((old_status, -1, old_total_price), (order.status, 1, order.total_price)):
+        delta = deltas[day, status]
+        delta[0] += sign
+        delta[1] += sign * total_price
+        delta[2] += sign * order.items_total
+    apply_deltas(deltas)
+
+
+def items_changed(order, old_items_total):
+    """Reporte la variation des unités d'une commande dont les articles ont été modifiés."""
+    apply_deltas({
+        (timezone.localdate(order.created_at), order.status):
+            [0, Decimal('0.00'), order.items_total - old_items_total],
+    })
+
+
+def order_deleted(order):
+    """Retire une commande du cumul (telle qu'elle est enregistrée)."""
+    status = getattr(order, '_loaded_status', order.status)
+    total_price = getattr(order, '_loaded_total_price', order.total_price)
+    apply_deltas({(timezone.localdate(order.created_at), status): [-1, -total_price, -order.items_total]})
+
+
+def statuses_changed(rows, new_status):
+    """
+    Reporte dans le cumul le passage au statut `new_status` d'un lot de commandes déjà mises
+    à jour : `rows` contient (pk, ancien statut, created_at, total_price, items_total).
+    """
+    deltas = _new_deltas()
+    for pk, old_status, created_at, total_price, items in rows:
+        day = timezone.localdate(created_at)
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            delta = deltas[day, status]
+            delta[0] += sign
+            delta[1] += sign * total_price
+            delta[2] += sign * items
+    apply_deltas(deltas)
+
+
+def sales_by_status(since=None):
+    """
+    Totaux par statut, lus dans le cumul : {statut: {'orders', 'revenue', 'items'}}.
+    `since` (date) limite aux jours à partir de cette date.
+    """
+    rows = DailySales.objects.all()
+    if since is not None:
+        rows = rows.filter(day__gte=since)
+    totals = {
+        status: {'orders': 0, 'revenue': Decimal('0.00'), 'items': 0}
+        for status, label in Order.ORDER_STATUS_CHOICES
+    }
+    for row in rows.values('status').annotate(
+        orders=Sum('orders_count'), revenue=Sum('revenue'), items=Sum('items_sold'),
+    ).order_by():
+        totals[row.pop('status')] = row
+    return totals
+
+
+def rebuild():
+    """Recalcule entièrement le cumul depuis les commandes. Retourne le nombre de lignes écrites."""
+    deltas = _new_deltas()
+    with transaction.atomic():
+        orders = (
+            Order.objects.annotate(day=TruncDate('created_at')).values('day', 'status')
+            .annotate(count=Count('pk'), revenue=Sum('total_price'), items=Sum('items_total')).order_by()
+        )
+        for row in orders:
+            deltas[row['day'], row['status']] = [
+                row['count'], row['revenue'] or Decimal('0.00'), row['items'] or 0,
+            ]
+
+        transaction.on_commit(bump_sales_watermark)
+        DailySales.objects.all().delete()
+        DailySales.objects.bulk_create([
+            DailySales(day=day, status=status, orders_count=orders_count, revenue=revenue, items_sold=items_sold)
+            for (day, status), (orders_count, revenue, items_sold) in deltas.items()
+        ])
+    return len(deltas)
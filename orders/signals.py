@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Récepteurs de signaux de l'application orders (connectés dans OrdersConfig.ready)."""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import sales
+from .models import Order, OrderItem, OrderStatusHistory
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup(sender, instance, created, raw=False, **kwargs):
+    """
+    Compte la nouvelle commande, ou reporte son changement de statut ou de montant, dans le
+    cumul des ventes ; un changement de statut est aussi ajouté à l'historique.
+    """
+    if raw:
+        return
+    old_status = getattr(instance, '_loaded_status', instance.status)
+    old_total_price = getattr(instance, '_loaded_total_price', instance.total_price)
+    if created:
+        sales.record_order(instance)
+    elif old_status != instance.status or old_total_price != instance.total_price:
+        sales.order_changed(instance, old_status, old_total_price)
+        if old_status != instance.status:
+            OrderStatusHistory.objects.create(order=instance, old_status=old_status, new_status=instance.status)
+    instance._loaded_status = instance.status
+    instance._loaded_total_price = instance.total_price
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollup(sender, instance, **kwargs):
+    """Retire la commande du cumul (dans la transaction de la suppression)."""
+    sales.order_deleted(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_item_summary(sender, instance, raw=False, origin=None, **kwargs):
+    """
+    Article ajouté, modifié ou supprimé un par un (ex : admin) : recalcule le résumé des
+    articles de la commande et reporte la variation des unités dans le cumul des ventes.
+    (store.checkout.place_order écrit le résumé directement : bulk_create n'émet pas de signal.)
+    """
+    if raw or isinstance(origin, Order) or getattr(origin, 'model', None) is Order:
+        # Suppression en cascade de la commande : déjà retirée du cumul par pre_delete
+        return
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order is None:
+        return
+    old_items_total = order.items_total
+    with transaction.atomic():
+        order.refresh_item_summary()
+        if order.items_total != old_items_total:
+            sales.items_changed(order, old_items_total)
+        else:
+            # Le cumul (unités, total_price de la commande) est inchangé, mais le rapport de
+            # orders/analytics.py lit le prix des articles : sa version change quand même
+            transaction.on_commit(sales.bump_sales_watermark)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, sales
+from .export import CSV_HEADER, ExportError, parse_filters
+from .models import DailySales, Order, OrderItem, OrderStatusHistory
+from .sales import sales_watermark
+from .transitions import InvalidTransition, transition_orders
+
+from store.models import Category, Product
+
+# Cache propre à chaque test (le cache fichier par défaut est partagé avec le serveur de développement)
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_order(status='Pending'):
+    return Order.objects.create(
+        full_name='Client Test', email='client@example.com', phone_number='0000000000',
+        address_line_1='1 rue du Test', city='Ville', postal_code='00000', country='Pays', status=status,
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StatusTransitionTests(TestCase):
+    """Changements de statut par lot : seules les transitions de Order.STATUS_TRANSITIONS sont appliquées."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+
+    def test_allowed_transition_is_applied_and_logged(self):
+        order = make_order('Pending')
+        changed, skipped = transition_orders(Order.objects.filter(pk=order.pk), 'Shipped', self.user)
+        self.assertEqual((changed, skipped), (1, 0))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Shipped')
+        history = OrderStatusHistory.objects.get(order=order)
+        self.assertEqual((history.old_status, history.new_status, history.changed_by), ('Pending', 'Shipped', self.user))
+
+    def test_forbidden_transition_is_skipped(self):
+        order = make_order('Completed')
+        changed, skipped = transition_orders(Order.objects.filter(pk=order.pk), 'Processing', self.user)
+        self.assertEqual((changed, skipped), (0, 1))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Completed')
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+    def test_mixed_batch_only_changes_allowed_orders(self):
+        pending, shipped, cancelled = make_order('Pending'), make_order('Shipped'), make_order('Cancelled')
+        changed, skipped = transition_orders(Order.objects.all(), 'Processing', self.user)
+        self.assertEqual((changed, skipped), (1, 2))
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {pending.pk: 'Processing', shipped.pk: 'Shipped', cancelled.pk: 'Cancelled'})
+
+    def test_same_status_is_skipped(self):
+        order = make_order('Shipped')
+        self.assertEqual(transition_orders(Order.objects.filter(pk=order.pk), 'Shipped'), (0, 1))
+
+    def test_unknown_status_raises(self):
+        order = make_order()
+        with self.assertRaises(InvalidTransition):
+            transition_orders(Order.objects.filter(pk=order.pk), 'Lost')
+
+    def test_skipped_orders_are_counted_without_a_count_query(self):
+        make_order('Pending'), make_order('Completed')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(transition_orders(Order.objects.all(), 'Processing', self.user), (1, 1))
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_bulk_filter_scope_requires_a_status(self):
+        order = make_order('Pending')
+        self.client.force_login(self.user)
+        for data in ({}, {'filter_status': 'Lost'}):
+            with self.subTest(data=data):
+                response = self.client.post(
+                    reverse('admin_order_bulk_status'), {'scope': 'filter', 'new_status': 'Cancelled', **data},
+                )
+                self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Pending')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ItemSummaryTests(TestCase):
+    """Résumé des articles (item_count, items_total) et unités du cumul tenus à jour article par article."""
+
+    def setUp(self):
+        cache.clear()
+        self.order = make_order('Pending')
+
+    def add_item(self, quantity, price='10.00'):
+        return OrderItem.objects.create(order=self.order, product_name='Robe', quantity=quantity, price=Decimal(price))
+
+    def items_sold(self):
+        return DailySales.objects.get(status='Pending').items_sold
+
+    def test_added_and_deleted_items_update_the_summary(self):
+        first = self.add_item(2)
+        self.add_item(3)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.item_count, self.order.items_total), (2, 5))
+        self.assertEqual(self.items_sold(), 5)
+        first.delete()
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.item_count, self.order.items_total), (1, 3))
+        self.assertEqual(self.items_sold(), 3)
+
+    def test_price_change_refreshes_the_report_without_touching_the_rollup(self):
+        item = self.add_item(2)
+        watermark = sales_watermark()
+        item.price = Decimal('12.00')
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            item.save()
+        self.assertFalse([query for query in queries if 'dailysales' in query['sql']])
+        self.assertNotEqual(sales_watermark(), watermark)
+        self.assertEqual(self.items_sold(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ExportTests(TestCase):
+    """Export en flux : une ligne CSV par article, un objet JSONL par commande, filtres validés."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(self.user)
+        self.order = make_order('Completed')
+        for name, quantity in (('Robe', 2), ('Jupe', 1)):
+            OrderItem.objects.create(order=self.order, product_name=name, quantity=quantity, price=Decimal('9.90'))
+        self.empty = make_order('Pending')
+
+    def export(self, **params):
+        response = self.client.get(reverse('admin_order_export'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_has_one_line_per_item(self):
+        rows = list(csv.reader(io.StringIO(self.export())))
+        self.assertEqual(rows[0], CSV_HEADER)
+        self.assertEqual([row[CSV_HEADER.index('item_product_name')] for row in rows[1:]], ['Robe', 'Jupe', ''])
+        self.assertEqual(rows[1][CSV_HEADER.index('item_price')], '9.90')
+
+    def test_jsonl_has_one_object_per_order(self):
+        records = [json.loads(line) for line in self.export(format='jsonl').splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.order.pk, self.empty.pk])
+        self.assertEqual([item['quantity'] for item in records[0]['items']], [2, 1])
+        self.assertEqual(records[1]['items'], [])
+
+    def test_status_filter(self):
+        records = [json.loads(line) for line in self.export(format='jsonl', status='Pending').splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.empty.pk])
+
+    def test_invalid_filters_are_refused(self):
+        for filters in ({'status': 'Lost'}, {'start': '2025-13-01'}, {'start': '2025-02-01', 'end': '2025-01-01'}):
+            with self.subTest(filters=filters), self.assertRaises(ExportError):
+                parse_filters(**filters)
+        response = self.client.get(reverse('admin_order_export'), {'format': 'xml'})
+        self.assertRedirects(response, reverse('admin_order_list'), fetch_redirect_response=False)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AnalyticsTests(TestCase):
+    """Statistiques vectorisées : meilleures ventes, chiffre par période et catégorie, panier moyen."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Robes')
+        self.dress = Product.objects.create(name='Robe', price=Decimal('30.00'), category=category)
+        self.socks = Product.objects.create(name='Chaussettes', price=Decimal('2.50'))
+        self.add_order('Completed', [(self.dress, 1, '30.00'), (self.socks, 4, '2.50')])
+        self.add_order('Pending', [(self.socks, 2, '2.50')])
+        # Commande annulée : exclue des statistiques
+        self.add_order('Cancelled', [(self.dress, 5, '30.00')])
+
+    def add_order(self, status, lines):
+        order = make_order(status)
+        for product, quantity, price in lines:
+            OrderItem.objects.create(
+                order=order, product=product, product_name=product.name, quantity=quantity, price=Decimal(price),
+            )
+        Order.objects.filter(pk=order.pk).update(
+            total_price=sum(quantity * Decimal(price) for product, quantity, price in lines),
+        )
+
+    def test_report(self):
+        report = analytics.compute_report()
+        by_revenue = [(row['name'], row['units'], row['revenue']) for row in report['best_sellers_by_revenue']]
+        self.assertEqual(by_revenue, [('Robe', 1, Decimal('30.00')), ('Chaussettes', 6, Decimal('15.00'))])
+        self.assertEqual(report['best_sellers_by_units'][0]['name'], 'Chaussettes')
+        self.assertEqual(report['categories'], ['Sans catégorie', 'Robes'])
+        self.assertEqual(report['periods'], [{
+            'start': timezone.localdate(), 'total': Decimal('45.00'),
+            'by_category': [Decimal('15.00'), Decimal('30.00')],
+        }])
+        self.assertEqual(report['basket'], {'orders': 2, 'lines': 1.5, 'units': 3.5, 'amount': Decimal('22.50')})
+
+    def test_weeks_start_on_monday(self):
+        days = np.array(['2025-06-02', '2025-06-08', '2025-06-09'], dtype='datetime64[D]')
+        self.assertEqual(
+            analytics.period_starts(days, 'week').astype(str).tolist(), ['2025-06-02', '2025-06-02', '2025-06-09'],
+        )
+
+    def test_report_is_cached_until_an_order_changes(self):
+        first = analytics.sales_report()
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics.sales_report(), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_order('Completed', [(self.dress, 1, '30.00')])
+        self.assertEqual(analytics.sales_report()['basket']['orders'], 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SalesRollupTests(TestCase):
+    """Cumul quotidien DailySales tenu à jour dans la transaction de chaque écriture de commande."""
+
+    def setUp(self):
+        cache.clear()
+
+    def make(self, status, total, items):
+        order = make_order(status)
+        OrderItem.objects.create(order=order, product_name='Robe', quantity=items, price=Decimal(total) / items)
+        order = Order.objects.get(pk=order.pk)
+        order.total_price = Decimal(total)
+        order.save()
+        return order
+
+    def rollup(self):
+        return sorted(
+            DailySales.objects.filter(orders_count__gt=0)
+            .values_list('day', 'status', 'orders_count', 'revenue', 'items_sold')
+        )
+
+    def test_new_order_is_counted(self):
+        self.make('Pending', '20.00', 2)
+        totals = sales.sales_by_status()
+        self.assertEqual(totals['Pending'], {'orders': 1, 'revenue': Decimal('20.00'), 'items': 2})
+        self.assertEqual(totals['Completed']['orders'], 0)
+
+    def test_status_change_moves_the_order(self):
+        order = self.make('Pending', '20.00', 2)
+        order.status = 'Shipped'
+        order.save()
+        totals = sales.sales_by_status()
+        self.assertEqual((totals['Pending']['orders'], totals['Shipped']['orders']), (0, 1))
+        self.assertEqual(OrderStatusHistory.objects.get(order=order).old_status, 'Pending')
+
+    def test_rollup_matches_a_full_rebuild(self):
+        orders = [self.make('Pending', '20.00', 2), self.make('Pending', '15.00', 3), self.make('Completed', '9.00', 1)]
+        transition_orders(Order.objects.filter(pk=orders[0].pk), 'Processing')
+        orders[1].delete()
+        incremental = self.rollup()
+        sales.rebuild()
+        self.assertEqual(self.rollup(), incremental)
+        self.assertEqual(sales.sales_by_status()['Processing']['revenue'], Decimal('20.00'))
+
+    def test_dashboard_reads_the_rollup(self):
+        self.make('Completed', '20.00', 2)
+        user = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('admin_dashboard')).status_code, 200)
+        self.assertFalse([query for query in queries if 'FROM "orders_order"' in query['sql'] and 'SUM(' in query['sql']])
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Changements de statut par lot (liste des commandes, action de l'admin Django, page de détail).
+
+Les transitions autorisées (Order.STATUS_TRANSITIONS) sont vérifiées par la base : seules les
+commandes dont le statut actuel permet la transition sont modifiées, par un UPDATE ... WHERE
+status = <statut lu> par statut d'origine. Dans la même transaction, l'historique
+(OrderStatusHistory) est écrit par bulk_create et le cumul des ventes est mis à jour
+(orders/sales.py), pour les seules commandes effectivement modifiées.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import sales
+from .models import Order, OrderStatusHistory
+
+HISTORY_BATCH_SIZE = 500
+
+
+class InvalidTransition(ValueError):
+    """Statut cible inconnu."""
+
+
+def transition_orders(queryset, new_status, user=None):
+    """
+    Passe au statut `new_status` les commandes du queryset dont le statut actuel le permet.
+    Retourne (commandes modifiées, commandes ignorées) ; les commandes ignorées sont celles
+    dont la transition n'est pas autorisée (ou qui ont déjà ce statut).
+    """
+    if new_status not in dict(Order.ORDER_STATUS_CHOICES):
+        raise InvalidTransition(f"Statut inconnu : {new_status}")
+    sources = Order.statuses_allowed_to(new_status)
+
+    with transaction.atomic():
+        # Commandes verrouillées jusqu'à la fin de la transaction (sur les bases qui le permettent).
+        # Une seule lecture donne à la fois les commandes à modifier et le nombre d'ignorées.
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=queryset.order_by().values('pk')).order_by('pk')
+            .values_list('pk', 'status', 'created_at', 'total_price', 'items_total')
+        )
+        by_status = {}
+        for row in rows:
+            if row[1] in sources:
+                by_status.setdefault(row[1], []).append(row)
+
+        now = timezone.now()
+        changed = []
+        for old_status, group in by_status.items():
+            pks = [pk for pk, *_ in group]
+            # Le statut lu est repris dans le WHERE : sans verrou de ligne (SQLite), une commande
+            # modifiée entre la lecture et l'UPDATE n'est pas écrasée
+            updated = Order.objects.filter(pk__in=pks, status=old_status).update(
+                status=new_status, updated_at=now,
+            )
+            if updated < len(group):
+                # Historique et cumul construits uniquement à partir des commandes modifiées
+                done = set(
+                    Order.objects.filter(pk__in=pks, status=new_status, updated_at=now)
+                    .values_list('pk', flat=True)
+                )
+                group = [row for row in group if row[0] in done]
+            changed.extend(group)
+
+        if changed:
+            OrderStatusHistory.objects.bulk_create([
+                OrderStatusHistory(
+                    order_id=pk, old_status=old_status, new_status=new_status, changed_by=user, changed_at=now,
+                )
+                for pk, old_status, *_ in changed
+            ], batch_size=HISTORY_BATCH_SIZE)
+            sales.statuses_changed(changed, new_status)
+    return len(changed), len(rows) - len(changed)
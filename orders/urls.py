@@ -11,9 +11,18 @@ urlpatterns = [
     # Dashboard URL: /admin/
     path('admin/', views.admin_dashboard, name='admin_dashboard'),
 
+    # Statistiques de ventes : /admin/analytics/
+    path('admin/analytics/', views.admin_sales_analytics, name='admin_sales_analytics'),
+
     # List URL: /admin/orders/
     path('admin/orders/', views.admin_order_list, name='admin_order_list'),
 
+    # Export CSV / JSONL en flux : /admin/orders/export/
+    path('admin/orders/export/', views.admin_order_export, name='admin_order_export'),
+
+    # Changement de statut par lot : /admin/orders/status/
+    path('admin/orders/status/', views.admin_order_bulk_status, name='admin_order_bulk_status'),
+
     # Detail URL: /admin/orders/1/
     path('admin/orders/<int:order_id>/', views.admin_order_detail, name='admin_order_detail'),
 
@@ -1,15 +1,37 @@
+import logging
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Count
-from .models import Order, OrderItem
+from django.core.cache import cache
+from django.conf import settings
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.db.models import Count, Prefetch
+from .models import Order, OrderItem, OrderStatusHistory
+from .analytics import sales_report
+from .export import (
+    CONTENT_TYPES, ExportError, aexport_lines, export_filename, export_lines, export_rows, parse_filters,
+)
+from .sales import sales_by_status
+from .transitions import InvalidTransition, transition_orders
 # Assurez-vous d'importer les modèles nécessaires de 'store'
 from store.models import Product, ShopConfiguration
 from store.forms import ShopConfigurationForm
+from store.cache import get_catalog_version, get_shop_config
+from store.pagination import InvalidCursor, paginate_keyset
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Durée (secondes) pendant laquelle les comptages du tableau de bord restent en cache
+DASHBOARD_COUNTS_TIMEOUT = 300
+
 
 # Fonction utilitaire pour vérifier si l'utilisateur est un admin/staff
 def is_staff_user(user):
@@ -21,16 +43,32 @@ def is_staff_user(user):
 # Vues d'Administration des Commandes
 # =========================================================================
 
+def dashboard_counts():
+    """
+    (articles actifs, utilisateurs) pour le tableau de bord, gardés en cache : la clé suit la
+    version du catalogue (nouveau comptage dès qu'un article change), le nombre d'utilisateurs
+    peut retarder de DASHBOARD_COUNTS_TIMEOUT secondes.
+    """
+    key = f"dashboard:counts:{get_catalog_version()}"
+    counts = cache.get(key)
+    if counts is None:
+        counts = (Product.objects.filter(is_active=True).count(), User.objects.count())
+        cache.set(key, counts, timeout=DASHBOARD_COUNTS_TIMEOUT)
+    return counts
+
+
 @login_required
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def admin_dashboard(request):
     """Vue pour le tableau de bord principal de l'administration et la gestion de la configuration."""
 
-    # 1. Récupérer l'unique enregistrement de configuration
-    config, created = ShopConfiguration.objects.get_or_create(pk=1)
+    # 1. Récupérer l'unique enregistrement de configuration (copie en mémoire du worker)
+    config = get_shop_config()
 
     # 2. Gérer la soumission du formulaire de configuration
     if request.method == 'POST':
+        # Instance fraîche : le formulaire ne doit pas modifier l'instance partagée du cache
+        config, created = ShopConfiguration.objects.get_or_create(pk=1)
         # Crée une instance du formulaire en le liant aux données POST et à l'objet 'config'
         config_form = ShopConfigurationForm(request.POST, instance=config)
 
@@ -44,14 +82,13 @@ def admin_dashboard(request):
         # Créer le formulaire avec les données existantes
         config_form = ShopConfigurationForm(instance=config)
 
-    # 3. Récupération des statistiques clés (comme avant)
+    # 3. Statistiques clés, lues dans le cumul quotidien des ventes (une ligne par jour et par statut)
     try:
-        # ... (votre code existant pour les statistiques)
-        pending_orders_count = Order.objects.filter(status='PENDING').count()
-        total_revenue = Order.objects.filter(status='COMPLETED').aggregate(Sum('total_price'))[
-                            'total_price__sum'] or 0.00
-        active_products_count = Product.objects.filter(is_active=True).count()
-        total_users_count = User.objects.count()
+        sales = sales_by_status()
+        pending_orders_count = sales['Pending']['orders']
+        total_revenue = sales['Completed']['revenue']
+        # Comptages en cache : aucune requête COUNT à chaque affichage
+        active_products_count, total_users_count = dashboard_counts()
     except Exception:
         pending_orders_count = 0
         total_revenue = 0.00
@@ -69,64 +106,134 @@ def admin_dashboard(request):
     return render(request, 'orders/admin_dashboard.html', context)
 
 
+@login_required
+@user_passes_test(is_staff_user, login_url='/admin/login/')
+def admin_sales_analytics(request):
+    """
+    Statistiques de ventes : meilleures ventes, chiffre d'affaires par jour ou par semaine et
+    par catégorie, panier moyen. Calculées par orders/analytics.py et mises en cache jusqu'à
+    la prochaine écriture de commande.
+    """
+    period = 'week' if request.GET.get('period') == 'week' else 'day'
+    try:
+        days = min(max(int(request.GET.get('days', 90)), 1), 3660)
+    except ValueError:
+        days = 90
+
+    context = {
+        'report': sales_report(days=days, period=period),
+        'period': period,
+        'days': days,
+        'DAYS_CHOICES': (7, 30, 90, 365),
+    }
+    return render(request, 'orders/admin_analytics.html', context)
+
+
 @login_required
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def admin_order_list(request):
-    """Vue pour afficher la liste de toutes les commandes pour l'administrateur avec filtrage et débogage."""
+    """
+    Liste des commandes pour l'administrateur, filtrable par statut.
+    Pagination par curseur (?after=...) sur l'id décroissant (ordre de création) ; seules les
+    colonnes affichées sont lues, et les compteurs des filtres viennent d'un seul GROUP BY status.
+    """
     status_filter_display = request.GET.get('status')
 
     # CRÉATION DU DICTIONNAIRE DE TRADUCTION INVERSE (nécessite ORDER_STATUS_CHOICES du modèle Order)
-    # Ex: {'EN ATTENTE DE PAIEMENT': 'PENDING', 'EN COURS DE TRAITEMENT': 'PROCESSING', ...}
-
-    # Assurez-vous que le modèle Order a la constante ORDER_STATUS_CHOICES
+    # Ex: {'EN ATTENTE DE PAIEMENT': 'Pending', 'EN COURS DE TRAITEMENT': 'Processing', ...}
     STATUS_MAPPING = {display.upper(): code for code, display in Order.ORDER_STATUS_CHOICES}
 
-    orders_query = Order.objects.get_queryset().order_by('-created_at')
+    # Compteurs de tous les filtres en une requête : {'Pending': 12, 'Completed': 40, ...}
+    status_counts = dict(
+        Order.objects.order_by().values('status').annotate(count=Count('id')).values_list('status', 'count')
+    )
+    total_orders = sum(status_counts.values())
 
-    # Récupère TOUTES les commandes existantes pour le compteur 'Toutes'
-    total_orders = orders_query.count()
+    # Seules les colonnes affichées dans le tableau
+    orders_query = Order.objects.only(
+        'id', 'full_name', 'created_at', 'total_price', 'status', 'item_count', 'items_total',
+    )
 
     # Applique le filtre si un statut est spécifié
-    if status_filter_display:
-        # 1. Trouve le code DB correspondant au nom affiché (en majuscules)
-        #    Ex: 'EN ATTENTE DE PAIEMENT' -> 'PENDING'
-        status_code = STATUS_MAPPING.get(status_filter_display.upper())
-
-        # 2. Si un code valide est trouvé, on filtre
-        if status_code:
-            orders_query = orders_query.filter(status=status_code)
-
-        # NOTE : Si status_filter_display est 'TOUTES', status_code sera None, donc le filtre n'est pas appliqué.
-
-    # Exécution de la QuerySet pour le contexte
-    orders = list(orders_query)
-
-    # =======================================================
-    # LIGNES DE DÉBOGAGE MISES À JOUR
-    # =======================================================
-    print("--- DÉBOGAGE ADMIN ORDERS (orders/views.py) ---")
-    print(f"Filtre reçu (Display): {status_filter_display}")
-    if status_filter_display and status_filter_display != 'TOUTES':
-        print(f"Filtre appliqué (Code DB): {status_code}")
-    print(f"Compteur total (DB - FINAL): {total_orders}")
-    print(f"Nombre de commandes dans 'orders' après application du filtre: {len(orders)}")
-    if orders:
-        print(f"Détails de la dernière commande trouvée: ID {orders[0].id}, Statut: {orders[0].status}")
-    print("-----------------------------------")
-    # =======================================================
+    # (si status_filter_display est 'TOUTES' ou inconnu, status_code est None : pas de filtre)
+    status_code = STATUS_MAPPING.get(status_filter_display.upper()) if status_filter_display else None
+    if status_code:
+        orders_query = orders_query.filter(status=status_code)
+        filtered_count = status_counts.get(status_code, 0)
+    else:
+        filtered_count = total_orders
+
+    # Pagination par curseur : coût constant quelle que soit la page
+    cursor = request.GET.get('after')
+    try:
+        page = paginate_keyset(orders_query, ('-id',), cursor, settings.ADMIN_ORDER_PAGE_SIZE)
+    except InvalidCursor:
+        return redirect('admin_order_list')
+
+    logger.debug(
+        "Liste des commandes : filtre %r (code %s), %d commande(s) sur %d, %d affichée(s).",
+        status_filter_display, status_code, filtered_count, total_orders, len(page),
+    )
+
+    # Liens de navigation conservant le filtre actif
+    params = {'status': status_filter_display} if status_filter_display else {}
+    first_page_url = reverse('admin_order_list') + (f"?{urlencode(params)}" if params else '')
+    next_page_url = None
+    if page.has_next:
+        next_page_url = f"{reverse('admin_order_list')}?{urlencode({**params, 'after': page.next_cursor})}"
 
     context = {
-        'orders': orders,
+        'orders': page,
         'total_orders': total_orders,
+        'filtered_count': filtered_count,
+        'status_counts': status_counts,
+        'status_code': status_code,
+        'ORDER_STATUS_CHOICES': Order.ORDER_STATUS_CHOICES,
+        'is_paginated_view': bool(cursor),
+        'first_page_url': first_page_url,
+        'next_page_url': next_page_url,
     }
     return render(request, 'orders/order_list.html', context)
 
 
+@login_required
+@user_passes_test(is_staff_user, login_url='/admin/login/')
+def admin_order_export(request):
+    """
+    Export des commandes et de leurs articles (?format=csv|jsonl, ?status=<code>, ?start= et
+    ?end= au format AAAA-MM-JJ, inclus). La réponse est écrite en flux pendant la lecture :
+    la mémoire utilisée ne dépend pas du nombre de commandes exportées.
+    """
+    export_format = request.GET.get('format', 'csv')
+    try:
+        status, start, end = parse_filters(
+            request.GET.get('status'), request.GET.get('start'), request.GET.get('end'),
+        )
+        lines = export_lines(export_format, export_rows(status, start, end))
+    except ExportError as error:
+        messages.error(request, f"Export impossible : {error}")
+        return redirect('admin_order_list')
+
+    if isinstance(request, ASGIRequest):
+        # Sous ASGI, un itérateur synchrone serait lu en entier avant l'envoi : lecture par blocs
+        lines = aexport_lines(lines)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(export_format, status, start, end)}"'
+    return response
+
+
 @login_required
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def admin_order_detail(request, order_id):
     """Vue pour afficher les détails d'une commande spécifique et gérer la mise à jour du statut."""
-    order = get_object_or_404(Order, id=order_id)
+    # Commande, ses articles (avec leur produit) puis l'historique de ses statuts : trois requêtes en tout
+    order = get_object_or_404(
+        Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product')),
+            Prefetch('status_history', queryset=OrderStatusHistory.objects.select_related('changed_by')),
+        ),
+        id=order_id,
+    )
 
     # Logique pour gérer la soumission du formulaire de mise à jour du statut
     if request.method == 'POST':
@@ -135,29 +242,86 @@ def admin_order_detail(request, order_id):
         # Vérification simple pour s'assurer que le nouveau statut est valide
         valid_statuses = [key for key, value in order.ORDER_STATUS_CHOICES]
 
-        if new_status and new_status in valid_statuses:
-            order.status = new_status
-            order.save()
-            messages.success(request,
-                             f"Le statut de la commande #{order.id} a été mis à jour à '{order.get_status_display()}'.")
+        if new_status == order.status:
+            messages.info(request, f"La commande #{order.id} a déjà le statut '{order.get_status_display()}'.")
+        elif new_status and new_status in valid_statuses:
+            # Même chemin que les changements par lot : transition vérifiée, historique et cumul des ventes
+            changed, skipped = transition_orders(Order.objects.filter(pk=order.pk), new_status, request.user)
+            label = dict(Order.ORDER_STATUS_CHOICES)[new_status]
+            if changed:
+                messages.success(request, f"Le statut de la commande #{order.id} a été mis à jour à '{label}'.")
+            else:
+                messages.error(
+                    request,
+                    f"Transition non autorisée : '{order.get_status_display()}' ne peut pas passer à '{label}'.",
+                )
         else:
             messages.error(request, "Erreur : Le statut fourni n'est pas valide.")
 
         return redirect('admin_order_detail', order_id=order.id)
 
     # Logique pour l'affichage de la page (GET)
-    order_items = OrderItem.objects.filter(order=order)
+    order_items = order.items.all()
 
     context = {
         'order': order,
         'order_items': order_items,
-        # On passe les choix de statut pour le menu déroulant du template
-        # Ceci suppose que ORDER_STATUS_CHOICES est défini dans orders/models.py
-        'ORDER_STATUS_CHOICES': Order.ORDER_STATUS_CHOICES,
+        'status_history': order.status_history.all(),
+        # On passe les choix de statut pour le menu déroulant du template (statut actuel et transitions autorisées)
+        'ORDER_STATUS_CHOICES': [
+            (key, value) for key, value in Order.ORDER_STATUS_CHOICES
+            if key == order.status or key in order.allowed_statuses()
+        ],
     }
     return render(request, 'orders/order_detail.html', context)
 
 
+@login_required
+@user_passes_test(is_staff_user, login_url='/admin/login/')
+def admin_order_bulk_status(request):
+    """
+    Change le statut d'un lot de commandes (POST) : les commandes cochées (order_ids), ou toutes
+    celles du filtre de statut affiché (scope=filter, filter_status=<code>). Une seule mise à jour
+    groupée ; les commandes dont le statut ne permet pas la transition sont ignorées.
+    """
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('admin_order_list')
+    if request.method != 'POST':
+        return redirect(next_url)
+
+    new_status = request.POST.get('new_status')
+    if request.POST.get('scope') == 'filter':
+        # Sans statut de filtre valide, le lot couvrirait toutes les commandes : refusé
+        filter_status = request.POST.get('filter_status')
+        if filter_status not in dict(Order.ORDER_STATUS_CHOICES):
+            return HttpResponseBadRequest("Statut de filtre manquant ou invalide.")
+        orders = Order.objects.filter(status=filter_status)
+    else:
+        try:
+            order_ids = {int(order_id) for order_id in request.POST.getlist('order_ids')}
+        except ValueError:
+            order_ids = set()
+        if not order_ids:
+            messages.error(request, "Aucune commande sélectionnée.")
+            return redirect(next_url)
+        orders = Order.objects.filter(pk__in=order_ids)
+
+    try:
+        changed, skipped = transition_orders(orders, new_status, request.user)
+    except InvalidTransition:
+        messages.error(request, "Erreur : Le statut fourni n'est pas valide.")
+        return redirect(next_url)
+
+    label = dict(Order.ORDER_STATUS_CHOICES)[new_status]
+    logger.info("Changement de statut par lot vers %s : %d commande(s), %d ignorée(s).", new_status, changed, skipped)
+    if changed:
+        messages.success(request, f"{changed} commande(s) passée(s) au statut '{label}'.")
+    if skipped:
+        messages.warning(request, f"{skipped} commande(s) ignorée(s) : transition vers '{label}' non autorisée depuis leur statut.")
+    return redirect(next_url)
+
+
 @login_required
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def admin_order_delete(request, order_id):
@@ -1,6 +1,8 @@
-from django.contrib import admin
-from .models import Product, ProductVariant  # Importation locale
-from orders.models import Order, OrderItem
+from django.contrib import admin, messages
+from .models import Product, ProductVariant, StockReservation  # Importation locale
+from .catalog import with_stock
+from orders.models import DailySales, Order, OrderItem, OrderStatusHistory
+from orders.transitions import transition_orders
 
 
 # =========================================================================
@@ -14,24 +16,80 @@ class OrderItemInline(admin.TabularInline):
     extra = 0  # Ne pas afficher de lignes vides par défaut
 
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    """Historique des statuts de la commande (lecture seule, ajout seul)."""
+    model = OrderStatusHistory
+    fields = ['changed_at', 'old_status', 'new_status', 'changed_by']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """Personnalisation de l'affichage du modèle Order."""
     list_display = ['id', 'full_name', 'email', 'total_price', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['full_name', 'email', 'payment_id']
-    inlines = [OrderItemInline]
-    readonly_fields = ['total_price', 'created_at', 'updated_at', 'payment_id']
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    readonly_fields = ['total_price', 'created_at', 'updated_at', 'payment_id', 'item_count', 'items_total']
+
+    actions = ['mark_order_shipped', 'mark_order_completed']
+
+    def _transition(self, request, queryset, new_status):
+        # Une mise à jour groupée (transitions vérifiées par la base), historique et cumul des ventes compris
+        changed, skipped = transition_orders(queryset, new_status, request.user)
+        label = dict(Order.ORDER_STATUS_CHOICES)[new_status]
+        self.message_user(request, f"{changed} commandes sont passées au statut « {label} ».")
+        if skipped:
+            self.message_user(
+                request, f"{skipped} commandes ignorées (transition non autorisée depuis leur statut).",
+                level=messages.WARNING,
+            )
 
-    actions = ['mark_order_completed']
+    def mark_order_shipped(self, request, queryset):
+        self._transition(request, queryset, 'Shipped')
+
+    mark_order_shipped.short_description = "Marquer comme Expédiée"
 
     def mark_order_completed(self, request, queryset):
-        queryset.update(status='Completed')
-        self.message_user(request, f"{queryset.count()} commandes ont été marquées comme Complétées.")
+        self._transition(request, queryset, 'Completed')
 
     mark_order_completed.short_description = "Marquer comme Complétée (Payée/Livrée)"
 
 
+@admin.register(OrderStatusHistory)
+class OrderStatusHistoryAdmin(admin.ModelAdmin):
+    """Historique des changements de statut, en lecture seule."""
+    list_display = ['changed_at', 'order', 'old_status', 'new_status', 'changed_by']
+    list_filter = ['new_status', 'old_status']
+    date_hierarchy = 'changed_at'
+    list_select_related = ['order', 'changed_by']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Cumul quotidien des ventes, en lecture seule (recalculé par backfill_sales_rollup)."""
+    list_display = ['day', 'status', 'orders_count', 'revenue', 'items_sold']
+    list_filter = ['status']
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # =========================================================================
 # 3. Administration des PRODUITS (Product & ProductVariant)
 # =========================================================================
@@ -51,4 +109,16 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductVariantInline]  # AJOUT : Pour gérer les variantes directement
     prepopulated_fields = {'slug': ('name',)}  # AJOUT : Pour aider à la création du slug
 
+    def get_queryset(self, request):
+        # Annote le stock pour que 'total_stock' ne déclenche pas une requête par ligne
+        return with_stock(super().get_queryset(request))
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """Réservations de stock des paniers (supprimées à expiration par sweep_reservations)."""
+    list_display = ['variant', 'quantity', 'cart_token', 'expires_at']
+    list_select_related = ['variant__product']
+    raw_id_fields = ['variant']
+
 # NOTE : OrderItem est inclus via l'inline dans OrderAdmin, il n'a pas besoin d'être enregistré séparément.
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        # Enregistre les récepteurs de signaux (invalidation du cache du catalogue)
+        from . import signals  # noqa: F401
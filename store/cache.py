@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de rendu du catalogue (page /boutique/).
+
+Le HTML de la boutique est mis en cache par (catégorie, recherche normalisée,
+version du catalogue). La version est incrémentée par les signaux de
+store/signals.py à chaque modification d'un article, d'une variante, d'une
+catégorie ou de la configuration : les anciennes entrées ne sont plus jamais
+relues et expirent d'elles-mêmes.
+
+Les versions sont tenues en base (CacheVersion, incrémentée par UPDATE) et
+recopiées dans le cache partagé, où elles sont lues : aucune incrémentation
+n'est perdue entre workers, et une version évincée du cache est relue en base.
+
+Les parties propres à chaque visiteur (jeton CSRF, compteur du panier) sont
+rendues sous forme de marqueurs puis remplacées à chaque requête, ce qui permet
+de partager le même HTML entre toutes les sessions.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CacheVersion, ShopConfiguration
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Marqueurs insérés dans le HTML mis en cache (alphanumériques : insensibles à l'échappement)
+CSRF_TOKEN_PLACEHOLDER = 'LRBCSRFTOKENPLACEHOLDER'
+CART_QUANTITY_PLACEHOLDER = 'LRBCARTQUANTITYPLACEHOLDER'
+
+
+def _stored_version(key):
+    return CacheVersion.objects.filter(name=key).values_list('value', flat=True).first()
+
+
+def _next_stored_version(key):
+    """Incrémente la version en base (écriture d'abord, comme store/stock.py) puis la relit."""
+    with transaction.atomic():
+        if not CacheVersion.objects.filter(name=key).update(value=F('value') + 1):
+            try:
+                with transaction.atomic():
+                    # Valeur initiale basée sur l'horloge : au-delà des versions déjà
+                    # utilisées par d'anciennes entrées du cache
+                    CacheVersion.objects.create(name=key, value=int(time.time()))
+            except IntegrityError:
+                # Créée entre-temps par un autre worker
+                CacheVersion.objects.filter(name=key).update(value=F('value') + 1)
+        return _stored_version(key)
+
+
+def _publish_version(key, version):
+    # Les publications peuvent arriver dans le désordre : le cache ne recule jamais
+    current = cache.get(key)
+    if current is None or current < version:
+        cache.set(key, version, timeout=None)
+
+
+def get_version(key):
+    """Retourne la version courante stockée sous `key` (lue en base si absente du cache)."""
+    version = cache.get(key)
+    if version is None:
+        version = _stored_version(key)
+        if version is None:
+            version = _next_stored_version(key)
+        _publish_version(key, version)
+    return version
+
+
+def bump_version(key):
+    """Change la version stockée sous `key`, invalidant tout ce qui en dépend."""
+    version = _next_stored_version(key)
+    # Publiée après validation : aucune page ne doit être mise en cache sous cette version
+    # avant que le changement soit visible
+    transaction.on_commit(lambda: _publish_version(key, version))
+    return version
+
+
+def get_catalog_version():
+    """Retourne la version courante du catalogue."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalide toutes les pages du catalogue en changeant de version."""
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def normalize_query(query):
+    """Normalise un terme de recherche (espaces superflus, casse) pour la clé de cache."""
+    return ' '.join((query or '').split()).lower()
+
+
+def catalog_page_key(category_slug, search_query, search_query_display, cursor=None, kind='page'):
+    """
+    Clé de cache d'une page du catalogue pour la version courante.
+    `kind` distingue la page complète ('page') du fragment du chargement infini ('fragment').
+    """
+    raw = '|'.join([
+        kind,
+        category_slug or 'all',
+        normalize_query(search_query),
+        ' '.join((search_query_display or '').split()),
+        cursor or '',
+    ])
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f"catalog:page:{get_catalog_version()}:{digest}"
+
+
+def get_cached_page(key):
+    return cache.get(key)
+
+
+def set_cached_page(key, html):
+    cache.set(key, html, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600))
+
+
+def punch_holes(html, csrf_token, cart_quantity):
+    """Remplace les marqueurs par les valeurs propres au visiteur."""
+    return html.replace(CSRF_TOKEN_PLACEHOLDER, csrf_token).replace(
+        CART_QUANTITY_PLACEHOLDER, str(cart_quantity)
+    )
+
+
+def make_etag(*parts):
+    """ETag fort (entre guillemets) dérivé de versions ou d'identifiants de contenu."""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+# ==========================================================
+# Configuration de la boutique (singleton) gardée en mémoire par processus
+# ==========================================================
+SHOP_CONFIG_VERSION_KEY = 'shop_config:version'
+
+# (version, instance) chargés par ce worker
+_shop_config = (None, None)
+
+
+def get_shop_config():
+    """
+    Retourne l'unique ShopConfiguration sans requête SQL en régime établi : l'instance est
+    gardée en mémoire par le worker et relue seulement quand sa version (cache partagé,
+    incrémentée à chaque enregistrement) change, ce qui invalide tous les workers.
+    L'instance est partagée : ne pas la modifier (utiliser une copie fraîche pour un formulaire).
+    """
+    global _shop_config
+    version = get_version(SHOP_CONFIG_VERSION_KEY)
+    cached_version, config = _shop_config
+    if config is None or cached_version != version:
+        config, created = ShopConfiguration.objects.get_or_create(pk=1)
+        _shop_config = (version, config)
+    return config
+
+
+def invalidate_shop_config():
+    bump_version(SHOP_CONFIG_VERSION_KEY)
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+Panier compact et stockages interchangeables.
+
+Le panier ne conserve que {variant_id: [quantité, prix unitaire en centimes]}
+plus le nombre d'articles et le sous-total (centimes), tenus à jour à chaque
+modification : noms et tailles sont relus dans les fiches de variantes mises
+en cache (store.catalog.variant_infos). Une ligne coûte quelques octets au
+lieu d'un dictionnaire complet.
+
+Le stockage est choisi par le réglage CART_BACKEND :
+- store.cart.SessionCartBackend (défaut) : dans la session, donc en base (sessions cached_db) ;
+- store.cart.SignedCookieCartBackend : dans un cookie signé, sans aucune écriture serveur ;
+- store.cart.CacheCartBackend : dans le cache partagé, identifié par un cookie.
+
+CartMiddleware attache `request.cart` (chargé à la première utilisation) et
+l'enregistre une seule fois en fin de requête s'il a été modifié.
+"""
+
+import json
+import logging
+import secrets
+from decimal import ROUND_HALF_UP, Decimal
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from .catalog import variant_infos
+
+logger = logging.getLogger(__name__)
+
+CART_SESSION_KEY = 'cart'
+
+# Nombre maximal de lignes relues depuis un panier enregistré
+MAX_LINES = 200
+
+
+def variant_id_from_key(key):
+    """
+    Extrait l'id de variante d'une clé de ligne : 'idProduit-idVariante' (format des URLs
+    et des templates) ou simplement 'idVariante'. Lève ValueError si la clé est invalide.
+    """
+    return int(str(key).split('-')[-1])
+
+
+def to_cents(price):
+    """Prix Decimal (ou chaîne) -> centimes entiers."""
+    return int((Decimal(price) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Centimes entiers -> prix Decimal à deux décimales."""
+    return (Decimal(cents) / 100).quantize(Decimal('0.01'))
+
+
+class Cart:
+    """
+    Quantités par variante, avec le prix unitaire (en centimes) relevé à l'ajout.
+    Le nombre d'articles et le sous-total (centimes) sont tenus à jour à chaque modification
+    (O(1)) et enregistrés avec le panier ; `modified` indique qu'il faut l'enregistrer.
+    """
+
+    def __init__(self, lines=None, prices=None, token=None):
+        self.lines = dict(lines or {})
+        self.prices = dict(prices or {})
+        self.total_quantity = sum(self.lines.values())
+        self.subtotal_cents = sum(quantity * self.prices[variant_id] for variant_id, quantity in self.lines.items())
+        # Identifiant du panier, détenteur de ses réservations de stock (store/reservations.py)
+        self.token = token
+        self.modified = False
+
+    # --- Encodage compact ---------------------------------------------------
+
+    def encode(self):
+        data = {
+            'v': {str(variant_id): [quantity, self.prices[variant_id]] for variant_id, quantity in self.lines.items()},
+            'n': self.total_quantity,
+            's': self.subtotal_cents,
+        }
+        if self.token:
+            data['t'] = self.token
+        return data
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Reconstruit un panier depuis l'encodage compact (ou un format plus ancien) et vérifie
+        que les totaux enregistrés correspondent aux lignes ; sinon ils sont recalculés.
+        """
+        if not isinstance(data, dict):
+            return cls()
+        if 'v' in data and isinstance(data['v'], dict):
+            raw_lines = [
+                (variant_id, *(line if isinstance(line, list) else [line, None]))
+                for variant_id, line in data['v'].items()
+            ]
+        else:
+            # Ancien format : {'idProduit-idVariante': {'variant_id': ..., 'quantity': ...}, ...}
+            raw_lines = [
+                (item.get('variant_id'), item.get('quantity'), None)
+                for item in data.values() if isinstance(item, dict)
+            ]
+        lines = {}
+        prices = {}
+        for variant_id, quantity, cents in raw_lines[:MAX_LINES]:
+            try:
+                variant_id, quantity = int(variant_id), int(quantity)
+                cents = int(cents) if cents is not None else None
+            except (TypeError, ValueError):
+                continue
+            if quantity > 0:
+                lines[variant_id] = lines.get(variant_id, 0) + quantity
+                if cents is not None and cents >= 0:
+                    prices[variant_id] = cents
+
+        # Prix absents (formats antérieurs) : relevés dans le catalogue en cache
+        unpriced = [variant_id for variant_id in lines if variant_id not in prices]
+        if unpriced:
+            infos = variant_infos(unpriced)
+            for variant_id in unpriced:
+                if variant_id in infos:
+                    prices[variant_id] = to_cents(infos[variant_id]['price'])
+                else:
+                    del lines[variant_id]
+
+        token = data.get('t')
+        cart = cls(lines, prices, token if isinstance(token, str) else None)
+        if data.get('n') != cart.total_quantity or data.get('s') != cart.subtotal_cents:
+            if 'n' in data or 's' in data:
+                logger.warning(
+                    "Totaux du panier incohérents (n=%s, s=%s) : recalculés (n=%s, s=%s).",
+                    data.get('n'), data.get('s'), cart.total_quantity, cart.subtotal_cents,
+                )
+            # Ancien format ou totaux faux : le panier est réécrit à la prochaine réponse
+            cart.modified = bool(data)
+        return cart
+
+    # --- Lecture -------------------------------------------------------------
+
+    @property
+    def count(self):
+        """Nombre total d'unités dans le panier."""
+        return self.total_quantity
+
+    def subtotal(self):
+        """Prix total des articles (Decimal)."""
+        return from_cents(self.subtotal_cents)
+
+    def line_total(self, variant_id):
+        """Total de la ligne d'une variante (Decimal), 0 si elle n'est pas dans le panier."""
+        return from_cents(self.lines.get(variant_id, 0) * self.prices.get(variant_id, 0))
+
+    def quantity(self, variant_id):
+        return self.lines.get(variant_id, 0)
+
+    def __contains__(self, variant_id):
+        return variant_id in self.lines
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    # --- Modification --------------------------------------------------------
+
+    def ensure_token(self):
+        """Retourne le jeton du panier, créé au premier besoin."""
+        if not self.token:
+            self.token = secrets.token_urlsafe(16)
+            self.modified = True
+        return self.token
+
+    def set(self, variant_id, quantity, unit_price=None):
+        """
+        Fixe la quantité d'une variante (0 ou moins : la ligne est retirée) et met à jour les totaux.
+        `unit_price` (Decimal) évite de relire le prix dans le catalogue en cache.
+        """
+        old_quantity = self.lines.get(variant_id, 0)
+        old_cents = self.prices.get(variant_id, 0)
+
+        if quantity > 0:
+            if unit_price is not None:
+                cents = to_cents(unit_price)
+            elif variant_id in self.prices:
+                cents = old_cents
+            else:
+                info = variant_infos([variant_id]).get(variant_id)
+                if info is None:
+                    # Variante inconnue du catalogue : rien à ajouter
+                    return self.set(variant_id, 0)
+                cents = to_cents(info['price'])
+            self.lines[variant_id] = quantity
+            self.prices[variant_id] = cents
+        else:
+            quantity, cents = 0, 0
+            self.lines.pop(variant_id, None)
+            self.prices.pop(variant_id, None)
+
+        self.total_quantity += quantity - old_quantity
+        self.subtotal_cents += quantity * cents - old_quantity * old_cents
+        self.modified = True
+
+    def add(self, variant_id, quantity=1, unit_price=None):
+        self.set(variant_id, self.quantity(variant_id) + quantity, unit_price)
+
+    def remove(self, variant_id):
+        self.set(variant_id, 0)
+
+    def clear(self):
+        self.lines = {}
+        self.prices = {}
+        self.total_quantity = 0
+        self.subtotal_cents = 0
+        self.modified = True
+
+    # --- Contenu détaillé ----------------------------------------------------
+
+    def items(self):
+        """
+        Lignes détaillées pour l'affichage : fiche de la variante (nom, taille, prix...),
+        quantité, total de ligne et clé 'idProduit-idVariante'. Les prix sont remis à jour
+        s'ils ont changé dans le catalogue ; les variantes qui n'existent plus sont retirées.
+        """
+        infos = variant_infos(self.lines)
+        items = []
+        for variant_id in list(self.lines):
+            info = infos.get(variant_id)
+            if info is None:
+                self.remove(variant_id)
+                continue
+            if to_cents(info['price']) != self.prices[variant_id]:
+                self.set(variant_id, self.lines[variant_id], info['price'])
+            items.append({
+                **info,
+                'variant_id': variant_id,
+                'key': f"{info['product_id']}-{variant_id}",
+                'quantity': self.lines[variant_id],
+                'total': self.line_total(variant_id),
+            })
+        return items
+
+
+# =========================================================================
+# Stockages du panier
+# =========================================================================
+
+class SessionCartBackend:
+    """Panier enregistré dans la session (table django_session, lue via le cache)."""
+
+    def load(self, request):
+        return Cart.decode(request.session.get(CART_SESSION_KEY))
+
+    def save(self, request, response, cart):
+        request.session[CART_SESSION_KEY] = cart.encode()
+
+
+class SignedCookieCartBackend:
+    """Panier enregistré dans un cookie signé : aucune écriture côté serveur."""
+
+    cookie_name = 'cart'
+    salt = 'store.cart'
+
+    def load(self, request):
+        raw = request.get_signed_cookie(self.cookie_name, default=None, salt=self.salt)
+        try:
+            return Cart.decode(json.loads(raw)) if raw else Cart()
+        except ValueError:
+            return Cart()
+
+    def save(self, request, response, cart):
+        if not cart:
+            response.delete_cookie(self.cookie_name)
+            return
+        response.set_signed_cookie(
+            self.cookie_name, json.dumps(cart.encode(), separators=(',', ':')), salt=self.salt,
+            max_age=settings.CART_MAX_AGE, httponly=True, samesite='Lax',
+        )
+
+
+class CacheCartBackend:
+    """Panier enregistré dans le cache partagé, retrouvé grâce à un identifiant en cookie."""
+
+    cookie_name = 'cart_id'
+
+    def _key(self, cart_id):
+        return f"cart:{cart_id}"
+
+    def load(self, request):
+        cart_id = request.COOKIES.get(self.cookie_name)
+        return Cart.decode(cache.get(self._key(cart_id))) if cart_id else Cart()
+
+    def save(self, request, response, cart):
+        cart_id = request.COOKIES.get(self.cookie_name) or secrets.token_urlsafe(24)
+        cache.set(self._key(cart_id), cart.encode(), timeout=settings.CART_MAX_AGE)
+        response.set_cookie(
+            self.cookie_name, cart_id, max_age=settings.CART_MAX_AGE, httponly=True, samesite='Lax',
+        )
+
+
+def get_cart_backend():
+    return import_string(settings.CART_BACKEND)()
+
+
+async def aget_cart(request):
+    """
+    Version asynchrone de `request.cart` : le panier est chargé dans un thread, car la
+    session (et donc le stockage du panier) n'a pas d'API asynchrone sous Django 4.2.
+    """
+    await sync_to_async(len)(request.cart)
+    return request.cart
+
+
+class CartMiddleware:
+    """
+    Attache `request.cart` (chargé seulement s'il est utilisé) et l'enregistre en fin de
+    requête s'il a été modifié. À placer après SessionMiddleware.
+    Compatible WSGI et ASGI : sous ASGI, les vues asynchrones ne repassent pas par un thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.backend = get_cart_backend()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _attach(self, request):
+        loaded = []
+
+        def load_cart():
+            cart = self.backend.load(request)
+            loaded.append(cart)
+            return cart
+
+        request.cart = SimpleLazyObject(load_cart)
+        return loaded
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        loaded = self._attach(request)
+        response = self.get_response(request)
+
+        if loaded and loaded[0].modified:
+            self.backend.save(request, response, loaded[0])
+        return response
+
+    async def __acall__(self, request):
+        loaded = self._attach(request)
+        response = await self.get_response(request)
+
+        if loaded and loaded[0].modified:
+            await sync_to_async(self.backend.save)(request, response, loaded[0])
+        return response
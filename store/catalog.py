@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Couche de requêtes du catalogue.
+
+Centralise la construction des QuerySets de produits utilisés par la boutique
+et l'administration, afin que le stock de chaque article soit calculé en une
+seule requête (annotation) au lieu d'un `aggregate(Sum)` par carte produit.
+Fournit aussi les fiches des variantes (nom, taille, prix) mises en cache,
+qui permettent au panier de ne stocker que des quantités.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .cache import get_catalog_version
+from .models import Product, ProductVariant
+from .reservations import active_holds
+
+# Nom de l'annotation relue par Product.total_stock / Product.is_available
+TOTAL_STOCK_ANNOTATION = 'annotated_total_stock'
+
+# Attribut dans lequel sont préchargées les variantes en stock (triées par taille)
+IN_STOCK_VARIANTS_ATTR = 'in_stock_variants'
+
+
+def in_stock_variants_queryset():
+    """Variantes ayant au moins une unité en stock, triées par taille."""
+    return ProductVariant.objects.filter(stock__gt=0).order_by('size')
+
+
+def with_stock(queryset):
+    """
+    Ajoute à une QuerySet de produits :
+    - le stock total des variantes en stock (annotation SQL, même règle que Product.total_stock) ;
+    - les variantes en stock, préchargées dans `product.in_stock_variants`.
+
+    Le nombre de requêtes reste fixe (1 + 1 pour le préchargement), quelle que soit
+    la taille du catalogue.
+    """
+    return queryset.annotate(
+        **{
+            TOTAL_STOCK_ANNOTATION: Coalesce(
+                Sum('variants__stock', filter=Q(variants__stock__gt=0)), 0
+            )
+        }
+    ).prefetch_related(
+        Prefetch('variants', queryset=in_stock_variants_queryset(), to_attr=IN_STOCK_VARIANTS_ATTR)
+    )
+
+
+def storefront_products():
+    """
+    QuerySet des articles visibles en boutique, prête pour `store.html` :
+    catégorie jointe (pour le `regroup`), stock annoté et variantes en stock préchargées.
+    """
+    products = Product.objects.filter(is_active=True).select_related('category').order_by('name')
+    return with_stock(products)
+
+
+def deduct_holds(products):
+    """
+    Déduit les réservations actives des paniers du stock d'articles chargés par with_stock,
+    comme variant_stocks : `variant.available` porte le disponible de chaque variante,
+    `product.in_stock_variants` ne garde que celles qui en ont encore et `product.total_stock`
+    devient leur somme. La page rendue (et mise en cache) affiche ainsi la même disponibilité
+    que le polling, qui la tient ensuite à jour.
+    """
+    holds = active_holds()
+    for product in products:
+        variants = []
+        for variant in getattr(product, IN_STOCK_VARIANTS_ATTR):
+            variant.available = max(variant.stock - holds.get(variant.pk, 0), 0)
+            if variant.available > 0:
+                variants.append(variant)
+        setattr(product, IN_STOCK_VARIANTS_ATTR, variants)
+        setattr(product, TOTAL_STOCK_ANNOTATION, sum(variant.available for variant in variants))
+    return products
+
+
+# ==========================================================
+# Fiches des variantes (nom, taille, prix) pour le panier
+# ==========================================================
+
+def _variant_info_key(version, variant_id):
+    return f"catalog:variant:{version}:{variant_id}"
+
+
+def variant_infos(variant_ids):
+    """
+    Retourne {variant_id: fiche} pour les variantes existantes, où la fiche est un dict
+    (product_id, name, size, price (Decimal), image_url). Les fiches sont lues dans le cache
+    (clé liée à la version du catalogue) ; seules les manquantes sont chargées, en une requête.
+    """
+    variant_ids = {int(variant_id) for variant_id in variant_ids}
+    if not variant_ids:
+        return {}
+
+    version = get_catalog_version()
+    keys = {_variant_info_key(version, variant_id): variant_id for variant_id in variant_ids}
+    cached = cache.get_many(keys.keys())
+    infos = {keys[key]: info for key, info in cached.items()}
+
+    missing = variant_ids - infos.keys()
+    if missing:
+        loaded = {}
+        for variant in ProductVariant.objects.filter(pk__in=missing).select_related('product'):
+            product = variant.product
+            loaded[variant.pk] = {
+                'product_id': product.pk,
+                'name': product.name,
+                'size': variant.size,
+                'price': str(product.price),
+                'image_url': product.image.url if product.image else None,
+            }
+        cache.set_many(
+            {_variant_info_key(version, variant_id): info for variant_id, info in loaded.items()},
+            timeout=settings.CATALOG_CACHE_TIMEOUT,
+        )
+        infos.update(loaded)
+
+    return {
+        variant_id: {**info, 'price': Decimal(info['price'])}
+        for variant_id, info in infos.items()
+    }
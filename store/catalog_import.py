@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Import en masse du catalogue (catégories, articles et variantes) depuis un CSV ou du JSON.
+
+Une ligne CSV (ou un objet JSON) par variante, colonnes :
+    category, name, slug, price, description, is_active, image, size, stock
+Un objet JSON peut aussi porter la liste de ses variantes : {"name": ..., "variants": [{"size": "M", "stock": 3}]}.
+Les articles sont identifiés par leur slug (généré depuis le nom s'il est absent), les
+catégories par le slug de leur nom et les variantes par (article, taille). Une colonne vide
+ou absente conserve la valeur existante.
+
+Le fichier est lu en flux (CSV, JSON Lines, ou liste JSON décodée objet par objet) et traité
+par lots de `batch_size` lignes : pour chaque lot, une lecture de l'existant par modèle puis des
+bulk_create(update_conflicts=True) pour les lignes nouvelles ou modifiées, sans passer par
+save() ligne à ligne. Les effets des signaux sont appliqués par lot : documents de recherche
+(index_products), versions de stock (bump_stock_version) et version du cache du catalogue.
+
+Chaque lot est validé séparément : si la lecture ou la base échoue en cours d'import, les lots
+déjà validés restent enregistrés (et le cache invalidé) ; l'erreur levée (CatalogImportError)
+porte alors le rapport de ce qui a été importé.
+"""
+
+import contextlib
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+from django.utils.text import slugify
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductVariant
+from .search import index_products
+from .stock import bump_product_stock_version, bump_stock_version
+
+FORMATS = ('csv', 'json', 'jsonl')
+
+BATCH_SIZE = 1000
+
+# Erreurs de lignes conservées dans le rapport (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 50
+
+PRODUCT_FIELDS = ('name', 'category_id', 'price', 'description', 'is_active', 'image')
+
+TRUE_VALUES = {'1', 'true', 'vrai', 'oui', 'yes', 'y', 'o'}
+FALSE_VALUES = {'0', 'false', 'faux', 'non', 'no', 'n'}
+
+
+class CatalogImportError(ValueError):
+    """
+    Fichier illisible (format inconnu, JSON invalide, encodage) ou erreur de base en cours d'import.
+    `report` contient les compteurs des lots déjà validés (None si aucun lot ne l'a été).
+    """
+
+    report = None
+
+
+class RowError(ValueError):
+    """Ligne invalide : elle est ignorée et signalée dans le rapport."""
+
+
+# =========================================================================
+# Lecture en flux
+# =========================================================================
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'ndjson':
+        return 'jsonl'
+    if extension not in FORMATS:
+        raise CatalogImportError(f"Format inconnu pour {filename} (csv, json ou jsonl).")
+    return extension
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                raise CatalogImportError(f"JSON invalide ligne {number} : {error}")
+
+
+def read_json(stream, chunk_size=65536):
+    """Objets d'une liste JSON, décodés un par un : le fichier n'est jamais chargé en entier."""
+    def read_more():
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            raise CatalogImportError("JSON invalide ou incomplet (liste d'objets attendue).")
+        return chunk
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    expected = '['  # puis 'value' et ',' en alternance jusqu'au ']' final
+    number = 0
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            buffer = read_more()
+            continue
+        char = buffer[0]
+        if expected == '[':
+            if char != '[':
+                raise CatalogImportError("Le JSON doit être une liste d'objets.")
+            buffer, expected = buffer[1:], 'value'
+        elif char == ']':
+            return
+        elif expected == ',':
+            if char != ',':
+                raise CatalogImportError(f"JSON invalide après l'objet {number}.")
+            buffer, expected = buffer[1:], 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except ValueError:
+                # Objet coupé en fin de tampon : lecture de la suite du fichier
+                buffer += read_more()
+                continue
+            number += 1
+            yield number, value
+            buffer, expected = buffer[end:], ','
+
+
+def read_rows(stream, file_format):
+    """(numéro de ligne ou d'objet, dictionnaire) pour chaque enregistrement du fichier."""
+    readers = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
+    if file_format not in readers:
+        raise CatalogImportError(f"Format inconnu : {file_format} (csv, json ou jsonl).")
+    try:
+        for number, record in readers[file_format](stream):
+            if not isinstance(record, dict):
+                yield number, RowError("Objet attendu.")
+                continue
+            variants = record.get('variants')
+            if isinstance(variants, list):
+                # Objet article portant ses variantes : une ligne par variante
+                fields = {key: value for key, value in record.items() if key != 'variants'}
+                for variant in variants or [{}]:
+                    yield number, {**fields, **variant} if isinstance(variant, dict) else RowError("Variante invalide.")
+            else:
+                yield number, record
+    except UnicodeDecodeError:
+        raise CatalogImportError("Le fichier doit être encodé en UTF-8.")
+
+
+# =========================================================================
+# Validation d'une ligne
+# =========================================================================
+
+def _text(row, key, max_length=None):
+    """Texte nettoyé, ou None si la colonne est absente ou vide."""
+    value = row.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    if max_length and len(value) > max_length:
+        raise RowError(f"{key} : {max_length} caractères au plus.")
+    return value
+
+
+def clean_row(row):
+    """Valeurs typées d'une ligne ; None pour une valeur absente (conserver l'existant)."""
+    name = _text(row, 'name', Product._meta.get_field('name').max_length)
+    slug = slugify(_text(row, 'slug') or name or '')[:Product._meta.get_field('slug').max_length]
+    if not slug:
+        raise RowError("Nom ou slug manquant.")
+
+    category = _text(row, 'category', Category._meta.get_field('name').max_length)
+    if category is not None and not slugify(category):
+        raise RowError(f"Nom de catégorie invalide : {category}")
+
+    price = _text(row, 'price')
+    if price is not None:
+        try:
+            value = Decimal(price.replace(',', '.'))
+            if not value.is_finite() or value < 0 or value >= 10 ** 8:
+                raise InvalidOperation
+            price = value.quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f"Prix invalide : {price}")
+
+    is_active = row.get('is_active')
+    if isinstance(is_active, str):
+        flag = is_active.strip().lower()
+        if flag in TRUE_VALUES:
+            is_active = True
+        elif flag in FALSE_VALUES:
+            is_active = False
+        elif flag:
+            raise RowError(f"is_active invalide : {is_active}")
+        else:
+            is_active = None
+    elif is_active is not None:
+        is_active = bool(is_active)
+
+    stock = _text(row, 'stock')
+    if stock is not None:
+        try:
+            stock = int(stock)
+        except ValueError:
+            raise RowError(f"Stock invalide : {stock}")
+        if stock < 0:
+            raise RowError(f"Stock invalide : {stock}")
+
+    return {
+        'slug': slug,
+        'name': name,
+        'category': category,
+        'price': price,
+        'description': row['description'] if isinstance(row.get('description'), str) and row['description'] else None,
+        'is_active': is_active,
+        'image': _text(row, 'image', Product._meta.get_field('image').max_length),
+        'size': _text(row, 'size', ProductVariant._meta.get_field('size').max_length),
+        'stock': stock,
+    }
+
+
+# =========================================================================
+# Import par lots
+# =========================================================================
+
+class CatalogImport:
+    """Importe des lignes de catalogue par lots et compte les lignes insérées, modifiées ou inchangées."""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.category_ids = {}  # slug -> id, gardé d'un lot à l'autre
+        self.counts = {
+            name: {'inserted': 0, 'updated': 0, 'unchanged': 0}
+            for name in ('categories', 'products', 'variants')
+        }
+        self.rows = 0
+        self.batches = 0  # lots validés
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+    def run(self, records, dry_run=False):
+        """
+        Importe les enregistrements (numéro, dictionnaire) ; dry_run annule tout à la fin.
+        Une erreur de lecture ou de base interrompt l'import : la CatalogImportError levée
+        porte le rapport des lots déjà validés.
+        """
+        try:
+            with transaction.atomic() if dry_run else contextlib.nullcontext():
+                batch = []
+                for number, record in records:
+                    self.rows += 1
+                    try:
+                        if isinstance(record, RowError):
+                            raise record
+                        batch.append((number, clean_row(record)))
+                    except RowError as error:
+                        self.error(number, str(error))
+                    if len(batch) >= self.batch_size:
+                        self.flush(batch)
+                        batch = []
+                self.flush(batch)
+                if dry_run:
+                    transaction.set_rollback(True)
+        except CatalogImportError as error:
+            error.report = self.report() if self.batches else None
+            raise
+        except DatabaseError as error:
+            interrupted = CatalogImportError(f"Erreur de base de données : {error}")
+            interrupted.report = self.report() if self.batches else None
+            raise interrupted from error
+        return self.report()
+
+    def report(self):
+        return {**self.counts, 'rows': self.rows, 'error_count': self.error_count, 'errors': self.errors}
+
+    def changed(self):
+        return sum(counts['inserted'] + counts['updated'] for counts in self.counts.values())
+
+    def flush(self, batch):
+        if not batch:
+            return
+        counts = {name: dict(values) for name, values in self.counts.items()}
+        changed = self.changed()
+        try:
+            with transaction.atomic():
+                self.save_categories(batch)
+                products = self.save_products(batch)
+                self.save_variants(batch, products)
+                if self.changed() > changed:
+                    # Pages du catalogue invalidées dès la validation du lot (jamais en simulation)
+                    transaction.on_commit(bump_catalog_version)
+        except DatabaseError:
+            # Lot annulé : ses compteurs aussi
+            self.counts = counts
+            raise
+        self.batches += 1
+
+    def save_categories(self, batch):
+        names = {}
+        for number, row in batch:
+            if row['category'] is not None:
+                names.setdefault(slugify(row['category']), row['category'])
+        missing = [slug for slug in names if slug not in self.category_ids]
+        if not missing:
+            return
+        self.category_ids.update(Category.objects.filter(slug__in=missing).values_list('slug', 'id'))
+        new = [slug for slug in missing if slug not in self.category_ids]
+        if new:
+            Category.objects.bulk_create(
+                [Category(name=names[slug], slug=slug) for slug in new], ignore_conflicts=True,
+            )
+            self.category_ids.update(Category.objects.filter(slug__in=new).values_list('slug', 'id'))
+            self.counts['categories']['inserted'] += len(new)
+        self.counts['categories']['unchanged'] += len(missing) - len(new)
+
+    def save_products(self, batch):
+        """Insère ou met à jour les articles du lot ; retourne {slug: id} des articles importés."""
+        merged = {}
+        for number, row in batch:
+            values = {
+                'name': row['name'],
+                'category_id': self.category_ids[slugify(row['category'])] if row['category'] else None,
+                'price': row['price'],
+                'description': row['description'],
+                'is_active': row['is_active'],
+                'image': row['image'],
+            }
+            product = merged.setdefault(row['slug'], {'number': number})
+            # Plusieurs lignes (variantes) du même article : la dernière valeur fournie l'emporte
+            product.update({key: value for key, value in values.items() if value is not None})
+
+        existing = {
+            row.pop('slug'): row
+            for row in Product.objects.filter(slug__in=merged).values('id', 'slug', *PRODUCT_FIELDS)
+        }
+        ids = {}
+        to_save = []
+        toggled = []
+        for slug, values in merged.items():
+            number = values.pop('number')
+            current = existing.get(slug)
+            if current is None:
+                if values.get('name') is None or values.get('price') is None:
+                    self.error(number, f"Article {slug} : nom et prix obligatoires pour un nouvel article.")
+                    continue
+                values = {'description': '', 'is_active': True, 'image': None, 'category_id': None, **values}
+                self.counts['products']['inserted'] += 1
+            else:
+                ids[slug] = current['id']
+                values = {**{field: current[field] for field in PRODUCT_FIELDS}, **values}
+                if all(values[field] == current[field] for field in PRODUCT_FIELDS):
+                    self.counts['products']['unchanged'] += 1
+                    continue
+                self.counts['products']['updated'] += 1
+                if values['is_active'] != current['is_active']:
+                    toggled.append(current['id'])
+            to_save.append(Product(slug=slug, **values))
+
+        if to_save:
+            # Une requête pour tout le lot ; le slug (unique) identifie l'article existant
+            Product.objects.bulk_create(
+                to_save, update_conflicts=True, unique_fields=['slug'], update_fields=list(PRODUCT_FIELDS),
+            )
+            new_slugs = [product.slug for product in to_save if product.slug not in ids]
+            if new_slugs:
+                ids.update(Product.objects.filter(slug__in=new_slugs).values_list('slug', 'id'))
+            for product in to_save:
+                product.pk = ids[product.slug]
+            index_products(to_save)
+            # Articles activés ou désactivés : leurs variantes changent de disponibilité (comme le fait le signal)
+            bump_product_stock_version(toggled)
+        return ids
+
+    def save_variants(self, batch, products):
+        wanted = {}
+        for number, row in batch:
+            if row['size'] is None or row['slug'] not in products:
+                continue
+            key = (products[row['slug']], row['size'])
+            if row['stock'] is not None or key not in wanted:
+                wanted[key] = row['stock']
+        if not wanted:
+            return
+
+        existing = {
+            (product_id, size): (variant_id, stock)
+            for variant_id, product_id, size, stock in ProductVariant.objects.filter(
+                product_id__in={product_id for product_id, size in wanted},
+            ).values_list('id', 'product_id', 'size', 'stock')
+        }
+        to_save = []
+        for (product_id, size), stock in wanted.items():
+            current = existing.get((product_id, size))
+            if current is None:
+                self.counts['variants']['inserted'] += 1
+                to_save.append(ProductVariant(product_id=product_id, size=size, stock=stock or 0))
+            elif stock is None or stock == current[1]:
+                self.counts['variants']['unchanged'] += 1
+            else:
+                self.counts['variants']['updated'] += 1
+                to_save.append(ProductVariant(product_id=product_id, size=size, stock=stock))
+
+        if to_save:
+            ProductVariant.objects.bulk_create(
+                to_save, update_conflicts=True, unique_fields=['product', 'size'], update_fields=['stock'],
+            )
+            # Nouvelle version de stock pour les variantes créées ou modifiées (comme le fait le signal)
+            keys = {(variant.product_id, variant.size) for variant in to_save}
+            bump_stock_version(
+                variant_id
+                for variant_id, product_id, size in ProductVariant.objects.filter(
+                    product_id__in={product_id for product_id, size in keys},
+                ).values_list('id', 'product_id', 'size')
+                if (product_id, size) in keys
+            )
+
+
+def import_catalog(stream, file_format, batch_size=BATCH_SIZE, dry_run=False):
+    """Importe un fichier de catalogue ouvert en texte ; retourne le rapport (compteurs et erreurs)."""
+    return CatalogImport(batch_size).run(read_rows(stream, file_format), dry_run=dry_run)
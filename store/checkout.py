@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de commande (checkout).
+
+Le nombre de requêtes SQL ne dépend pas de la taille du panier :
+- toutes les lignes sont résolues en une requête (variantes + articles joints) ;
+- les OrderItem sont insérés en un seul bulk_create ;
+- le stock de toutes les variantes est décrémenté par une seule requête UPDATE.
+
+Les écritures se font dans une transaction courte, ouverte seulement une fois
+le panier résolu et les totaux calculés. La décrémentation est conditionnelle
+(stock moins les réservations des autres paniers >= quantité) et passe en premier : sous SQLite, le verrou d'écriture est
+pris d'emblée et relâché aussitôt la commande insérée. Si une seule ligne
+manque de stock, rien n'est écrit et InsufficientStock indique les lignes en défaut.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+
+from orders.models import Order, OrderItem
+
+from .models import ProductVariant
+from .reservations import available_stocks, held_by_others, release
+from .stock import bump_stock_version
+
+SHIPPING_COST = Decimal('10.00')
+TAX_RATE = Decimal('0.16')
+
+
+class InsufficientStock(Exception):
+    """Stock insuffisant pour au moins une ligne ; `lines` porte `available` (stock actuel)."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        super().__init__(", ".join(f"{line.name} : {line.available} disponible(s)" for line in lines))
+
+
+class CheckoutLine:
+    """Une ligne du panier résolue : variante, article, quantité et prix unitaire actuel."""
+
+    def __init__(self, variant, quantity):
+        self.variant = variant
+        self.product = variant.product
+        self.quantity = quantity
+        self.price = variant.product.price
+        self.name = f"{self.product.name} ({variant.size})"
+
+    @property
+    def key(self):
+        return f"{self.product.id}-{self.variant.id}"
+
+    @property
+    def total(self):
+        return self.price * self.quantity
+
+
+def load_checkout_lines(cart):
+    """
+    Résout les lignes du panier en une seule requête.
+    Retourne (lignes, ids des variantes qui n'existent plus).
+    """
+    variants = ProductVariant.objects.select_related('product').in_bulk(list(cart.lines))
+    lines = [
+        CheckoutLine(variants[variant_id], quantity)
+        for variant_id, quantity in cart.lines.items() if variant_id in variants
+    ]
+    missing = [variant_id for variant_id in cart.lines if variant_id not in variants]
+    return lines, missing
+
+
+def checkout_totals(lines):
+    """Sous-total, frais de livraison, taxe et total TTC (Decimal) d'une liste de lignes."""
+    sub_total = sum((line.total for line in lines), Decimal('0.00'))
+    tax = round(sub_total * TAX_RATE, 2)
+    return {
+        'sub_total': sub_total,
+        'shipping_cost': SHIPPING_COST,
+        'tax': tax,
+        'total_price_incl_all': sub_total + SHIPPING_COST + tax,
+        'items_in_cart': sum(line.quantity for line in lines),
+    }
+
+
+def _quantities(lines):
+    quantities = {}
+    for line in lines:
+        quantities[line.variant.id] = quantities.get(line.variant.id, 0) + line.quantity
+    return quantities
+
+
+def decrement_stock(quantities, cart_token=None):
+    """
+    Retire {variant_id: quantité} du stock en une seule requête UPDATE ... CASE, uniquement
+    sur les variantes dont le stock suffit (une fois déduites les réservations actives des
+    paniers autres que `cart_token`). Retourne le nombre de variantes décrémentées
+    (égal à len(quantities) si tout le stock était disponible).
+    Le versionnement du stock reste à la charge de l'appelant (aucun signal post_save).
+    """
+    if not quantities:
+        return 0
+    requested = Case(
+        *[When(pk=variant_id, then=quantity) for variant_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    return ProductVariant.objects.filter(
+        pk__in=quantities, stock__gte=requested + held_by_others(cart_token),
+    ).update(
+        stock=F('stock') - requested
+    )
+
+
+def find_shortages(lines, cart_token=None):
+    """Lignes dont la quantité dépasse le stock disponible pour le panier (`line.available` est renseigné)."""
+    stocks = available_stocks([line.variant.id for line in lines], cart_token)
+    quantities = _quantities(lines)
+    shortages = []
+    for line in lines:
+        line.available = max(stocks.get(line.variant.id, 0), 0)
+        if quantities[line.variant.id] > line.available:
+            shortages.append(line)
+    return shortages
+
+
+def place_order(lines, cart_token=None, **order_fields):
+    """
+    Crée la commande et ses articles, décrémente le stock des variantes commandées et libère
+    les réservations du panier `cart_token`, le tout dans une seule transaction.
+    `order_fields` contient les champs de Order (client, livraison, totaux...).
+    Lève InsufficientStock (sans rien écrire) si le stock d'une ligne ne suffit plus.
+    """
+    quantities = _quantities(lines)
+    order = None
+    with transaction.atomic():
+        if decrement_stock(quantities, cart_token) == len(quantities):
+            # Résumé des articles écrit avec la commande (lu par la liste admin et le cumul des ventes)
+            order = Order.objects.create(
+                item_count=len(lines), items_total=sum(quantities.values()), **order_fields,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=line.product,
+                    product_name=line.name,
+                    quantity=line.quantity,
+                    price=line.price,
+                    size=line.variant.size,
+                )
+                for line in lines
+            ])
+            bump_stock_version(quantities)
+            release(cart_token)
+            # Le cache du catalogue n'est pas invalidé : le stock affiché par les pages
+            # en cache est mis à jour par le navigateur (versions de stock)
+        else:
+            # Au moins une ligne en défaut : la décrémentation partielle est annulée
+            transaction.set_rollback(True)
+
+    if order is None:
+        raise InsufficientStock(find_shortages(lines, cart_token))
+    return order
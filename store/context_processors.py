@@ -1,27 +1,39 @@
 # Importation de Order depuis l'application 'orders' où il est correctement défini
 from orders.models import Order # <-- LIGNE CRITIQUE MODIFIÉE
+from functools import partial
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_shop_config
+
+
+def get_cart_total_quantity(request):
+    """Quantité totale d'articles du panier (unités, pas variantes)."""
+    return request.cart.count
+
+
+def get_cart_content(request):
+    """Contenu compact du panier : {id de variante: quantité}."""
+    return request.cart.lines
 
 
 def cart_processor(request):
     """
     Rend le contenu du panier (nombre d'articles et contenu) disponible
     dans le contexte de tous les templates.
+    Les valeurs sont paresseuses (callables, appelés par le moteur de templates) :
+    le panier n'est chargé que si le template les utilise réellement.
     """
-    cart = request.session.get('cart', {})
-
-    # 1. Assurer la robustesse contre les sessions corrompues
-    if not isinstance(cart, dict):
-        cart = {}
-
-    total_quantity = 0
-
-    # Calculer la quantité totale d'articles (pas de variantes, mais d'unités)
-    for item in cart.values():
-        if isinstance(item, dict) and 'quantity' in item:
-            total_quantity += item.get('quantity', 0)
-
     return {
-        'cart_total_quantity': total_quantity,
+        'cart_total_quantity': partial(get_cart_total_quantity, request),
         # Optionnellement, exposer le panier complet si besoin dans le template
-        'cart_content': cart
+        'cart_content': partial(get_cart_content, request),
     }
+
+
+def shop_config_processor(request):
+    """
+    Rend la configuration de la boutique (contacts) disponible dans tous les templates.
+    Paresseux : rien n'est lu tant que le template n'utilise pas `shop_config`,
+    et la lecture se fait ensuite sans requête SQL (voir store.cache.get_shop_config).
+    """
+    return {'shop_config': SimpleLazyObject(get_shop_config)}
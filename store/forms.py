@@ -62,6 +62,20 @@ class CategoryForm(forms.ModelForm):
         }
 
 
+# Formulaire d'import en masse du catalogue (voir store/catalog_import.py)
+class CatalogImportForm(forms.Form):
+    FORMAT_CHOICES = (
+        ('', "Déduit de l'extension"),
+        ('csv', 'CSV'),
+        ('json', 'JSON (liste d\'objets)'),
+        ('jsonl', 'JSON Lines (un objet par ligne)'),
+    )
+
+    file = forms.FileField(label="Fichier du catalogue")
+    file_format = forms.ChoiceField(label="Format", choices=FORMAT_CHOICES, required=False)
+    dry_run = forms.BooleanField(label="Simulation (ne rien enregistrer)", required=False)
+
+
 # Formulaire pour la mise à jour du statut dans l'administration
 class OrderStatusUpdateForm(forms.ModelForm):
     class Meta:
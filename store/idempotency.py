@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Clés d'idempotence des POST (commande, modifications du panier).
+
+Chaque formulaire ou appel AJAX porte une clé unique (champ `idempotency_key` ou
+en-tête `Idempotency-Key`). La première requête portant une clé l'enregistre en base
+(IdempotencyKey, unique par panier, vue et clé), s'exécute normalement, puis sa
+réponse (redirection ou JSON) est gardée IDEMPOTENCY_TTL secondes. Un renvoi de la
+même clé (double clic, nouvel essai d'un réseau mobile lent) échoue sur la contrainte
+d'unicité et reçoit cette réponse sans réexécuter la vue : pas de seconde commande,
+pas de seconde décrémentation du stock. La contrainte reste sûre entre requêtes
+concurrentes et entre workers, contrairement à un cache.add non atomique (cache fichier).
+
+Un renvoi qui arrive pendant l'exécution de la première requête attend son
+résultat (au plus IDEMPOTENCY_WAIT secondes). Les clés expirées sont supprimées
+par la commande sweep_reservations. Les clés sont propres à chaque
+panier : une clé ne permet pas de relire la réponse d'un autre client.
+"""
+
+import asyncio
+import secrets
+import time
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+
+from .cart import aget_cart
+from .models import IdempotencyKey
+
+IDEMPOTENCY_FIELD = 'idempotency_key'
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+# Marqueur d'une requête en cours (réponse encore vide) ; une requête qui n'aboutit
+# jamais libère sa clé après PENDING_TIMEOUT secondes
+PENDING = 'pending'
+PENDING_TIMEOUT = 60
+
+# Intervalle (secondes) de relecture du résultat pendant l'attente d'une requête en cours
+POLL_INTERVAL = 0.1
+
+
+def get_idempotency_key(request):
+    key = request.POST.get(IDEMPOTENCY_FIELD) or request.META.get(IDEMPOTENCY_HEADER)
+    return key if key and len(key) <= 128 else None
+
+
+def _entry(identity):
+    owner, scope, key = identity
+    return IdempotencyKey.objects.filter(owner=owner, scope=scope, key=key)
+
+
+def _claim(identity):
+    """
+    Enregistre la requête comme en cours. Retourne True si elle doit s'exécuter, False si
+    une autre requête porte déjà cette clé (l'insertion concurrente échoue sur la contrainte).
+    """
+    owner, scope, key = identity
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(owner=owner, scope=scope, key=key)
+        return True
+    except IntegrityError:
+        pass
+    # Clé périmée (réponse trop ancienne, ou requête abandonnée) : reprise par une seule
+    # des requêtes concurrentes, grâce à l'UPDATE conditionnel
+    now = timezone.now()
+    stale = (
+        Q(response__isnull=False, updated_at__lt=now - timedelta(seconds=settings.IDEMPOTENCY_TTL))
+        | Q(response__isnull=True, updated_at__lt=now - timedelta(seconds=PENDING_TIMEOUT))
+    )
+    return bool(_entry(identity).filter(stale).update(response=None, updated_at=now))
+
+
+def _lookup(identity):
+    """Réponse mémorisée, PENDING si la requête est en cours, None si la clé a été libérée."""
+    entry = _entry(identity).values_list('response', flat=True)
+    if not entry:
+        return None
+    response = entry[0]
+    return PENDING if response is None else response
+
+
+def _acquire(identity):
+    """
+    (True, None) si la requête doit s'exécuter ; sinon (False, réponse à rejouer ou PENDING
+    si la première requête n'a pas abouti dans le délai d'attente).
+    """
+    while True:
+        if _claim(identity):
+            return True, None
+        stored = _lookup(identity)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while stored == PENDING and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            stored = _lookup(identity)
+        if stored is not None:
+            return False, stored
+        # Clé libérée entre-temps (première requête non mémorisable) : nouvelle tentative
+
+
+async def _aacquire(identity):
+    """Version asynchrone de _acquire : l'attente ne bloque pas le thread des appels synchrones."""
+    while True:
+        if await sync_to_async(_claim)(identity):
+            return True, None
+        stored = await sync_to_async(_lookup)(identity)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while stored == PENDING and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            stored = await sync_to_async(_lookup)(identity)
+        if stored is not None:
+            return False, stored
+
+
+def _finish(identity, response):
+    """Mémorise la réponse à rejouer, ou libère la clé si elle ne doit pas l'être."""
+    stored = _freeze(response)
+    if stored is None:
+        _entry(identity).delete()
+    else:
+        _entry(identity).update(response=stored, updated_at=timezone.now())
+
+
+def _release(identity):
+    _entry(identity).delete()
+
+
+def purge_expired_keys():
+    """Supprime les clés plus anciennes que IDEMPOTENCY_TTL (et PENDING_TIMEOUT) ; retourne leur nombre."""
+    age = max(settings.IDEMPOTENCY_TTL, PENDING_TIMEOUT)
+    deleted, _ = IdempotencyKey.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=age)).delete()
+    return deleted
+
+
+def _freeze(response):
+    """Réponse à mémoriser (redirection ou JSON), ou None si elle ne doit pas être rejouée."""
+    if isinstance(response, HttpResponseRedirect):
+        return {'status': response.status_code, 'location': response['Location']}
+    if isinstance(response, JsonResponse):
+        return {'status': response.status_code, 'content': response.content.decode('utf-8')}
+    return None
+
+
+def _replay(stored):
+    if 'location' in stored:
+        response = HttpResponseRedirect(stored['location'])
+    else:
+        response = HttpResponse(stored['content'], status=stored['status'], content_type='application/json')
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def _in_progress():
+    return JsonResponse(
+        {'success': False, 'error': "Requête déjà en cours de traitement. Veuillez patienter."},
+        status=409,
+    )
+
+
+def idempotent(scope):
+    """
+    Décorateur des vues POST (synchrones ou asynchrones) : une même clé d'idempotence
+    n'exécute la vue qu'une fois. Les réponses HTML (ex : formulaire invalide) ne sont pas
+    mémorisées : la clé est alors libérée et le client peut renvoyer le formulaire corrigé.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key = get_idempotency_key(request) if request.method == 'POST' else None
+                if key is None:
+                    return await view(request, *args, **kwargs)
+
+                await aget_cart(request)
+                identity = (request.cart.ensure_token(), scope, key)
+                acquired, stored = await _aacquire(identity)
+                if not acquired:
+                    return _in_progress() if stored == PENDING else _replay(stored)
+
+                try:
+                    response = await view(request, *args, **kwargs)
+                except Exception:
+                    await sync_to_async(_release)(identity)
+                    raise
+                await sync_to_async(_finish)(identity, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = get_idempotency_key(request) if request.method == 'POST' else None
+            if key is None:
+                return view(request, *args, **kwargs)
+
+            identity = (request.cart.ensure_token(), scope, key)
+            acquired, stored = _acquire(identity)
+            if not acquired:
+                return _in_progress() if stored == PENDING else _replay(stored)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                _release(identity)
+                raise
+            _finish(identity, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def new_idempotency_key(request=None):
+    """Clé pour un nouveau formulaire (ou celle du formulaire renvoyé, pour le réafficher)."""
+    if request is not None:
+        key = get_idempotency_key(request)
+        if key:
+            return key
+    return secrets.token_urlsafe(24)
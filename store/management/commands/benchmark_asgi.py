@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Compare le service des vues JSON du panier et du stock en WSGI (workers gunicorn
+synchrones, Procfile d'origine) et en ASGI (workers uvicorn, Procfile actuel).
+
+Les deux serveurs sont lancés tour à tour avec le même nombre de workers ; des
+clients simulés (threads) les sollicitent pendant une durée fixe. Le rapport
+donne les requêtes/s, les latences p50/p95/p99, les erreurs et la mémoire (RSS)
+totale des processus du serveur : la comparaison se fait à mémoire égale.
+
+--db-latency ajoute un délai à chaque requête SQL dans les workers, pour simuler
+une base lente (cas où un worker synchrone reste bloqué). Exemple :
+
+    python manage.py benchmark_asgi --workers 2 --clients 50 --duration 10 --db-latency 20
+"""
+
+import http.cookiejar
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Category, Product, ProductVariant
+from store.reservations import release
+
+from .loadtest_checkout import percentile
+
+SERVERS = {
+    'wsgi': ['la_rose_boutique.wsgi:application'],
+    'asgi': ['la_rose_boutique.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+# Hook gunicorn : délai artificiel sur chaque requête SQL des workers (base lente simulée)
+GUNICORN_CONFIG = '''
+import os
+import time
+
+
+def post_worker_init(worker):
+    latency = float(os.environ.get('BENCHMARK_DB_LATENCY', 0)) / 1000
+    if not latency:
+        return
+    from django.db.backends.signals import connection_created
+
+    def slow_execute(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(slow_execute)
+
+    connection_created.connect(install, weak=False)
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def process_tree_rss(pid):
+    """Mémoire résidente (Mo) du processus et de ses enfants (Linux : /proc), None ailleurs."""
+    if not os.path.isdir('/proc'):
+        return None
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree = {pid}
+    changed = True
+    while changed:
+        children = {child for child, parent in parents.items() if parent in tree} - tree
+        tree |= children
+        changed = bool(children)
+    total_kb = 0
+    for member in tree:
+        try:
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+class Client:
+    """Client HTTP avec ses cookies (session, CSRF) ; réutilisé pendant toute la mesure."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body)
+        if body is not None:
+            request.add_header('X-CSRFToken', self.csrf_token())
+            request.add_header('Referer', self.base_url + '/')
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+        except OSError:
+            return None
+
+
+class Command(BaseCommand):
+    help = "Compare requêtes/s et mémoire des vues du panier et du stock servies en WSGI et en ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--clients', type=int, default=50, help="Clients simultanés.")
+        parser.add_argument('--duration', type=float, default=10, help="Durée de chaque mesure (secondes).")
+        parser.add_argument('--db-latency', type=float, default=0, help="Délai ajouté à chaque requête SQL (ms).")
+        parser.add_argument('--scenario', choices=['stock', 'cart'], default='cart',
+                            help="stock : get_stock_data ; cart : ajout puis retrait du panier.")
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+
+    def handle(self, *args, **options):
+        variant = self.create_fixture()
+        config = tempfile.NamedTemporaryFile('w', suffix='.py', delete=False)
+        config.write(GUNICORN_CONFIG)
+        config.close()
+        try:
+            for name in options['servers']:
+                self.run_server(name, variant, config.name, options)
+        finally:
+            os.unlink(config.name)
+            self.delete_fixture(variant)
+
+    def create_fixture(self):
+        stamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        category = Category.objects.create(name=f"Benchmark {stamp}")
+        product = Product.objects.create(
+            category=category, name=f"Article benchmark {stamp}", price=Decimal('10.00'),
+            description="Article créé par benchmark_asgi.", is_active=False,
+        )
+        return ProductVariant.objects.create(product=product, size='TU', stock=10 ** 6)
+
+    def delete_fixture(self, variant):
+        for token in set(variant.reservations.values_list('cart_token', flat=True)):
+            release(token)
+        product = variant.product
+        category = product.category
+        product.delete()
+        category.delete()
+
+    def run_server(self, name, variant, config_path, options):
+        port = free_port()
+        env = {**os.environ, 'BENCHMARK_DB_LATENCY': str(options['db_latency'])}
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[name],
+            '--workers', str(options['workers']), '--bind', f'127.0.0.1:{port}',
+            '--config', config_path, '--log-level', 'warning', '--chdir', str(settings.BASE_DIR),
+        ]
+        server = subprocess.Popen(command, env=env)
+        try:
+            if not wait_for_port(port):
+                self.stderr.write(f"{name} : le serveur n'a pas démarré.")
+                return
+            result = self.measure(f"http://127.0.0.1:{port}", variant, options, server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        self.report(name, options, *result)
+
+    def measure(self, base_url, variant, options, pid):
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        stop = threading.Event()
+        stock_url = reverse('get_stock_data')
+        add_url = reverse('add_to_cart')
+        remove_url = reverse('remove_from_cart', args=[f"{variant.product_id}-{variant.id}"])
+
+        def client_loop():
+            client = Client(base_url)
+            # Cookie CSRF (non mesuré)
+            client.request(reverse('cart'))
+            while not stop.is_set():
+                if options['scenario'] == 'stock':
+                    calls = [(stock_url, None)]
+                else:
+                    calls = [(add_url, {'variant_id': variant.id}), (remove_url, {})]
+                for path, data in calls:
+                    start = time.perf_counter()
+                    status = client.request(path, data)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        if status != 200:
+                            errors[0] += 1
+
+        threads = [threading.Thread(target=client_loop, daemon=True) for _ in range(options['clients'])]
+        for thread in threads:
+            thread.start()
+        # Mémoire relevée au milieu de la mesure (serveur chargé)
+        time.sleep(options['duration'] / 2)
+        rss = process_tree_rss(pid)
+        time.sleep(options['duration'] / 2)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=60)
+        return latencies, errors[0], rss
+
+    def report(self, name, options, latencies, errors, rss):
+        count = len(latencies)
+        memory = f"{rss:.0f} Mo" if rss is not None else "n/d"
+        self.stdout.write(
+            f"{name.upper()} ({options['workers']} workers, {options['clients']} clients, "
+            f"scénario {options['scenario']}, base +{options['db_latency']:g} ms) : "
+            f"{count / options['duration']:.1f} req/s, "
+            f"p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms, "
+            f"p99 {percentile(latencies, 99) * 1000:.1f} ms, erreurs {errors}, mémoire {memory}"
+        )
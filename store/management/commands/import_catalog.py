@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Importe (ou synchronise) le catalogue depuis un fichier CSV, JSON ou JSON Lines :
+
+    python manage.py import_catalog catalogue.csv
+    python manage.py import_catalog articles.json --dry-run
+
+Voir store/catalog_import.py pour les colonnes attendues.
+"""
+
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_import import BATCH_SIZE, FORMATS, CatalogImportError, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = "Importe catégories, articles et variantes par lots depuis un CSV ou du JSON (insertion ou mise à jour)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer ('-' pour l'entrée standard, avec --format).")
+        parser.add_argument('--format', choices=FORMATS, help="Format du fichier (déduit de l'extension par défaut).")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Valide et compte sans rien enregistrer.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = options['format'] or detect_format(path)
+            start = time.perf_counter()
+            if path == '-':
+                report = import_catalog(sys.stdin, file_format, options['batch_size'], options['dry_run'])
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as stream:
+                    report = import_catalog(stream, file_format, options['batch_size'], options['dry_run'])
+        except CatalogImportError as error:
+            if error.report and not options['dry_run']:
+                # Les lots validés avant l'erreur restent enregistrés
+                self.write_report(error.report)
+                raise CommandError(f"Import interrompu après {error.report['rows']} lignes lues : {error}")
+            raise CommandError(error)
+        except OSError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - start
+
+        self.write_report(report)
+        summary = f"{report['rows']} lignes lues en {elapsed:.1f} s, {report['error_count']} en erreur."
+        if options['dry_run']:
+            summary += " Simulation : rien n'a été enregistré."
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def write_report(self, report):
+        for number, message in report['errors']:
+            self.stderr.write(f"Ligne {number} : {message}")
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f"... {report['error_count'] - len(report['errors'])} autres erreurs.")
+
+        for name, label in (('categories', 'Catégories'), ('products', 'Articles'), ('variants', 'Variantes')):
+            counts = report[name]
+            self.stdout.write(
+                f"{label:<11} insérées : {counts['inserted']:>6}  modifiées : {counts['updated']:>6}  "
+                f"inchangées : {counts['unchanged']:>6}"
+            )
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Test de charge de la boutique : N clients simulés achètent en même temps la même variante.
+
+L'application WSGI est servie dans ce processus (serveur HTTP multi-thread de Django,
+sur un port libre). Chaque client, dans son propre thread et avec ses propres cookies,
+enchaîne : page panier (jeton CSRF), ajout au panier, mise à jour de la quantité,
+commande. Le rapport donne le débit, les latences p50/p95/p99 par étape, les erreurs
+de verrou de la base et la survente éventuelle.
+
+Un article de test, inactif et sans catégorie (absent des listes et de la recherche de la
+boutique), est créé pour la durée du test puis supprimé avec ses commandes, même si le test
+est interrompu (sauf --keep). Exemple :
+
+    python manage.py loadtest_checkout --shoppers 200 --concurrency 20 --stock 50
+"""
+
+import http.cookiejar
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.core.signals import got_request_exception
+from django.db import OperationalError
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from store.models import Product, ProductVariant
+
+STEPS = ('panier', 'ajout', 'quantite', 'commande')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """La redirection vers la confirmation suffit à constater le succès : elle n'est pas suivie."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def percentile(values, rank):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(rank / 100 * (len(values) - 1))))]
+
+
+class Shopper:
+    """Un client simulé : ses propres cookies (session, CSRF), des requêtes chronométrées."""
+
+    def __init__(self, base_url, timings, timings_lock):
+        self.base_url = base_url
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.timings = timings
+        self.timings_lock = timings_lock
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, step, path, data=None):
+        """Retourne (statut, en-têtes) ; la latence est enregistrée pour l'étape."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body)
+        if body is not None:
+            request.add_header('X-CSRFToken', self.csrf_token())
+            request.add_header('Referer', self.base_url + '/')
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            e.read()
+            status, headers = e.code, e.headers
+        elapsed = time.perf_counter() - start
+        with self.timings_lock:
+            self.timings[step].append(elapsed)
+        return status, headers
+
+    def run(self, variant, quantity):
+        """Parcours complet d'achat ; retourne 'ok', 'stock' (refus propre) ou 'erreur'."""
+        self.request('panier', reverse('cart'))
+        status, _ = self.request('ajout', reverse('add_to_cart'), {'variant_id': variant.id})
+        if status == 400:
+            return 'stock'
+        if status != 200:
+            return 'erreur'
+        if quantity > 1:
+            key = f"{variant.product_id}-{variant.id}"
+            status, _ = self.request('quantite', reverse('update_cart_quantity', args=[key]), {'quantity': quantity})
+            if status == 400:
+                return 'stock'
+            if status != 200:
+                return 'erreur'
+        status, headers = self.request('commande', reverse('checkout'), {
+            'full_name': 'Client Test de charge',
+            'phone_number': '0000000000',
+            'address_line_1': 'Test de charge',
+            'payment_method': 'Cash',
+        })
+        location = headers.get('Location', '')
+        if status == 302 and '/confirmation/' in location:
+            return 'ok'
+        if status == 302:
+            # Redirection vers le panier : stock insuffisant signalé au client
+            return 'stock'
+        return 'erreur'
+
+
+class Command(BaseCommand):
+    help = "Simule des achats simultanés sur une même variante et mesure débit, latences, verrous et survente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', type=int, default=100, help="Nombre total de clients simulés.")
+        parser.add_argument('--concurrency', type=int, default=10, help="Clients actifs en même temps.")
+        parser.add_argument('--stock', type=int, default=50, help="Stock initial de la variante testée.")
+        parser.add_argument('--quantity', type=int, default=1, help="Quantité achetée par client.")
+        parser.add_argument('--keep', action='store_true', help="Conserve l'article et les commandes de test.")
+
+    def handle(self, *args, **options):
+        variant = self.create_fixture(options['stock'])
+        try:
+            self.run_test(variant, options)
+        finally:
+            # Nettoyage garanti, y compris après une erreur ou un Ctrl-C
+            if not options['keep']:
+                self.delete_fixture(variant)
+
+    def run_test(self, variant, options):
+        lock_errors = []
+        other_errors = []
+
+        def on_exception(sender, request=None, **kwargs):
+            error = sys.exc_info()[1]
+            if isinstance(error, OperationalError) and 'locked' in str(error):
+                lock_errors.append(error)
+            else:
+                other_errors.append(error)
+
+        got_request_exception.connect(on_exception)
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_internal_wsgi_application())
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        timings = defaultdict(list)
+        timings_lock = threading.Lock()
+        try:
+            self.stdout.write(
+                f"{options['shoppers']} clients ({options['concurrency']} simultanés), "
+                f"stock initial {options['stock']}, {options['quantity']} unité(s) chacun, sur {base_url}"
+            )
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                futures = [
+                    executor.submit(Shopper(base_url, timings, timings_lock).run, variant, options['quantity'])
+                    for _ in range(options['shoppers'])
+                ]
+                outcomes = defaultdict(int)
+                for future in futures:
+                    try:
+                        outcomes[future.result()] += 1
+                    except Exception:
+                        outcomes['erreur'] += 1
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+            got_request_exception.disconnect(on_exception)
+
+        self.report(variant, options, outcomes, timings, elapsed, lock_errors, other_errors)
+
+    def create_fixture(self, stock):
+        stamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        # Ni catégorie (le menu de la boutique les liste toutes) ni visibilité en boutique
+        product = Product.objects.create(
+            name=f"Article test de charge {stamp}", price=Decimal('10.00'),
+            description="Article créé par loadtest_checkout.", is_active=False,
+        )
+        return ProductVariant.objects.create(product=product, size='TU', stock=stock)
+
+    def delete_fixture(self, variant):
+        product = variant.product
+        Order.objects.filter(items__product=product).delete()
+        product.delete()
+
+    def report(self, variant, options, outcomes, timings, elapsed, lock_errors, other_errors):
+        variant.refresh_from_db()
+        sold = OrderItem.objects.filter(product=variant.product).aggregate(total=Sum('quantity'))['total'] or 0
+        oversell = max(0, sold - options['stock'])
+        requests_count = sum(len(values) for values in timings.values())
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"Durée : {elapsed:.2f} s — {outcomes['ok'] / elapsed:.1f} commandes/s, "
+            f"{requests_count / elapsed:.1f} requêtes/s"
+        )
+        self.stdout.write(
+            f"Commandes : {outcomes['ok']} réussies, {outcomes['stock']} refusées (stock), "
+            f"{outcomes['erreur']} en erreur"
+        )
+        self.stdout.write("Latences (ms) :      n      p50      p95      p99      max")
+        for step in STEPS:
+            values = timings.get(step)
+            if not values:
+                continue
+            self.stdout.write(
+                f"  {step:<12} {len(values):>8} {percentile(values, 50) * 1000:>8.1f} "
+                f"{percentile(values, 95) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f} "
+                f"{max(values) * 1000:>8.1f}"
+            )
+        self.stdout.write(f"Erreurs de verrou (database is locked) : {len(lock_errors)}")
+        if other_errors:
+            self.stdout.write(f"Autres exceptions serveur : {len(other_errors)} (ex : {other_errors[0]!r})")
+
+        summary = f"Vendu : {sold} / stock initial {options['stock']}, stock final {variant.stock}"
+        if oversell or variant.stock < 0:
+            self.stdout.write(self.style.ERROR(f"{summary} — SURVENTE de {max(oversell, -variant.stock)} unité(s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary} — aucune survente"))
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from store.models import Product, ProductSearchDocument
+from store.search import index_products
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les documents de recherche (et l'index FTS5) de tous les articles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ProductSearchDocument.objects.all().delete()
+
+        batch = []
+        total = 0
+        for product in Product.objects.only('id', 'name', 'description').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                index_products(batch)
+                total += len(batch)
+                batch = []
+        index_products(batch)
+        total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} articles indexés."))
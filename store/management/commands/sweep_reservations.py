@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.idempotency import purge_expired_keys
+from store.reservations import sweep_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les réservations de stock expirées (et publie le stock libéré) "
+        "ainsi que les clés d'idempotence expirées. "
+        "À lancer régulièrement (cron), ou en continu avec --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Répète le nettoyage toutes les N secondes (0 : un seul passage).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sweep_expired(batch_size=options['batch_size'])
+            keys = purge_expired_keys()
+            self.stdout.write(self.style.SUCCESS(
+                f"{deleted} réservations expirées supprimées, {keys} clés d'idempotence expirées supprimées."
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
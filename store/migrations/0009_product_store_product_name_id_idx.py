@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_shopconfiguration_remove_orderitem_order_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='store_product_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import unicodedata
+
+
+FTS_TABLE = 'store_product_fts'
+DOCUMENT_TABLE = 'store_productsearchdocument'
+
+
+def fold(text):
+    """Minuscules sans accents (copie figée de store.search.fold pour cette migration)."""
+    decomposed = unicodedata.normalize('NFKD', (text or '').lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def create_fts_index(apps, schema_editor):
+    """Crée la table FTS5 (SQLite uniquement) synchronisée par triggers avec les documents."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"name, content, content='{DOCUMENT_TABLE}', content_rowid='product_id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite compilé sans FTS5 : store.search bascule sur la recherche portable
+            return
+        cursor.execute(
+            f"CREATE TRIGGER {DOCUMENT_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, name, content) VALUES (new.product_id, new.name, new.content); "
+            f"END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {DOCUMENT_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, content) "
+            f"VALUES ('delete', old.product_id, old.name, old.content); "
+            f"END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {DOCUMENT_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, content) "
+            f"VALUES ('delete', old.product_id, old.name, old.content); "
+            f"INSERT INTO {FTS_TABLE}(rowid, name, content) VALUES (new.product_id, new.name, new.content); "
+            f"END"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {DOCUMENT_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductSearchDocument = apps.get_model('store', 'ProductSearchDocument')
+    documents = [
+        ProductSearchDocument(product_id=product_id, name=fold(name), content=fold(description))
+        for product_id, name, description in Product.objects.values_list('id', 'name', 'description').iterator()
+    ]
+    ProductSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_product_store_product_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='store.product')),
+                ('name', models.TextField()),
+                ('content', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='stock_version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:40
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def create_counter(apps, schema_editor):
+    # Le compteur reprend à la plus grande version déjà attribuée
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+    StockVersionCounter = apps.get_model('store', 'StockVersionCounter')
+    version = ProductVariant.objects.aggregate(version=Max('stock_version'))['version'] or 0
+    StockVersionCounter.objects.update_or_create(pk=1, defaults={'value': version})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockVersionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Compteur de versions de stock',
+                'verbose_name_plural': 'Compteur de versions de stock',
+            },
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_cacheversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemovedVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant_id', models.BigIntegerField(unique=True)),
+                ('product_id', models.BigIntegerField()),
+                ('stock_version', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Variante supprimée',
+                'verbose_name_plural': 'Variantes supprimées',
+            },
+        ),
+    ]
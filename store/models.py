@@ -1,6 +1,7 @@
 from django.db import models
 from django.db.models import Sum  # NOUVEL IMPORT : Pour calculer la somme du stock
 from django.utils.text import slugify
+from django.utils import timezone
 
 
 # NOUVEAU/RÉINTÉGRÉ : Modèle pour les catégories
@@ -36,6 +37,15 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Article"
         verbose_name_plural = "Articles"
+        # Index de la pagination par curseur de la boutique (tri par nom puis id)
+        indexes = [models.Index(fields=['name', 'id'], name='store_product_name_id_idx')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémorise l'état chargé pour détecter l'activation ou la désactivation lors du save()
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        return instance
 
     def save(self, *args, **kwargs):
         # Génère automatiquement le slug à partir du nom s'il n'est pas défini
@@ -47,6 +57,14 @@ class Product(models.Model):
     @property
     def total_stock(self):
         """Calcule la somme du stock de toutes les variantes disponibles de ce produit (via DB aggregation)."""
+        # Réutilise l'annotation posée par store.catalog.with_stock (aucune requête supplémentaire)
+        annotated = getattr(self, 'annotated_total_stock', None)
+        if annotated is not None:
+            return annotated
+        # Sinon, réutilise les variantes en stock déjà préchargées
+        prefetched = getattr(self, 'in_stock_variants', None)
+        if prefetched is not None:
+            return sum(variant.stock for variant in prefetched)
         # Utilisation de .aggregate pour une meilleure performance
         return self.variants.filter(stock__gt=0).aggregate(Sum('stock'))['stock__sum'] or 0
 
@@ -60,11 +78,33 @@ class Product(models.Model):
         return self.name
 
 
+# Document de recherche d'un article (texte normalisé, indexé par store/search.py)
+class ProductSearchDocument(models.Model):
+    """
+    Nom et description d'un article en minuscules et sans accents.
+    Sous SQLite, la table virtuelle FTS5 'store_product_fts' est synchronisée
+    avec cette table par des triggers (voir la migration 0010).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='search_document')
+    name = models.TextField()
+    content = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Document de recherche"
+        verbose_name_plural = "Documents de recherche"
+
+    def __str__(self):
+        return self.name
+
+
 # NOUVEAU MODÈLE : Gestion des variantes par taille
 class ProductVariant(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
     size = models.CharField(max_length=50, verbose_name="Taille")  # Ex: 46, 48, 50, S, M, L
     stock = models.IntegerField(default=0, verbose_name="Stock disponible")
+    # Version du stock à la dernière modification (curseur du polling différentiel, voir store/stock.py)
+    stock_version = models.BigIntegerField(default=0, db_index=True, editable=False)
 
     class Meta:
         # Assure qu'on ne peut pas avoir deux fois la même taille pour le même produit
@@ -72,10 +112,120 @@ class ProductVariant(models.Model):
         verbose_name = "Variante d'Article"
         verbose_name_plural = "Variantes d'Articles"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémorise le stock chargé pour détecter sa modification lors du save()
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # stock_version n'est écrit que par store/stock.py : une instance chargée avant
+        # une commande ne doit pas réécrire une version plus ancienne.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'stock_version'
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.product.name} - {self.size} (Stock: {self.stock})"
 
 
+# Réservation temporaire du stock d'une variante par un panier (voir store/reservations.py)
+class StockReservation(models.Model):
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    # Jeton du panier détenteur (Cart.token), indépendant du stockage du panier
+    cart_token = models.CharField(max_length=64)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_token', 'variant'], name='store_reservation_cart_variant_uniq'),
+        ]
+        verbose_name = "Réservation de stock"
+        verbose_name_plural = "Réservations de stock"
+
+    def __str__(self):
+        return f"{self.quantity} x {self.variant_id} ({self.cart_token[:8]}, jusqu'à {self.expires_at:%H:%M})"
+
+
+# Compteur des versions de stock (une seule ligne, voir store/stock.py)
+class StockVersionCounter(models.Model):
+    """
+    Dernière version de stock attribuée. Incrémentée par un UPDATE ... SET value = value + 1
+    dans la transaction qui modifie le stock : deux transactions ne peuvent pas obtenir la
+    même version, et la ligne reste verrouillée jusqu'à la validation.
+    """
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compteur de versions de stock"
+        verbose_name_plural = "Compteur de versions de stock"
+
+    def __str__(self):
+        return f"Version de stock {self.value}"
+
+
+# Variante supprimée, signalée aux clients du polling différentiel (voir store/stock.py)
+class RemovedVariant(models.Model):
+    # Identifiants conservés sans clé étrangère : la variante (voire l'article) n'existe plus
+    variant_id = models.BigIntegerField(unique=True)
+    product_id = models.BigIntegerField()
+    stock_version = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        verbose_name = "Variante supprimée"
+        verbose_name_plural = "Variantes supprimées"
+
+    def __str__(self):
+        return f"Variante {self.variant_id} supprimée (version {self.stock_version})"
+
+
+# Versions du cache partagé (catalogue, configuration, cumul des ventes : voir store/cache.py)
+class CacheVersion(models.Model):
+    """
+    Valeur de référence d'une version du cache, incrémentée en base (UPDATE ... SET value =
+    value + 1) : une incrémentation n'est jamais perdue entre workers, et une version évincée
+    du cache est relue ici au lieu de repartir d'une valeur arbitraire.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Version du cache"
+        verbose_name_plural = "Versions du cache"
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+# Clé d'idempotence d'un POST (voir store/idempotency.py)
+class IdempotencyKey(models.Model):
+    """
+    Première requête reçue pour (panier, vue, clé). La contrainte d'unicité garantit qu'une
+    seule requête concurrente l'enregistre : les autres rejouent sa réponse (`response`),
+    vide tant qu'elle est en cours.
+    """
+    owner = models.CharField(max_length=64)
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=128)
+    response = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'scope', 'key'], name='store_idempotency_owner_scope_key_uniq'),
+        ]
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+
+    def __str__(self):
+        return f"{self.scope} {self.key[:12]} ({'traitée' if self.response is not None else 'en cours'})"
+
+
 # ==========================================================
 # NOUVEAU MODÈLE : Configuration de la Boutique (Email/Téléphone)
 # ==========================================================
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Pagination par curseur (keyset).
+
+Au lieu d'un OFFSET (dont le coût croît avec le numéro de page), on mémorise
+les valeurs de tri du dernier élément affiché et la page suivante est obtenue
+par une condition « strictement après ce tuple ». Avec un index sur les
+colonnes de tri, le temps de réponse reste constant quelle que soit la
+taille du catalogue.
+"""
+
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Curseur illisible ou falsifié."""
+
+
+def encode_cursor(values):
+    """Encode les valeurs de tri du dernier élément en jeton URL-safe."""
+    raw = json.dumps(values, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Décode un jeton produit par encode_cursor ; lève InvalidCursor s'il est invalide."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Curseur de pagination invalide.")
+    return values
+
+
+def _ordering_field(queryset, name):
+    """Champ (ou type d'annotation) d'une colonne de tri."""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    if name == 'pk':
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(name)
+
+
+def clean_cursor_values(queryset, ordering, values):
+    """
+    Convertit les valeurs décodées d'un curseur au type de leur colonne de tri
+    (field.to_python) ; lève InvalidCursor si l'une d'elles ne convient pas.
+    """
+    cleaned = []
+    for field, value in zip(ordering, values):
+        # Seules des valeurs simples sortent d'encode_cursor (ni liste, ni objet, ni null)
+        if value is None or isinstance(value, (list, dict)):
+            raise InvalidCursor("Curseur de pagination invalide.")
+        try:
+            cleaned.append(_ordering_field(queryset, field.lstrip('-')).to_python(value))
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            raise InvalidCursor("Curseur de pagination invalide.")
+    return cleaned
+
+
+def _after_filter(ordering, values):
+    """
+    Construit la condition « (a, b, ...) strictement après (va, vb, ...) » selon le sens
+    de chaque colonne : (a > va) OR (a = va AND b > vb) OR ...
+    """
+    clauses = []
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {f.lstrip('-'): values[j] for j, f in enumerate(ordering[:i])}
+        clauses.append(Q(**equal, **{f"{name}__{lookup}": values[i]}))
+    return reduce(or_, clauses)
+
+
+class KeysetPage:
+    """Une page de résultats et le curseur de la page suivante (None si dernière page)."""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=24):
+    """
+    Retourne une KeysetPage de `queryset` triée selon `ordering` (ex: ('name', 'id') ou ('-id',)).
+    La dernière colonne doit être unique (clé primaire) pour garantir un ordre total.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = clean_cursor_values(queryset, ordering, decode_cursor(cursor, len(ordering)))
+        queryset = queryset.filter(_after_filter(ordering, values))
+
+    # Un élément de plus que nécessaire pour savoir s'il existe une page suivante
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Réservations temporaires du stock par les paniers.
+
+Ajouter un article au panier réserve les unités pendant STOCK_RESERVATION_TTL
+secondes (prolongées à chaque modification du panier et à l'affichage de la
+commande). Le stock disponible pour un panier est donc
+`stock - réservations actives des autres paniers`.
+
+Les vérifications qui engagent le stock (réservation, commande) lisent les
+réservations en base, sous verrou. L'affichage (get_all_variant_stocks, flux SSE)
+lit seulement le total réservé par variante, gardé dans le cache partagé.
+Une réservation expirée ne compte plus, même avant le passage de la commande
+`sweep_reservations` : l'entrée du cache expire avec la première réservation,
+et son recalcul donne une nouvelle version de stock aux variantes dont le total
+a changé (voir refresh_holds). La commande supprime ensuite les lignes expirées.
+"""
+
+import math
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ProductVariant, StockReservation
+from .stock import bump_stock_version, current_stock_version
+
+HOLDS_KEY = 'stock:holds'
+
+# Dernier total réservé publié aux navigateurs (sans expiration) : sert de référence
+# pour détecter, au recalcul, les variantes dont la disponibilité a changé
+PUBLISHED_HOLDS_KEY = 'stock:holds:published'
+
+# Durée maximale (secondes) pendant laquelle le total des réservations reste en cache
+HOLDS_CACHE_TIMEOUT = 60
+
+
+def reservation_expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+
+def active_reservations(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+# =========================================================================
+# Total réservé par variante (lecture pour l'affichage)
+# =========================================================================
+
+def refresh_holds(published=()):
+    """
+    Recalcule {variant_id: quantité réservée} depuis la base et le remet en cache.
+    Les variantes dont le total diffère du dernier total publié (réservation expirée,
+    en général) reçoivent une nouvelle version de stock, sauf celles de `published`
+    dont le changement vient d'être versionné par l'appelant.
+    """
+    now = timezone.now()
+    rows = active_reservations(now).values('variant_id').annotate(held=Sum('quantity'), first_expiry=Min('expires_at'))
+    holds = {}
+    first_expiry = None
+    for row in rows:
+        holds[row['variant_id']] = row['held']
+        if first_expiry is None or row['first_expiry'] < first_expiry:
+            first_expiry = row['first_expiry']
+
+    # L'entrée expire au plus tard avec la première réservation : le total ne survit pas à une expiration
+    timeout = HOLDS_CACHE_TIMEOUT
+    if first_expiry is not None:
+        timeout = max(1, min(timeout, math.ceil((first_expiry - now).total_seconds())))
+    cache.set(HOLDS_KEY, holds, timeout=timeout)
+
+    # Mis en cache avant la nouvelle version : un client qui la lit relit déjà ce total
+    previous = cache.get(PUBLISHED_HOLDS_KEY)
+    cache.set(PUBLISHED_HOLDS_KEY, holds, timeout=None)
+    if previous is not None:
+        changed = {
+            variant_id for variant_id in previous.keys() | holds.keys()
+            if previous.get(variant_id, 0) != holds.get(variant_id, 0)
+        }
+        bump_stock_version(changed - set(published))
+    return holds
+
+
+def active_holds():
+    """{variant_id: quantité réservée} des variantes ayant des réservations actives (cache)."""
+    holds = cache.get(HOLDS_KEY)
+    if holds is None:
+        holds = refresh_holds()
+    return holds
+
+
+def availability_version():
+    """
+    Version courante du stock disponible : comme current_stock_version, mais le total réservé
+    est d'abord relu s'il a expiré, pour que l'expiration d'une réservation change la version.
+    """
+    active_holds()
+    return current_stock_version()
+
+
+def _holds_changed(variant_ids):
+    """Publie le changement de disponibilité (version de stock) et recalcule le total en cache."""
+    variant_ids = list(variant_ids)
+    # Enregistré avant la publication de la version (les on_commit s'exécutent dans l'ordre) :
+    # un client qui lit la nouvelle version lit aussi le nouveau total
+    transaction.on_commit(lambda: refresh_holds(published=variant_ids))
+    bump_stock_version(variant_ids)
+
+
+# =========================================================================
+# Réservations d'un panier
+# =========================================================================
+
+def held_by_others(cart_token):
+    """
+    Expression SQL : quantité réservée sur la variante courante (OuterRef('pk'))
+    par les autres paniers, 0 si aucune.
+    """
+    others = active_reservations().filter(variant=OuterRef('pk'))
+    if cart_token:
+        others = others.exclude(cart_token=cart_token)
+    held = others.values('variant').annotate(held=Sum('quantity')).values('held')
+    return Coalesce(Subquery(held), 0)
+
+
+def available_stocks(variant_ids, cart_token=None):
+    """{variant_id: stock disponible pour ce panier} (stock moins les réservations des autres paniers)."""
+    return dict(
+        ProductVariant.objects.filter(pk__in=variant_ids)
+        .annotate(available=F('stock') - held_by_others(cart_token))
+        .values_list('id', 'available')
+    )
+
+
+def reserve(variant_id, cart_token, quantity):
+    """
+    Fixe à `quantity` la réservation du panier sur la variante (prolongée pour une durée complète).
+    Retourne (réservé, disponible) où `disponible` est le stock disponible pour ce panier
+    (None si la variante n'existe plus). Rien n'est réservé si `quantity` dépasse ce disponible.
+    """
+    with transaction.atomic():
+        # L'écriture passe en premier (UPDATE puis INSERT, et non update_or_create qui lit d'abord) :
+        # sous SQLite, le verrou d'écriture est pris d'emblée au lieu d'échouer lors de la promotion
+        expires_at = reservation_expiry()
+        updated = StockReservation.objects.filter(variant_id=variant_id, cart_token=cart_token).update(
+            quantity=quantity, expires_at=expires_at,
+        )
+        if not updated:
+            StockReservation.objects.create(
+                variant_id=variant_id, cart_token=cart_token, quantity=quantity, expires_at=expires_at,
+            )
+        # Sous PostgreSQL/MySQL, sérialise les réservations concurrentes sur la même variante
+        variant = (
+            ProductVariant.objects.select_for_update()
+            .filter(pk=variant_id)
+            .annotate(available=F('stock') - held_by_others(cart_token))
+            .values('available')
+            .first()
+        )
+        available = None if variant is None else max(variant['available'], 0)
+        if available is None or quantity > available:
+            transaction.set_rollback(True)
+            return False, available
+        _holds_changed([variant_id])
+    return True, available
+
+
+def reserve_many(cart_token, quantities):
+    """
+    Version groupée de reserve() : fixe en une transaction les réservations du panier pour
+    {variant_id: quantité} (0 : libération). Le stock disponible de toutes les variantes est
+    lu en une requête ; une quantité qui le dépasse est ramenée au disponible.
+    Retourne {variant_id: disponible} (None si la variante n'existe plus).
+    """
+    held = {variant_id: quantity for variant_id, quantity in quantities.items() if quantity > 0}
+    released = [variant_id for variant_id, quantity in quantities.items() if quantity <= 0]
+    result = {variant_id: None for variant_id in quantities}
+    if not quantities:
+        return result
+
+    with transaction.atomic():
+        # Écritures d'abord (même raison que dans reserve)
+        if released:
+            StockReservation.objects.filter(cart_token=cart_token, variant_id__in=released).delete()
+        if held:
+            expires_at = reservation_expiry()
+            StockReservation.objects.bulk_create(
+                [
+                    StockReservation(variant_id=variant_id, cart_token=cart_token, quantity=quantity, expires_at=expires_at)
+                    for variant_id, quantity in held.items()
+                ],
+                update_conflicts=True, unique_fields=['cart_token', 'variant'], update_fields=['quantity', 'expires_at'],
+            )
+        available = dict(
+            ProductVariant.objects.select_for_update().filter(pk__in=quantities)
+            .annotate(available=F('stock') - held_by_others(cart_token))
+            .values_list('id', 'available')
+        )
+        for variant_id in quantities:
+            if variant_id in available:
+                result[variant_id] = max(available[variant_id], 0)
+
+        # Lignes en dépassement (ou variantes disparues) : réservation ramenée au disponible
+        for variant_id, quantity in held.items():
+            if result[variant_id] is None or result[variant_id] <= 0:
+                StockReservation.objects.filter(cart_token=cart_token, variant_id=variant_id).delete()
+            elif quantity > result[variant_id]:
+                StockReservation.objects.filter(cart_token=cart_token, variant_id=variant_id).update(
+                    quantity=result[variant_id],
+                )
+        _holds_changed([variant_id for variant_id in quantities if variant_id in available])
+    return result
+
+
+def release(cart_token, variant_ids=None):
+    """Libère les réservations du panier (toutes, ou seulement celles des variantes données)."""
+    if not cart_token:
+        return
+    reservations = StockReservation.objects.filter(cart_token=cart_token)
+    if variant_ids is not None:
+        reservations = reservations.filter(variant_id__in=variant_ids)
+    released = list(reservations.values_list('variant_id', flat=True))
+    if released:
+        with transaction.atomic():
+            reservations.delete()
+            _holds_changed(released)
+
+
+def renew(cart_token):
+    """Prolonge les réservations encore actives du panier (ex : à l'affichage du formulaire de commande)."""
+    if cart_token:
+        active_reservations().filter(cart_token=cart_token).update(expires_at=reservation_expiry())
+
+
+def sweep_expired(batch_size=1000):
+    """
+    Supprime les réservations expirées par lots et publie le stock libéré.
+    Retourne le nombre de réservations supprimées.
+    """
+    total = 0
+    while True:
+        expired = list(
+            StockReservation.objects.filter(expires_at__lte=timezone.now())
+            .values_list('pk', 'variant_id')[:batch_size]
+        )
+        if not expired:
+            break
+        with transaction.atomic():
+            # Une réservation prolongée entre-temps n'est pas supprimée
+            StockReservation.objects.filter(
+                pk__in=[pk for pk, variant_id in expired], expires_at__lte=timezone.now(),
+            ).delete()
+            _holds_changed({variant_id for pk, variant_id in expired})
+        total += len(expired)
+    return total
+
+
+# Versions pour les vues asynchrones : les transactions restent synchrones sous Django 4.2,
+# elles s'exécutent donc dans un thread sans bloquer la boucle asyncio.
+areserve = sync_to_async(reserve)
+arelease = sync_to_async(release)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Recherche plein texte du catalogue.
+
+Chaque article possède un ProductSearchDocument (nom et description en
+minuscules, sans accents), tenu à jour par les signaux de store/signals.py.
+Sous SQLite, la table virtuelle FTS5 'store_product_fts' indexe ces documents
+(préfixes, classement BM25) ; sur une base sans FTS5, une recherche portable
+sur les documents normalisés prend le relais.
+
+Les résultats ne sont pas plafonnés : la boutique les parcourt par pertinence avec
+un curseur (score, id) appliqué dans la requête de recherche elle-même, comme la
+pagination keyset du catalogue (store/pagination.py). Les filtres des vues
+(catégorie, visibilité) font partie de cette requête.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import ProductSearchDocument
+from .pagination import InvalidCursor, KeysetPage, decode_cursor, encode_cursor, paginate_keyset
+
+FTS_TABLE = 'store_product_fts'
+
+# Poids BM25 des colonnes (nom, description) : un mot du nom compte davantage
+NAME_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+_fts_available = None
+
+
+def fold(text):
+    """Normalise un texte pour l'index : minuscules et accents retirés ('Été' -> 'ete')."""
+    decomposed = unicodedata.normalize('NFKD', (text or '').lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(query):
+    """Découpe une recherche normalisée en mots (les guillemets et opérateurs sont ignorés)."""
+    return re.findall(r'\w+', fold(query))
+
+
+def fts_available():
+    """True si la table FTS5 existe (SQLite compilé avec FTS5 et migration appliquée)."""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def build_document(product):
+    return ProductSearchDocument(product_id=product.pk, name=fold(product.name), content=fold(product.description))
+
+
+def index_products(products):
+    """
+    Crée ou met à jour les documents de recherche de plusieurs articles en une requête
+    (les triggers SQLite répercutent le changement dans la table FTS5).
+    """
+    documents = [build_document(product) for product in products]
+    if documents:
+        ProductSearchDocument.objects.bulk_create(
+            documents, update_conflicts=True, unique_fields=['product'], update_fields=['name', 'content'],
+        )
+
+
+def _fts_match(terms):
+    # Chaque mot est cherché comme préfixe ("ete"* trouve "été", "étés"...) ; tous doivent être présents
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+
+def _search_fts(terms, within, after, limit):
+    """
+    (id, score) des articles de `within` qui suivent `after` (score, id), du plus pertinent
+    au moins pertinent (score BM25 croissant), au plus `limit`.
+    """
+    # Le rowid de la table FTS5 est l'id de l'article
+    subquery, params = within.order_by().values('pk').query.sql_with_params()
+    position, position_params = '', []
+    if after is not None:
+        position = "WHERE score > %s OR (score = %s AND rowid > %s) "
+        position_params = [after[0], after[0], after[1]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, score FROM ("
+            f"SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS score FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({subquery})"
+            f") {position}ORDER BY score, rowid LIMIT %s",
+            [NAME_WEIGHT, CONTENT_WEIGHT, _fts_match(terms), *params, *position_params, limit],
+        )
+        return cursor.fetchall()
+
+
+def _portable_filter(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(Q(search_document__name__contains=term) | Q(search_document__content__contains=term))
+    return queryset
+
+
+def _portable_score(terms):
+    score = Value(0)
+    for term in terms:
+        score = score + Case(
+            When(search_document__name__startswith=term, then=Value(int(NAME_WEIGHT) * 2)),
+            When(search_document__name__contains=term, then=Value(int(NAME_WEIGHT))),
+            default=Value(int(CONTENT_WEIGHT)),
+            output_field=IntegerField(),
+        )
+    return score
+
+
+def _fts_cursor(cursor):
+    """Décode un curseur (score, id) de la recherche FTS5 ; lève InvalidCursor s'il est invalide."""
+    score, product_id = decode_cursor(cursor, 2)
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or type(product_id) is not int:
+        raise InvalidCursor("Curseur de pagination invalide.")
+    return float(score), product_id
+
+
+def search_page(queryset, query, cursor=None, page_size=24):
+    """
+    Page (KeysetPage) des articles de `queryset` correspondant à la recherche, du plus
+    pertinent au moins pertinent. Le curseur porte le score et l'id du dernier article :
+    la page suivante est lue par la requête de recherche, sans limite sur le nombre total
+    de résultats.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return KeysetPage([], None)
+    if not fts_available():
+        products = _portable_filter(queryset, terms).annotate(search_score=_portable_score(terms))
+        return paginate_keyset(products, ('-search_score', 'id'), cursor, page_size)
+
+    after = _fts_cursor(cursor) if cursor else None
+    # Un résultat de plus que nécessaire pour savoir s'il existe une page suivante
+    rows = _search_fts(terms, queryset, after, page_size + 1)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_pk, last_score = rows[-1]
+        next_cursor = encode_cursor([last_score, last_pk])
+    products = {product.pk: product for product in queryset.filter(pk__in=[pk for pk, score in rows])}
+    return KeysetPage([products[pk] for pk, score in rows if pk in products], next_cursor)
+
+
+def filter_by_search(queryset, query):
+    """Restreint une QuerySet d'articles aux résultats de la recherche (sans ordre de pertinence)."""
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    if fts_available():
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_match(terms)],
+        ))
+    return _portable_filter(queryset, terms)
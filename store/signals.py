@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Récepteurs de signaux de l'application store (connectés dans StoreConfig.ready)."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version, invalidate_shop_config
+from .search import index_products
+from .stock import bump_product_stock_version, bump_stock_version, record_removed_variants
+from .models import Category, Product, ProductVariant, ShopConfiguration
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ShopConfiguration)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Toute modification du catalogue (ou des contacts affichés) invalide les pages en cache."""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    """Tient à jour le document de recherche (et donc l'index FTS5) de l'article."""
+    index_products([instance])
+
+
+@receiver(post_save, sender=ProductVariant)
+def version_stock_change(sender, instance, created, update_fields=None, **kwargs):
+    """Donne une nouvelle version de stock à la variante si son stock a été créé ou modifié."""
+    if update_fields is not None and 'stock' not in update_fields:
+        return
+    if created or instance.stock != getattr(instance, '_loaded_stock', None):
+        bump_stock_version([instance.pk])
+        if isinstance(instance.stock, int):
+            instance._loaded_stock = instance.stock
+
+
+@receiver(post_save, sender=Product)
+def version_product_visibility(sender, instance, created, **kwargs):
+    """Activer ou désactiver un article change la disponibilité affichée de toutes ses variantes."""
+    if not created and instance.is_active != getattr(instance, '_loaded_is_active', instance.is_active):
+        bump_product_stock_version([instance.pk])
+    instance._loaded_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=ProductVariant)
+def version_variant_removal(sender, instance, **kwargs):
+    """Une variante supprimée est signalée (stock null) aux clients du polling et du flux SSE."""
+    record_removed_variants([instance])
+
+
+@receiver(post_save, sender=ShopConfiguration)
+@receiver(post_delete, sender=ShopConfiguration)
+def invalidate_shop_config_cache(sender, **kwargs):
+    """Force tous les workers à relire la configuration au prochain accès."""
+    invalidate_shop_config()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Versionnement du stock des variantes.
+
+Chaque modification du stock d'une variante lui attribue une nouvelle version
+globale (ProductVariant.stock_version), prise dans un compteur en base
+(StockVersionCounter, incrémenté par UPDATE ... SET value = value + 1) : deux
+transactions concurrentes obtiennent toujours deux versions distinctes. La version
+courante est gardée dans le cache partagé : un client qui interroge
+`ajax/get_stock_data/?since=<version>` ne reçoit que les variantes modifiées
+depuis, et une simple lecture du cache suffit quand rien n'a changé.
+
+Une variante retirée de la boutique (supprimée, ou dont l'article est désactivé)
+reçoit elle aussi une nouvelle version : les réponses différentielles la signalent
+avec un stock null.
+"""
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ProductVariant, RemovedVariant, StockVersionCounter
+
+STOCK_VERSION_KEY = 'stock:version'
+
+COUNTER_PK = 1
+
+
+def _counter_value():
+    return StockVersionCounter.objects.filter(pk=COUNTER_PK).values_list('value', flat=True).first() or 0
+
+
+def _next_version():
+    """
+    Incrémente le compteur puis relit sa valeur (dans la transaction appelante). L'écriture
+    vient en premier : la ligne (ou la base SQLite) est verrouillée avant la lecture, et le
+    reste jusqu'à la validation.
+    """
+    with transaction.atomic():
+        if not StockVersionCounter.objects.filter(pk=COUNTER_PK).update(value=F('value') + 1):
+            try:
+                with transaction.atomic():
+                    StockVersionCounter.objects.create(pk=COUNTER_PK, value=1)
+            except IntegrityError:
+                # Créé entre-temps par une autre transaction
+                StockVersionCounter.objects.filter(pk=COUNTER_PK).update(value=F('value') + 1)
+        return _counter_value()
+
+
+def current_stock_version():
+    """Version courante du stock (lue dans le cache, relue depuis le compteur si absente)."""
+    version = cache.get(STOCK_VERSION_KEY)
+    if version is None:
+        version = _counter_value()
+        cache.add(STOCK_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def bump_stock_version(variant_ids):
+    """
+    Marque les variantes comme modifiées avec une nouvelle version globale.
+    À appeler après toute écriture du stock qui ne passe pas par ProductVariant.save()
+    (QuerySet.update, bulk_update...). Retourne la nouvelle version.
+    """
+    variant_ids = list(variant_ids)
+    if not variant_ids:
+        return current_stock_version()
+
+    with transaction.atomic():
+        version = _next_version()
+        ProductVariant.objects.filter(pk__in=variant_ids).update(stock_version=version)
+
+    # Publié après validation : un client ne doit pas avancer son curseur
+    # au-delà de changements encore invisibles pour lui.
+    transaction.on_commit(lambda: _publish_version(version))
+    return version
+
+
+def bump_product_stock_version(product_ids):
+    """Nouvelle version pour toutes les variantes des articles (activés ou désactivés)."""
+    return bump_stock_version(
+        ProductVariant.objects.filter(product_id__in=list(product_ids)).values_list('pk', flat=True)
+    )
+
+
+def record_removed_variants(variants):
+    """
+    Enregistre la suppression des variantes sous une nouvelle version : les clients qui
+    interrogent `since` reçoivent un stock null et retirent la variante de l'affichage.
+    """
+    variants = list(variants)
+    if not variants:
+        return current_stock_version()
+
+    with transaction.atomic():
+        version = _next_version()
+        RemovedVariant.objects.bulk_create([
+            RemovedVariant(variant_id=variant.pk, product_id=variant.product_id, stock_version=version)
+            for variant in variants
+        ], ignore_conflicts=True)
+
+    transaction.on_commit(lambda: _publish_version(version))
+    return version
+
+
+def _publish_version(version):
+    from .stream import notify_stock_change  # Import local : stream dépend de ce module
+
+    # Les validations se suivent dans l'ordre des versions, mais pas forcément leurs
+    # publications : le cache ne recule jamais.
+    current = cache.get(STOCK_VERSION_KEY)
+    if current is None or current < version:
+        cache.set(STOCK_VERSION_KEY, version, timeout=None)
+    # Réveille immédiatement le flux SSE de ce processus (les autres workers lisent la version partagée)
+    notify_stock_change()
+
+
+def variant_stocks(since=None):
+    """
+    {variant_id: stock disponible} des variantes actives, limité à celles modifiées après `since`.
+    Le stock disponible déduit les réservations actives des paniers (store/reservations.py).
+    Avec `since`, une variante supprimée ou dont l'article est désactivé vaut None.
+    """
+    from .reservations import active_holds  # Import local : reservations dépend de ce module
+
+    holds = active_holds()
+    if since is None:
+        return {
+            variant_id: max(stock - holds.get(variant_id, 0), 0)
+            for variant_id, stock in ProductVariant.objects.filter(product__is_active=True).values_list('id', 'stock')
+        }
+
+    stocks = dict.fromkeys(
+        RemovedVariant.objects.filter(stock_version__gt=since).values_list('variant_id', flat=True)
+    )
+    changed = ProductVariant.objects.filter(stock_version__gt=since)
+    for variant_id, stock, is_active in changed.values_list('id', 'stock', 'product__is_active'):
+        stocks[variant_id] = max(stock - holds.get(variant_id, 0), 0) if is_active else None
+    return stocks
+
+
+def product_stocks(since=None):
+    """
+    {product_id: stock disponible total} des articles actifs, limité à ceux dont une variante
+    a changé après `since` (réservations actives déduites, comme pour variant_stocks).
+    Avec `since`, un article supprimé, désactivé ou sans variante vaut None.
+    """
+    from .reservations import active_holds
+
+    variants = ProductVariant.objects.filter(product__is_active=True)
+    if since is not None:
+        changed = set(ProductVariant.objects.filter(stock_version__gt=since).values_list('product_id', flat=True))
+        changed.update(RemovedVariant.objects.filter(stock_version__gt=since).values_list('product_id', flat=True))
+        variants = variants.filter(product_id__in=changed)
+    holds = active_holds()
+    stocks = {}
+    for product_id, variant_id, stock in variants.values_list('product_id', 'id', 'stock'):
+        stocks[product_id] = stocks.get(product_id, 0) + stock - holds.get(variant_id, 0)
+    if since is not None:
+        return {product_id: stocks.get(product_id) for product_id in changed}
+    return stocks
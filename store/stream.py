@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Diffusion des changements de stock en Server-Sent Events (SSE).
+
+Un seul StockHub par worker : une tâche asyncio unique surveille la version du
+stock (store/stock.py) et, à chaque changement, lit une seule fois les
+variantes modifiées puis les répartit entre tous les abonnés. Un abonné
+inactif ne coûte qu'une coroutine en attente (aucun thread par client).
+
+Le hub est réveillé immédiatement par les changements faits dans ce processus
+(notify_stock_change, appelé après validation de la transaction) et vérifie la
+version partagée toutes les secondes pour les changements faits par les autres
+workers : aucun broker de messages n'est nécessaire.
+
+Ce flux nécessite un serveur ASGI (voir la_rose_boutique/asgi.py) et n'est
+proposé aux navigateurs que si STOCK_STREAM_ENABLED est activé ; sinon les pages
+conservent le polling de get_all_variant_stocks.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+
+from .reservations import availability_version
+from .stock import variant_stocks
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) de vérification de la version partagée (changements des autres workers)
+POLL_INTERVAL = 1.0
+
+
+class StockSubscriber:
+    """Changements en attente pour un client ; fusionnés tant que le client ne les a pas lus."""
+
+    def __init__(self):
+        self.pending = {}
+        self.version = None
+        self.event = asyncio.Event()
+
+    def push(self, changes, version):
+        self.pending.update(changes)
+        self.version = version
+        self.event.set()
+
+    def drain(self):
+        changes, self.pending = self.pending, {}
+        self.event.clear()
+        return changes, self.version
+
+
+class StockHub:
+    """Répartiteur des changements de stock, un par processus."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.version = None
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self._ready = None
+        self._lock = threading.Lock()
+
+    async def subscribe(self):
+        subscriber = StockSubscriber()
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            with self._lock:
+                self._loop = asyncio.get_running_loop()
+                self._wake = asyncio.Event()
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        # Attend que le hub ait lu sa version de départ : l'état initial que lira
+        # l'abonné sera au moins aussi récent, sans trou avec les changements diffusés.
+        await self._ready.wait()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify(self):
+        """Réveille le hub (appelable depuis n'importe quel thread du processus)."""
+        with self._lock:
+            loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def publish(self, changes, version):
+        for subscriber in list(self.subscribers):
+            subscriber.push(changes, version)
+
+    async def _run(self):
+        self.version = await sync_to_async(availability_version)()
+        self._ready.set()
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                version = await sync_to_async(availability_version)()
+                if version == self.version:
+                    continue
+                # Une seule lecture en base par changement, quel que soit le nombre d'abonnés
+                changes = await sync_to_async(variant_stocks)(self.version)
+            except Exception:
+                # Base ou cache momentanément indisponible : nouvel essai au prochain tour
+                logger.exception("Lecture des changements de stock impossible.")
+                continue
+            self.version = version
+            if changes:
+                self.publish(changes, version)
+
+
+hub = StockHub()
+
+
+def notify_stock_change():
+    """Signale au hub de ce processus qu'une version de stock vient d'être validée."""
+    hub.notify()
+
+
+def format_event(changes, version):
+    """Sérialise un changement au format SSE (l'id sert de reprise via Last-Event-ID)."""
+    payload = json.dumps({'stocks': changes, 'version': version}, separators=(',', ':'))
+    return f"id: {version}\nevent: stock\ndata: {payload}\n\n"
+
+
+async def stock_events(since=None, heartbeat=15, max_age=300):
+    """
+    Générateur asynchrone du flux SSE d'un client : état initial (ou reprise depuis `since`),
+    puis les changements au fil de l'eau. Le flux se termine après `max_age` secondes ;
+    EventSource se reconnecte alors avec Last-Event-ID.
+    """
+    subscriber = await hub.subscribe()
+    try:
+        # Délai de reconnexion suggéré au navigateur
+        yield "retry: 3000\n\n"
+
+        version = await sync_to_async(availability_version)()
+        initial = await sync_to_async(variant_stocks)(since)
+        if since is None or initial:
+            yield format_event(initial, version)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_age
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(subscriber.event.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                yield ": ping\n\n"
+                continue
+            changes, version = subscriber.drain()
+            if changes:
+                yield format_event(changes, version)
+    finally:
+        hub.unsubscribe(subscriber)
@@ -1,3 +1,478 @@
-from django.test import TestCase
+# -*- coding: utf-8 -*-
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order
+
+from .cache import CART_QUANTITY_PLACEHOLDER, CSRF_TOKEN_PLACEHOLDER, get_catalog_version
+from .cart import Cart
+from .catalog_import import CatalogImportError, import_catalog
+from .checkout import InsufficientStock, decrement_stock, load_checkout_lines, place_order
+from .idempotency import purge_expired_keys
+from .models import Category, IdempotencyKey, Product, ProductVariant
+from .pagination import InvalidCursor, encode_cursor, paginate_keyset
+from .search import filter_by_search, search_page
+from .stream import StockSubscriber, format_event, stock_events
+from .reservations import reserve
+
+# Cache propre à chaque test (le cache fichier par défaut est partagé avec le serveur de développement)
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+ORDER_FIELDS = {
+    'full_name': 'Client Test', 'email': 'client@example.com', 'phone_number': '0000000000',
+    'address_line_1': '1 rue du Test', 'city': 'Ville', 'postal_code': '00000', 'country': 'Pays',
+}
+
+
+class FakeCart:
+    """Panier réduit à ce que lit load_checkout_lines : {variant_id: quantité}."""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CheckoutStockTests(TestCase):
+    """La décrémentation conditionnelle du stock empêche toute survente."""
+
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(name='Robe', price=Decimal('20.00'))
+        self.variant = ProductVariant.objects.create(product=product, size='M', stock=3)
+
+    def order(self, quantity, cart_token=None):
+        lines, missing = load_checkout_lines(FakeCart({self.variant.pk: quantity}))
+        return place_order(lines, cart_token, **ORDER_FIELDS)
+
+    def test_order_within_stock_decrements_it(self):
+        order = self.order(2)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 1)
+        self.assertEqual(order.items_total, 2)
+
+    def test_order_beyond_stock_writes_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            self.order(4)
+        self.assertEqual(raised.exception.lines[0].available, 3)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_second_order_cannot_oversell(self):
+        self.order(3)
+        with self.assertRaises(InsufficientStock):
+            self.order(1)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_decrement_is_all_or_nothing_per_variant(self):
+        self.assertEqual(decrement_stock({self.variant.pk: 3}), 1)
+        self.assertEqual(decrement_stock({self.variant.pk: 1}), 0)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 0)
+
+    def test_order_keeps_the_catalog_cache(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order(1)
+        self.assertEqual(get_catalog_version(), version)
+
+    def test_holds_of_other_carts_are_not_sold(self):
+        reserved, available = reserve(self.variant.pk, 'autre-panier', 2)
+        self.assertTrue(reserved)
+        with self.assertRaises(InsufficientStock):
+            self.order(2, cart_token='mon-panier')
+        self.order(1, cart_token='mon-panier')
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CatalogImportTests(TestCase):
+    """Compteurs d'insertions, de modifications et de lignes inchangées de l'import en masse."""
+
+    CSV = (
+        "category,name,price,size,stock\n"
+        "Robes,Robe longue,49.90,S,2\n"
+        "Robes,Robe longue,49.90,M,5\n"
+        "Jupes,Jupe courte,19.90,M,1\n"
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def run_import(self, content, file_format='csv', **kwargs):
+        return import_catalog(io.StringIO(content), file_format, **kwargs)
+
+    def test_first_import_inserts_everything(self):
+        report = self.run_import(self.CSV)
+        self.assertEqual(report['categories'], {'inserted': 2, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(report['products'], {'inserted': 2, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(report['variants'], {'inserted': 3, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(report['rows'], 3)
+        self.assertEqual(ProductVariant.objects.get(product__slug='robe-longue', size='M').stock, 5)
+
+    def test_second_import_counts_updated_and_unchanged(self):
+        self.run_import(self.CSV)
+        report = self.run_import(self.CSV.replace('Robes,Robe longue,49.90,M,5', 'Robes,Robe longue,49.90,M,7')
+                                 .replace('Jupe courte,19.90', 'Jupe courte,17.90'))
+        self.assertEqual(report['categories'], {'inserted': 0, 'updated': 0, 'unchanged': 2})
+        self.assertEqual(report['products'], {'inserted': 0, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(report['variants'], {'inserted': 0, 'updated': 1, 'unchanged': 2})
+        self.assertEqual(Product.objects.get(slug='jupe-courte').price, Decimal('17.90'))
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        report = self.run_import("name,price,size,stock\nRobe,abc,S,1\n,10,S,1\nPull,30,S,-2\n")
+        self.assertEqual(report['error_count'], 3)
+        self.assertFalse(Product.objects.exists())
+
+    def test_dry_run_saves_nothing(self):
+        report = self.run_import(self.CSV, dry_run=True)
+        self.assertEqual(report['products']['inserted'], 2)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+    def test_interrupted_import_keeps_and_reports_committed_batches(self):
+        content = '[{"name": "X", "price": 1, "size": "S", "stock": 2}, {"name": }]'
+        with self.assertRaises(CatalogImportError) as raised:
+            self.run_import(content, 'json', batch_size=1)
+        self.assertTrue(Product.objects.filter(slug='x').exists())
+        self.assertEqual(raised.exception.report['products']['inserted'], 1)
+
+
+class KeysetCursorTests(TestCase):
+    """Un curseur modifié à la main est refusé (InvalidCursor) au lieu de faire échouer la requête."""
+
+    def test_values_of_the_wrong_type_are_rejected(self):
+        products = Product.objects.all()
+        for values in (['P', 'abc'], [[1], [2]], [None, 1], [{'a': 1}, 2]):
+            with self.subTest(values=values), self.assertRaises(InvalidCursor):
+                paginate_keyset(products, ('name', 'id'), encode_cursor(values))
+
+    def test_valid_cursor_returns_the_next_page(self):
+        for name in ('A', 'B', 'C'):
+            Product.objects.create(name=name, price=1)
+        first = paginate_keyset(Product.objects.all(), ('name', 'id'), page_size=2)
+        second = paginate_keyset(Product.objects.all(), ('name', 'id'), first.next_cursor, page_size=2)
+        self.assertEqual([product.name for product in second], ['C'])
+        self.assertFalse(second.has_next)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class IdempotencyTests(TestCase):
+    """Un POST renvoyé avec la même clé rejoue la réponse de la première requête sans réexécuter la vue."""
+
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(name='Robe', price=Decimal('20.00'))
+        self.variant = ProductVariant.objects.create(product=product, size='M', stock=5)
+
+    def add(self, key):
+        return self.client.post(reverse('add_to_cart'), {'variant_id': self.variant.pk}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_same_key_is_replayed_once(self):
+        first = self.add('cle-1')
+        replay = self.add('cle-1')
+        self.assertEqual(first.json()['new_cart_quantity'], 1)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replay'], 'true')
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_new_key_runs_the_view_again(self):
+        self.add('cle-1')
+        self.assertEqual(self.add('cle-2').json()['new_cart_quantity'], 2)
+
+    def test_keys_are_scoped_to_the_cart(self):
+        self.add('cle-1')
+        other = self.client_class()
+        response = other.post(reverse('add_to_cart'), {'variant_id': self.variant.pk}, HTTP_IDEMPOTENCY_KEY='cle-1')
+        self.assertEqual(response.json()['new_cart_quantity'], 1)
+        self.assertFalse(response.has_header('Idempotent-Replay'))
+
+    def test_expired_keys_are_purged(self):
+        self.add('cle-1')
+        self.assertEqual(purge_expired_keys(), 0)
+        IdempotencyKey.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(purge_expired_keys(), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StockDeltaTests(TestCase):
+    """Polling différentiel du stock : `since` ne renvoie que les changements, 204 s'il n'y en a aucun."""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Robe', price=Decimal('20.00'))
+            self.small = ProductVariant.objects.create(product=self.product, size='S', stock=2)
+            self.medium = ProductVariant.objects.create(product=self.product, size='M', stock=4)
+
+    def poll(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        return self.client.get(reverse('get_stock_data'), params)
+
+    def test_first_poll_returns_every_variant(self):
+        data = self.poll().json()
+        self.assertEqual(data['stocks'], {str(self.small.pk): 2, str(self.medium.pk): 4})
+
+    def test_unchanged_stock_returns_204(self):
+        version = self.poll().json()['version']
+        self.assertEqual(self.poll(version).status_code, 204)
+
+    def test_only_changed_variants_are_returned(self):
+        version = self.poll().json()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medium.stock = 1
+            self.medium.save()
+        data = self.poll(version).json()
+        self.assertEqual(data['stocks'], {str(self.medium.pk): 1})
+        self.assertGreater(data['version'], version)
+        self.assertEqual(self.poll(version, admin='true').json()['stocks'], {str(self.product.pk): 3})
+
+    def test_deleted_variant_is_reported_as_null(self):
+        version = self.poll().json()['version']
+        variant_id = self.small.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.small.delete()
+        self.assertEqual(self.poll(version).json()['stocks'], {str(variant_id): None})
+        self.assertEqual(self.poll(version, admin='true').json()['stocks'], {str(self.product.pk): 4})
+
+    def test_deactivated_product_is_reported_as_null(self):
+        version = self.poll().json()['version']
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.is_active = False
+            product.save()
+        data = self.poll(version).json()
+        self.assertEqual(data['stocks'], {str(self.small.pk): None, str(self.medium.pk): None})
+        self.assertEqual(self.poll(version, admin='true').json()['stocks'], {str(self.product.pk): None})
+        self.assertNotIn(str(self.small.pk), self.poll().json()['stocks'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SearchTests(TestCase):
+    """Recherche plein texte (FTS5) et recherche portable : mêmes résultats, parcourus sans limite."""
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(name='Robe été', price=1, description='Légère')
+        Product.objects.create(name='Jupe', price=1, description='Assortie à la robe')
+        Product.objects.create(name='Pull', price=1, description='Laine')
+        for number in range(5):
+            Product.objects.create(name=f'Robe longue {number}', price=1)
+
+    def all_pages(self, query, page_size=3):
+        names, cursor = [], None
+        while True:
+            page = search_page(Product.objects.all(), query, cursor, page_size)
+            names += [product.name for product in page]
+            if not page.has_next:
+                return names
+            cursor = page.next_cursor
+
+    def check_search(self):
+        names = self.all_pages('ROBE')
+        self.assertEqual(len(names), 7)
+        self.assertEqual(len(set(names)), 7)
+        # Un mot du nom pèse davantage qu'un mot de la description
+        self.assertEqual(names[-1], 'Jupe')
+        self.assertEqual(self.all_pages('ete'), ['Robe été'])
+        self.assertEqual(self.all_pages('robe lon', page_size=2), [f'Robe longue {number}' for number in range(5)])
+        self.assertEqual(filter_by_search(Product.objects.all(), 'laine').get().name, 'Pull')
+        with self.assertRaises(InvalidCursor):
+            search_page(Product.objects.all(), 'robe', encode_cursor(['x', 1]))
+
+    def test_fts_search(self):
+        self.check_search()
+
+    def test_portable_search(self):
+        with mock.patch('store.search.fts_available', return_value=False):
+            self.check_search()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CartTests(TestCase):
+    """Panier compact : totaux tenus à jour, encodage vérifié et stockages interchangeables."""
+
+    BACKENDS = ('store.cart.SessionCartBackend', 'store.cart.SignedCookieCartBackend', 'store.cart.CacheCartBackend')
+
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(name='Robe', price=Decimal('12.50'))
+        # Chaque sous-test réserve ses unités : stock suffisant pour tous les stockages
+        self.variant = ProductVariant.objects.create(product=product, size='M', stock=10)
+
+    def test_totals_follow_each_change(self):
+        cart = Cart()
+        cart.add(self.variant.pk, 2, unit_price=Decimal('12.50'))
+        cart.add(self.variant.pk)
+        self.assertEqual((cart.count, cart.subtotal()), (3, Decimal('37.50')))
+        cart.set(self.variant.pk, 1)
+        self.assertEqual((cart.count, cart.line_total(self.variant.pk)), (1, Decimal('12.50')))
+        cart.remove(self.variant.pk)
+        self.assertEqual((cart.count, cart.subtotal(), len(cart)), (0, Decimal('0.00'), 0))
+
+    def test_encoding_round_trip(self):
+        cart = Cart({self.variant.pk: 2}, {self.variant.pk: 1250}, token='jeton')
+        decoded = Cart.decode(cart.encode())
+        self.assertEqual((decoded.lines, decoded.prices, decoded.token), (cart.lines, cart.prices, 'jeton'))
+        self.assertFalse(decoded.modified)
+
+    def test_wrong_totals_are_recomputed(self):
+        with self.assertLogs('store.cart', 'WARNING'):
+            cart = Cart.decode({'v': {str(self.variant.pk): [2, 1250]}, 'n': 99, 's': 1})
+        self.assertEqual((cart.count, cart.subtotal_cents), (2, 2500))
+        self.assertTrue(cart.modified)
+
+    def test_legacy_format_reads_prices_from_the_catalog(self):
+        cart = Cart.decode({f'1-{self.variant.pk}': {'variant_id': self.variant.pk, 'quantity': 2}, 'x-0': {}})
+        self.assertEqual((cart.lines, cart.subtotal()), ({self.variant.pk: 2}, Decimal('25.00')))
+
+    def test_every_backend_keeps_the_cart_between_requests(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                client = self.client_class()
+                for expected in (1, 2):
+                    response = client.post(reverse('add_to_cart'), {'variant_id': self.variant.pk})
+                    self.assertEqual(response.json()['new_cart_quantity'], expected)
+                self.assertEqual(client.get(reverse('cart')).context['cart_total_quantity'], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CatalogPageCacheTests(TestCase):
+    """Pages du catalogue partagées en cache, complétées par visiteur (jeton CSRF, panier)."""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Robe', price=Decimal('20.00'))
+            self.variant = ProductVariant.objects.create(product=self.product, size='M', stock=5)
+
+    def test_page_is_served_from_the_cache(self):
+        self.client.get(reverse('store'))
+        # Changement invisible pour les signaux : la page en cache est resservie telle quelle
+        Product.objects.filter(pk=self.product.pk).update(name='Robe renommée')
+        self.assertNotContains(self.client.get(reverse('store')), 'Robe renommée')
+
+    def test_catalog_edit_invalidates_the_page(self):
+        self.client.get(reverse('store'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Robe renommée'
+            self.product.save()
+        self.assertContains(self.client.get(reverse('store')), 'Robe renommée')
+
+    def test_holes_are_filled_for_each_visitor(self):
+        first = self.client.get(reverse('store'))
+        other = self.client_class()
+        other.post(reverse('add_to_cart'), {'variant_id': self.variant.pk})
+        second = other.get(reverse('store'))
+        for response in (first, second):
+            self.assertNotContains(response, CSRF_TOKEN_PLACEHOLDER)
+            self.assertNotContains(response, CART_QUANTITY_PLACEHOLDER)
+        self.assertContains(first, '<span id="cart-quantity-indicator">0</span>', html=False)
+        self.assertContains(second, '<span id="cart-quantity-indicator">1</span>', html=False)
+        self.assertNotEqual(first.cookies['csrftoken'].value, second.cookies['csrftoken'].value)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STORE_PAGE_SIZE=1)
+class ConditionalJsonTests(TestCase):
+    """ETag des vues JSON : 304 sans corps tant que la version des données n'a pas changé."""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = Product.objects.create(name='A', price=1)
+            self.second = Product.objects.create(name='B', price=1)
+            self.variant = ProductVariant.objects.create(product=self.second, size='M', stock=3)
+
+    def revalidate(self, url, params, etag):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_stock_data(self):
+        url = reverse('get_stock_data')
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, {}, response['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.stock = 2
+            self.variant.save()
+        changed = self.revalidate(url, {}, response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_next_catalog_page(self):
+        cursor = paginate_keyset(Product.objects.all(), ('name', 'id'), page_size=1).next_cursor
+        url, params = reverse('store_products_page'), {'after': cursor}
+        # Le fragment dépend du secret CSRF du visiteur, posé par la page de la boutique
+        self.client.get(reverse('store'))
+        response = self.client.get(url, params)
+        self.assertIn('B', response.json()['html'])
+        self.assertEqual(self.revalidate(url, params, response['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.name = 'C'
+            self.second.save()
+        changed = self.revalidate(url, params, response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn('C', changed.json()['html'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StockStreamTests(TestCase):
+    """Flux SSE du stock : état initial ou reprise, puis changements poussés au fil de l'eau."""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Robe', price=1)
+            self.variant = ProductVariant.objects.create(product=product, size='M', stock=3)
+
+    def change_stock(self, stock):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.stock = stock
+            self.variant.save()
+
+    def test_event_format(self):
+        self.assertEqual(format_event({7: 2}, 12), 'id: 12\nevent: stock\ndata: {"stocks":{"7":2},"version":12}\n\n')
+
+    def test_subscriber_merges_unread_changes(self):
+        subscriber = StockSubscriber()
+        subscriber.push({1: 5, 2: 3}, 10)
+        subscriber.push({1: 4}, 11)
+        self.assertEqual(subscriber.drain(), ({1: 4, 2: 3}, 11))
+        self.assertFalse(subscriber.event.is_set())
+
+    async def test_initial_state_then_changes(self):
+        events = stock_events(heartbeat=0.05, max_age=5)
+        try:
+            self.assertTrue((await events.__anext__()).startswith('retry:'))
+            self.assertIn(f'"{self.variant.pk}":3', await events.__anext__())
+            await sync_to_async(self.change_stock)(1)
+            event = await events.__anext__()
+            while event.startswith(':'):
+                event = await events.__anext__()
+            self.assertIn(f'"{self.variant.pk}":1', event)
+        finally:
+            await events.aclose()
+
+    async def test_resumed_stream_skips_unchanged_state(self):
+        version = (await self.async_client.get(reverse('get_stock_data'))).json()['version']
+        events = stock_events(since=version, heartbeat=0.05, max_age=5)
+        try:
+            await events.__anext__()
+            self.assertEqual(await events.__anext__(), ': ping\n\n')
+        finally:
+            await events.aclose()
+
+    def test_disabled_stream_returns_404(self):
+        with self.settings(STOCK_STREAM_ENABLED=False):
+            self.assertEqual(self.client.get(reverse('stock_stream')).status_code, 404)
@@ -8,8 +8,11 @@ urlpatterns = [
     # ... URLs du Front-end (home, store, cart, checkout, etc.) ...
     path('', views.home, name='home'),
     path('boutique/', views.store, name='store'),
+    # Chargement infini de la grille (pagination par curseur)
+    path('ajax/store_products/', views.store_products_page, name='store_products_page'),
     path('ajouter_au_panier/', views.add_to_cart, name='add_to_cart'),
     path('panier/', views.cart, name='cart'),
+    path('update_panier/batch/', views.update_cart_batch, name='update_cart_batch'),
     path('update_panier/<str:key>/', views.update_cart_quantity, name='update_cart_quantity'),
     path('remove_from_cart/<str:key>/', views.remove_from_cart, name='remove_from_cart'),
     path('commander/', views.checkout, name='checkout'),
@@ -17,10 +20,13 @@ urlpatterns = [
 
     # NOUVELLE URL AJAX pour le Polling du Stock
     path('ajax/get_stock_data/', views.get_all_variant_stocks, name='get_stock_data'),
+    # Flux SSE des changements de stock (serveur ASGI)
+    path('ajax/stock_stream/', views.stock_stream, name='stock_stream'),
 
     # URL d'Administration du Catalogue
     path('admin/products/create/', views.admin_product_create, name='admin_product_create'),
     path('admin/products/', views.admin_product_list, name='admin_product_list'),
+    path('admin/products/import/', views.admin_product_import, name='admin_product_import'),
 
 
 
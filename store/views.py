@@ -4,17 +4,40 @@ la boutique et qui lui enverra les données des articles."""
 
 # Mettez à jour vos imports en haut de views.py
 # -*- coding: utf-8 -*-
+import codecs
+import json
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
-from .models import Product, ProductVariant, Category, ShopConfiguration
-from decimal import Decimal
-from django.db.models import F, Sum, Q
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.template.loader import render_to_string
+from .models import Product, ProductVariant, Category
+from django.db.models import Sum
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.forms.models import inlineformset_factory
-from .forms import ProductAdminForm, ProductVariantFormSet, CategoryForm, OrderForm
+from .forms import ProductAdminForm, ProductVariantFormSet, CategoryForm, OrderForm, CatalogImportForm
 from orders.views import is_staff_user
-from orders.models import Order, OrderItem # <-- LIGNE CRITIQUE AJOUTÉE
+from orders.models import Order # <-- LIGNE CRITIQUE AJOUTÉE
+from .catalog import deduct_holds, storefront_products
+from .catalog_import import CatalogImportError, detect_format, import_catalog
+from .cache import (
+    CART_QUANTITY_PLACEHOLDER, CSRF_TOKEN_PLACEHOLDER, catalog_page_key, get_cached_page, make_etag,
+    get_shop_config, normalize_query, punch_holes, set_cached_page,
+)
+from .cart import aget_cart, variant_id_from_key
+from .idempotency import idempotent, new_idempotency_key
+from .checkout import InsufficientStock, checkout_totals, load_checkout_lines, place_order
+from .pagination import InvalidCursor, paginate_keyset
+from .reservations import arelease, areserve, availability_version, renew, reserve_many
+from .search import filter_by_search, search_page
+from .stock import product_stocks, variant_stocks
+from .stream import stock_events
 
 
 # Page d'accueil (inchangée)
@@ -28,61 +51,160 @@ def store(request):
     """
     Affiche la boutique, en appliquant un filtre par catégorie ou une recherche.
     Les filtres sont gérés via les paramètres GET (category_slug et q_lower).
+    Le catalogue est paginé par curseur (?after=...) : les pages suivantes sont chargées par store_products_page.
+    Le HTML est mis en cache par (catégorie, recherche, curseur, version du catalogue) : voir store/cache.py.
     """
-    products = Product.objects.filter(is_active=True).order_by('name')
-    current_category = None
-
     # Les filtres sont gérés via les paramètres GET (category_slug et q_lower)
     category_slug = request.GET.get('category_slug')
 
     # ATTENTION : Lecture du nouveau champ "q_lower" envoyé par le JavaScript
-    search_query = request.GET.get('q_lower')
+    # (normalisé comme dans la clé de cache pour que deux recherches équivalentes partagent la même page)
+    search_query = normalize_query(request.GET.get('q_lower'))
 
     # On récupère aussi 'q' pour la rétrocompatibilité (si le JS ne s'est pas exécuté)
     # et pour l'affichage du terme de recherche
     search_query_display = request.GET.get('q') or search_query
 
-    # 1. GESTION DU FILTRAGE PAR CATÉGORIE
+    cursor = request.GET.get('after')
+
     # 'all' est la valeur que nous utilisons pour réinitialiser le filtre
-    if category_slug and category_slug not in ['', 'all']:
+    if category_slug in ['', 'all']:
+        category_slug = None
+
+    cache_key = catalog_page_key(category_slug, search_query, search_query_display, cursor)
+    html = get_cached_page(cache_key)
+
+    if html is None:
+        try:
+            html = render_store_page(category_slug, search_query, search_query_display, cursor)
+        except InvalidCursor:
+            # Curseur périmé ou modifié à la main : retour à la première page
+            return redirect('store')
+        set_cached_page(cache_key, html)
+
+    # Le HTML partagé est complété avec le jeton CSRF et le compteur du panier du visiteur
+    return HttpResponse(punch_holes(html, get_token(request), request.cart.count))
+
+
+def storefront_page(category_slug, search_query, cursor=None):
+    """
+    Retourne (page, catégorie courante) : une page d'articles triés par (nom, id), ou par
+    pertinence pour une recherche, filtrés par catégorie et/ou recherche.
+    """
+    # Stock annoté et variantes en stock préchargées : nombre de requêtes fixe, quelle que soit la taille du catalogue
+    products = storefront_products()
+    current_category = None
+
+    # 1. GESTION DU FILTRAGE PAR CATÉGORIE
+    if category_slug:
         # Tente de récupérer la catégorie par son slug
         current_category = get_object_or_404(Category, slug=category_slug)
 
         # Filtre les produits pour n'afficher que ceux de cette catégorie
         products = products.filter(category=current_category)
 
-    # 2. GESTION DE LA RECHERCHE PAR MOT-CLÉ (Utilisation de search_query qui est déjà en minuscule)
+    # 2. GESTION DE LA RECHERCHE PAR MOT-CLÉ (index plein texte, insensible à la casse et aux accents)
+    # et 3. pagination par curseur : coût constant quelle que soit la page
     if search_query:
-        # Utilisation de Q object et de 'icontains' (insensible à la casse)
-        # La valeur de search_query est déjà en minuscule grâce au JS.
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        # Les résultats d'une recherche sont présentés par pertinence (curseur appliqué dans la recherche)
+        page = search_page(products, search_query, cursor, settings.STORE_PAGE_SIZE)
+    else:
+        page = paginate_keyset(products, ('name', 'id'), cursor, settings.STORE_PAGE_SIZE)
+    # Disponibilité affichée : stock moins les réservations des paniers (comme get_all_variant_stocks)
+    deduct_holds(page)
+    return page, current_category
 
-    # 3. Récupérer TOUTES les catégories actives pour le template
+
+def render_store_page(category_slug, search_query, search_query_display, cursor=None):
+    """Rend le HTML de la boutique, sans aucune donnée propre au visiteur (partageable en cache)."""
+    products, current_category = storefront_page(category_slug, search_query, cursor)
+
+    # Récupérer TOUTES les catégories actives pour le template
     categories = Category.objects.all().order_by('name')
 
-    # 4. Récupération de la configuration de la boutique (inchangée)
-    shop_config, created = ShopConfiguration.objects.get_or_create(pk=1)
+    # Configuration de la boutique (gardée en mémoire par le worker, sans requête en régime établi)
+    shop_config = get_shop_config()
 
     context = {
         'products': products,
         'categories': categories,  # Liste pour le menu de gauche
         'current_category': current_category,  # Pour mettre en évidence la catégorie sélectionnée
         'search_query': search_query_display,  # IMPORTANT : Utilisation de search_query_display pour l'affichage
+        'search_query_lower': search_query,  # Transmis aux liens de la page suivante
         'shop_config': shop_config,  # Configuration de la boutique
+        'stock_stream_enabled': settings.STOCK_STREAM_ENABLED,  # Flux SSE au lieu du polling
+        # Marqueurs remplacés à chaque requête par les valeurs du visiteur
+        'csrf_token': CSRF_TOKEN_PLACEHOLDER,
+        'cart_total_quantity': CART_QUANTITY_PLACEHOLDER,
     }
 
-    return render(request, 'store.html', context)
+    return render_to_string('store.html', context)
+
+
+def store_products_page(request):
+    """
+    Vue AJAX du chargement infini : renvoie le HTML des cartes de la page suivante
+    et l'URL de la page d'après (None sur la dernière page).
+    """
+    category_slug = request.GET.get('category_slug') or None
+    search_query = normalize_query(request.GET.get('q_lower'))
+    cursor = request.GET.get('after')
+
+    if not cursor:
+        return JsonResponse({'success': False, 'error': 'Curseur de pagination manquant.'}, status=400)
+
+    cache_key = catalog_page_key(category_slug, search_query, None, cursor, kind='fragment')
+
+    # Même version du catalogue et même secret CSRF : le fragment déjà reçu reste valable
+    etag = make_etag(cache_key, request.META.get('CSRF_COOKIE', ''))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    data = get_cached_page(cache_key)
+
+    if data is None:
+        try:
+            products, current_category = storefront_page(category_slug, search_query, cursor)
+        except InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Curseur de pagination invalide.'}, status=400)
+
+        next_url = None
+        if products.has_next:
+            params = {'after': products.next_cursor}
+            if category_slug:
+                params['category_slug'] = category_slug
+            if search_query:
+                params['q_lower'] = search_query
+            next_url = f"{reverse('store_products_page')}?{urlencode(params)}"
+
+        data = {
+            'html': render_to_string('store/product_sections.html', {
+                'products': products,
+                'csrf_token': CSRF_TOKEN_PLACEHOLDER,
+            }),
+            'next_url': next_url,
+        }
+        set_cached_page(cache_key, data)
+
+    response = JsonResponse({
+        'success': True,
+        'html': punch_holes(data['html'], get_token(request), ''),
+        'next_url': data['next_url'],
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 
 # ATTENTION : La vue attend maintenant l'ID de la VARIANTE
 
-def add_to_cart(request):
+@idempotent('add_to_cart')
+async def add_to_cart(request):
     """
     Ajoute un produit (variante) au panier et retourne une réponse JSON
     pour la mise à jour asynchrone du compteur de panier.
+    Vue asynchrone : sous ASGI, l'attente de la base ne bloque pas le worker.
     """
     # Accepte uniquement les requêtes POST
     if request.method != 'POST':
@@ -95,9 +217,11 @@ def add_to_cart(request):
         return JsonResponse({'success': False, 'error': "Erreur: Aucune taille n'a été sélectionnée."}, status=400)
 
     try:
-        # Récupère l'objet ProductVariant
-        variant = get_object_or_404(ProductVariant, id=variant_id)
-    except Exception:
+        # Récupère l'objet ProductVariant (ORM asynchrone)
+        variant = await ProductVariant.objects.select_related('product').filter(id=variant_id).afirst()
+    except (ValueError, TypeError):
+        variant = None
+    if variant is None:
         return JsonResponse({'success': False, 'error': "Variante de produit introuvable."}, status=404)
 
     # Vérification du stock
@@ -107,59 +231,27 @@ def add_to_cart(request):
             'error': f"Désolé, la taille {variant.size} pour '{variant.product.name}' est en rupture de stock."
         }, status=400)
 
-    # 2. Mise à jour du Panier (logique inchangée)
-    cart = request.session.get('cart', {})
-    if not isinstance(cart, dict):
-        cart = {}  # Réinitialisation en cas de corruption
+    # 2. Mise à jour du panier : seule la quantité par variante est conservée
+    cart = await aget_cart(request)
+    current_quantity = cart.quantity(variant.id)
 
-    # -------------------------------------------------------------
-    # CORRECTION MAJEURE: Clé du panier = ID_Produit-ID_Variante
-    # -------------------------------------------------------------
-    # Ancienne clé: str(variant.id)
-    cart_key = f"{variant.product.id}-{variant.id}"
-    current_quantity = cart.get(cart_key, {}).get('quantity', 0)
-
-    # Vérification du stock si ajout de la quantité
-    if current_quantity + 1 > variant.stock:
+    # Réservation de l'unité supplémentaire (stock moins les réservations des autres paniers)
+    reserved, available = await areserve(variant.id, cart.ensure_token(), current_quantity + 1)
+    if not reserved:
         return JsonResponse({
             'success': False,
-            'error': f"Stock insuffisant. {variant.stock} unités restantes pour la taille {variant.size}."
+            'error': f"Stock insuffisant. {available or 0} unités disponibles pour la taille {variant.size}."
         }, status=400)
 
-    # Stockage des données du panier
-    if cart_key not in cart:
-        cart[cart_key] = {
-            'product_id': str(variant.product.id),
-            'variant_id': variant.id,
-            'name': variant.product.name,
-            'size': variant.size,
-            'price': float(variant.product.price),
-            'quantity': 1,
-        }
-        # REMARQUE : L'entrée 'variant_id' stockée est redondante si la clé est bonne, mais on la garde.
-    else:
-        cart[cart_key]['quantity'] += 1
-
-    # 3. DÉCRÉMENTATION/GESTION DU STOCK EN BASE DE DONNÉES
-    # =========================================================
-    # LIGNES SUPPRIMÉES : Le stock NE DOIT PAS être décrémenté ici.
-    # Il est décrémenté uniquement dans la fonction checkout() après paiement.
-    # variant.stock = F('stock') - 1
-    # variant.save(update_fields=['stock'])
-    # =========================================================
-
-    # 4. Sauvegarde de la session
-    request.session['cart'] = cart
-    request.session.modified = True
+    # Le stock N'EST PAS décrémenté ici : il l'est uniquement dans checkout() après paiement.
+    # Le panier est enregistré une seule fois en fin de requête (CartMiddleware).
+    cart.add(variant.id, unit_price=variant.product.price)
 
-    # 5. Calcul de la nouvelle quantité totale
-    total_quantity = sum(item.get('quantity', 0) for item in cart.values() if isinstance(item, dict))
-
-    # 6. Retour de la réponse JSON au client
+    # 3. Retour de la réponse JSON au client
     return JsonResponse({
         'success': True,
         'message': f"'{variant.product.name}' (Taille: {variant.size}) ajouté au panier.",
-        'new_cart_quantity': total_quantity  # Nouvelle quantité pour l'indicateur
+        'new_cart_quantity': cart.count  # Nouvelle quantité pour l'indicateur
     })
 
 
@@ -168,224 +260,179 @@ def add_to_cart(request):
 def cart(request):
     """
     Affiche le contenu du panier.
+    Noms, tailles et prix proviennent des fiches de variantes en cache (store.catalog).
     """
-    cart = request.session.get('cart', {})
-    if not isinstance(cart, dict):
-        request.session['cart'] = {}
-        request.session.modified = True
-        cart = {}
-
-    items = []
-    total_price = Decimal('0.00')
-    total_quantity = 0
-
-    # Étape 1 : Collecte de tous les IDs de variantes pour une requête en vrac
-    variant_ids = [item['variant_id'] for item in cart.values() if isinstance(item, dict) and 'variant_id' in item]
-
-    # Étape 2 : Récupérer toutes les variantes, ainsi que les produits associés (select_related)
-    variants = ProductVariant.objects.filter(id__in=variant_ids).select_related('product').in_bulk(variant_ids)
-
-    # Étape 3 : Parcourir le panier de session et construire la liste des items
-    for key, item in cart.items():
-        if not isinstance(item, dict):
-            continue
-
-        variant_id = item.get('variant_id')
-        quantity = item.get('quantity')
-        price = item.get('price')
-
-        # Si les données ne sont pas valides OU si la variante n'existe plus en base, on passe
-        if not variant_id or variant_id not in variants or not isinstance(quantity, int) or not isinstance(price, (
-        float, Decimal, int)):
-            continue
-
-        variant = variants[variant_id]
-        product = variant.product
-
-        # CONVERSION DU PRIX EN DECIMAL pour les calculs robustes
-        item_price_decimal = Decimal(str(price))
-
-        # Attacher les objets et informations clés pour le template
-        item['product'] = product
-        item['variant'] = variant  # Ajout de l'objet variant
-        item['image_url'] = product.image.url if product.image else None  # Ajout de l'URL de l'image
-
-        # Le prix est stocké dans l'item de session, mais on recalcule le total de ligne
-        item_total = quantity * item_price_decimal
-
-        # CHANGEMENT 1 : PASSER item_total comme Decimal, pas comme une chaîne
-        item['total'] = item_total
-
-        total_price += item_total
-        total_quantity += quantity
-
-        # Ajouter le key qui est l'ID de la variante
-        item['key'] = key
-        items.append(item)
+    cart = request.cart
+    items = cart.items()
 
     context = {
         'items': items,
-        # CHANGEMENT 2 : PASSER total_price comme Decimal, pas comme une chaîne
-        'cart_total_price': total_price,
-        'cart_total_quantity': total_quantity,
+        'cart_total_price': cart.subtotal(),
+        'cart_total_quantity': cart.count,
     }
     return render(request, 'cart.html', context)
 
 
 # Mise à jour d'un article dans le panier (utilise la KEY complète)
-def update_cart_quantity(request, key):
+@idempotent('update_cart_quantity')
+async def update_cart_quantity(request, key):
     """
     Met à jour la quantité d'un item du panier.
     Vérifie le stock réel SANS le modifier en base.
     """
-    # Assurez-vous d'avoir bien importé Decimal en haut du fichier views.py :
-    from decimal import Decimal
-    # Assurez-vous d'avoir importé ProductVariant du modèle store :
-    from store.models import ProductVariant # À ajuster si ProductVariant est ailleurs
-
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée.'}, status=405)
 
-    # CORRECTION CRUCIALE : Le séparateur de clé est le tiret ('-'), pas l'underscore ('_').
-    key_parts = key.split('-')
-
-    if len(key_parts) < 2:
-        # Si la clé est simple (ex: '5'), on utilise la clé entière comme ID de variante (si elle est l'ID).
-        variant_id_str = key
-    else:
-        # Si la clé est complexe (ex: '5-2'), l'ID de variante est la deuxième partie ('2').
-        variant_id_str = key_parts[1]
-
     try:
-        # Tente de convertir l'ID de variante pour la recherche.
-        variant_id = int(variant_id_str)
+        # La clé est 'idProduit-idVariante' (ou simplement l'id de variante)
+        variant_id = variant_id_from_key(key)
         # La quantité vient de la requête POST
         new_quantity = int(request.POST.get('quantity', 0))
     except ValueError:
-        # Ceci est le message que vous recevez si 'variant_id_str' n'est pas un nombre.
         return JsonResponse({'success': False, 'error': 'Données invalides pour la mise à jour.'}, status=400)
 
-    cart = request.session.get('cart', {})
+    cart = await aget_cart(request)
 
-    if key not in cart:
+    if variant_id not in cart:
         return JsonResponse({'success': False, 'error': 'Article non trouvé dans le panier.'}, status=404)
 
-    # 1. Récupération de la variante et vérification du stock
-    try:
-        variant = ProductVariant.objects.get(id=variant_id)
-        # Le stock disponible est le stock réel en base
-        available_stock = variant.stock
-    except ProductVariant.DoesNotExist:
-        del cart[key]
-        request.session.modified = True
-        return JsonResponse({'success': False, 'error': 'Variante introuvable. Article retiré du panier.'}, status=404)
-
     # -----------------------------------------------------------
-    # GESTION DE LA QUANTITÉ ET VÉRIFICATION
+    # GESTION DE LA QUANTITÉ ET VÉRIFICATION (réservation du stock)
     # -----------------------------------------------------------
 
-    item_removed = False
-
-    # 1. Si la quantité est réduite à zéro : suppression
+    # 1. Si la quantité est réduite à zéro : suppression et libération de la réservation
     if new_quantity <= 0:
-        del cart[key]
-        item_removed = True
         new_quantity = 0
+        await arelease(cart.token, [variant_id])
 
-    # 2. Si la nouvelle quantité dépasse le stock disponible
-    elif new_quantity > available_stock:
-        # Bloquer la mise à jour si la nouvelle quantité est > stock disponible
-        max_quantity = available_stock
-        cart[key]['quantity'] = max_quantity
-        new_quantity = max_quantity
-
-        request.session.modified = True
-        # Retourner une erreur avec la nouvelle quantité corrigée (limitée par le stock)
-        return JsonResponse({
-            'success': False,
-            'error': f"Stock insuffisant. Maximum disponible : {max_quantity} unités.",
-            'new_quantity': new_quantity,
-        }, status=400)
-
-    # 3. Mise à jour normale de la quantité
     else:
-        cart[key]['quantity'] = new_quantity
-        item_removed = False
-
-    # AUCUNE MODIFICATION DU STOCK EN BASE DE DONNÉES
-
-    # Sauvegarde de la session
-    request.session.modified = True
+        reserved, available_stock = await areserve(variant_id, cart.ensure_token(), new_quantity)
+        if available_stock is None:
+            cart.remove(variant_id)
+            await arelease(cart.token, [variant_id])
+            return JsonResponse({'success': False, 'error': 'Variante introuvable. Article retiré du panier.'}, status=404)
+
+        # 2. Si la nouvelle quantité dépasse le stock disponible : limitée au stock
+        if not reserved:
+            if available_stock > 0:
+                await areserve(variant_id, cart.token, available_stock)
+            else:
+                await arelease(cart.token, [variant_id])
+            cart.set(variant_id, available_stock)
+            # Retourner une erreur avec la nouvelle quantité corrigée (limitée par le stock)
+            return JsonResponse({
+                'success': False,
+                'error': f"Stock insuffisant. Maximum disponible : {available_stock} unités.",
+                'new_quantity': available_stock,
+            }, status=400)
+
+    # 3. Mise à jour normale de la quantité (AUCUNE MODIFICATION DU STOCK EN BASE)
+    cart.set(variant_id, new_quantity)
+
+    # 2. Totaux tenus à jour par le panier (aucun recalcul sur l'ensemble des lignes)
+    return JsonResponse({
+        'success': True,
+        'new_quantity': new_quantity,
+        # Formatage des Decimal en chaîne de caractères avec 2 décimales pour l'affichage JS
+        'new_subtotal': f"{cart.line_total(variant_id):.2f}",
+        'total': f"{cart.subtotal():.2f}",
+        'cart_quantity': cart.count
+    })
 
-    # 2. Recalcul des totaux globaux et de la ligne
-    # Utilisation de Decimal pour la précision des calculs d'argent
-    total_price_decimal = Decimal('0.00')
-    total_quantity = 0
-    new_subtotal_decimal = Decimal('0.00')
 
-    for item_key, item in cart.items():
-        # Conversion du prix et de la quantité en Decimal
-        try:
-            # Sécurité: le prix est stocké dans la session, on le convertit en Decimal
-            price = Decimal(str(item.get('price', '0.00')))
-        except:
-            price = Decimal('0.00')
+# Nombre maximal de lignes modifiées par un appel groupé
+MAX_BATCH_CHANGES = 100
 
-        quantity = item.get('quantity', 0)
 
-        # Calcul du total de la ligne
-        item_total = price * Decimal(quantity)
-        total_price_decimal += item_total
-        total_quantity += quantity
+@idempotent('update_cart_batch')
+def update_cart_batch(request):
+    """
+    Applique plusieurs changements de quantité en une seule requête.
+    Corps JSON : {"changes": [{"key": "idProduit-idVariante", "quantity": 2}, ...]}.
+    Le stock de toutes les lignes est vérifié (et réservé) en une transaction, le panier
+    enregistré une seule fois ; la réponse donne le résultat de chaque ligne et les nouveaux totaux.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée.'}, status=405)
 
-        if item_key == key:
-            new_subtotal_decimal = item_total
+    try:
+        changes = json.loads(request.body)['changes']
+        if not isinstance(changes, list) or len(changes) > MAX_BATCH_CHANGES:
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Données invalides pour la mise à jour.'}, status=400)
 
-    if item_removed:
-        new_subtotal_decimal = Decimal('0.00')
+    cart = request.cart
+    results = []
+    keys = {}
+    quantities = {}
+    for change in changes:
+        key = change.get('key') if isinstance(change, dict) else None
+        try:
+            variant_id = variant_id_from_key(key)
+            quantity = int(change.get('quantity'))
+        except (TypeError, ValueError, AttributeError):
+            results.append({'key': key, 'status': 'invalid'})
+            continue
+        if variant_id not in cart:
+            results.append({'key': key, 'status': 'not_found'})
+            continue
+        # Une même ligne modifiée plusieurs fois : la dernière valeur l'emporte
+        keys[variant_id] = key
+        quantities[variant_id] = max(quantity, 0)
+
+    available = reserve_many(cart.ensure_token(), quantities) if quantities else {}
+
+    for variant_id, quantity in quantities.items():
+        available_stock = available[variant_id]
+        if available_stock is None:
+            # Variante supprimée du catalogue : la ligne est retirée du panier
+            cart.remove(variant_id)
+            status = 'missing'
+        elif quantity > available_stock:
+            cart.set(variant_id, available_stock)
+            status = 'short'
+        else:
+            cart.set(variant_id, quantity)
+            status = 'ok'
+        results.append({
+            'key': keys[variant_id],
+            'status': status,
+            'quantity': cart.quantity(variant_id),
+            'available': available_stock,
+            'subtotal': f"{cart.line_total(variant_id):.2f}",
+        })
 
-    # 3. Retour de la réponse JSON pour l'AJAX
     return JsonResponse({
-        'success': True,
-        'new_quantity': new_quantity,
-        # Formatage des Decimal en chaîne de caractères avec 2 décimales pour l'affichage JS
-        'new_subtotal': f"{new_subtotal_decimal:.2f}",
-        'total': f"{total_price_decimal:.2f}",
-        'cart_quantity': total_quantity
+        'success': all(result['status'] == 'ok' for result in results),
+        'lines': results,
+        'total': f"{cart.subtotal():.2f}",
+        'cart_quantity': cart.count,
     })
 
 
 # Suppression d'un article du panier (utilise la KEY complète)
-def remove_from_cart(request, key):
+@idempotent('remove_from_cart')
+async def remove_from_cart(request, key):
     """
     Retire un article du panier. Le stock N'EST PAS ré-incrémenté ici.
     """
     if request.method == 'POST':
-        cart = request.session.get('cart', {})
-
-        if key in cart:
-            try:
-                # 1. Suppression de l'article du panier
-                del cart[key]
-                request.session['cart'] = cart
-                request.session.modified = True
-
-                # 2. Recalcul des totaux
-                total_price = sum(
-                    Decimal(str(item.get('quantity', 0))) * Decimal(str(item.get('price', 0)))
-                    for item in cart.values() if isinstance(item, dict)
-                )
-                cart_quantity = sum(item.get('quantity', 0) for item in cart.values() if isinstance(item, dict))
-
-                return JsonResponse({
-                    'success': True,
-                    'total': f"{total_price:.2f}",
-                    'cart_quantity': cart_quantity,
-                    'key': key
-                })
-
-            except Exception as e:
-                return JsonResponse({'success': False, 'error': f'Erreur interne: {e}'}, status=500)
+        try:
+            variant_id = variant_id_from_key(key)
+        except ValueError:
+            variant_id = None
+
+        cart = await aget_cart(request)
+        if variant_id in cart:
+            cart.remove(variant_id)
+            await arelease(cart.token, [variant_id])
+            return JsonResponse({
+                'success': True,
+                'total': f"{cart.subtotal():.2f}",
+                'cart_quantity': cart.count,
+                'key': key
+            })
 
         return JsonResponse({'success': False, 'error': 'Clé de panier invalide'}, status=404)
 
@@ -397,74 +444,28 @@ def remove_from_cart(request, key):
 # =====================================================================================
 
 
+@idempotent('checkout')
 def checkout(request):
     # Assurez-vous que l'utilisateur est authentifié et que le panier n'est pas vide
-    if not request.session.get('cart', {}):
+    cart = request.cart
+    if not cart:
         messages.warning(request, "Votre panier est vide. Ajoutez des articles avant de commander.")
         return redirect('store')
 
-    # Récupérer les items du panier (nécessaires pour le calcul)
-    cart = request.session.get('cart', {})
-    sub_total = Decimal('0.00')
-    items_in_cart = 0
-    products_with_variants = {}
-
-    # 1. Calculer les totaux et valider les quantités
-    for key, item_data in cart.items():
-        key_parts = key.split('-')
-        product_id = key_parts[0]
-        variant_id = key_parts[1] if len(key_parts) > 1 else None
+    # 1. Résoudre toutes les lignes du panier en une seule requête (prix actuels du catalogue)
+    lines, missing = load_checkout_lines(cart)
+    if missing:
+        for variant_id in missing:
+            cart.remove(variant_id)
+        messages.error(request, "Un article de votre panier n'existe plus et a été retiré du panier.")
+        return redirect('cart')
 
-        try:
-            product = Product.objects.get(pk=product_id)
-            variant = None
-            if variant_id and variant_id != 'None':
-                variant = ProductVariant.objects.get(pk=variant_id, product=product)
-
-            # 🚨 POINT DE CONTRÔLE CRITIQUE : Si un variant est requis, il doit exister.
-            # On assume que tout article dans le panier est soit un variant, soit un produit
-            # qui doit avoir des variants. Si variant_id est donné, variant doit être trouvé.
-            if variant_id and variant_id != 'None' and not variant:
-                raise ProductVariant.DoesNotExist(f"Variante ID {variant_id} non trouvée.")
-
-            quantity = int(item_data['quantity'])
-            price = Decimal(item_data['price'])
-
-            sub_total += quantity * price
-            items_in_cart += quantity
-
-            products_with_variants[key] = {
-                'product': product,
-                'variant': variant,
-                'quantity': quantity,
-                'price': price,
-                'name': product.name + (f" ({variant.size})" if variant else '')
-            }
-
-        except Product.DoesNotExist:
-            del cart[key]
-            request.session.modified = True
-            messages.error(request, f"Le produit avec la clé {key} n'existe plus et a été retiré du panier.")
-            return redirect('cart')
-
-        except ProductVariant.DoesNotExist:
-            # Cette exception gère aussi le cas où la variante est requise mais manquante
-            del cart[key]
-            request.session.modified = True
-            messages.error(request,
-                           f"La variante spécifiée pour le produit {product.name} n'existe plus et a été retirée du panier.")
-            return redirect('cart')
-        except ValueError:
-            del cart[key]
-            request.session.modified = True
-            messages.error(request, f"Erreur de données pour le produit {product.name}. Article retiré.")
-            return redirect('cart')
+    # 2. Calculer les totaux et les coûts supplémentaires
+    totals = checkout_totals(lines)
 
-    # 2. Calculer les coûts supplémentaires
-    shipping_cost = Decimal('10.00')
-    tax_rate = Decimal('0.16')
-    tax = round(sub_total * tax_rate, 2)
-    total_price_incl_all = sub_total + shipping_cost + tax
+    # Le temps de remplir le formulaire, les réservations du panier sont prolongées
+    if request.method != 'POST':
+        renew(cart.token)
 
     # Initialiser le formulaire pour la méthode GET ou en cas d'échec POST
     form = OrderForm()
@@ -474,11 +475,6 @@ def checkout(request):
         form = OrderForm(request.POST)
 
         if form.is_valid():
-            # Nettoyage des données (Champs harmonisés)
-            full_name = form.cleaned_data['full_name']
-            phone_number = form.cleaned_data['phone_number']
-            address_line_1 = form.cleaned_data['address_line_1']
-
             # Récupérer le champ du template qui n'est pas dans OrderForm
             payment_method = request.POST.get('payment_method', 'Cash')
 
@@ -486,12 +482,14 @@ def checkout(request):
             customer_email = request.user.email if request.user.is_authenticated else "email_non_fourni@exemple.com"
 
             try:
-                # Créer l'enregistrement Order
-                new_order = Order.objects.create(
+                # Une seule transaction : stock décrémenté sous condition, commande et articles (bulk)
+                new_order = place_order(
+                    lines,
+                    cart_token=cart.token,
                     user=request.user if request.user.is_authenticated else None, # Permet à l'utilisateur d'être NULL si non connecté
-                    full_name=full_name,
-                    phone_number=phone_number,
-                    address_line_1=address_line_1,
+                    full_name=form.cleaned_data['full_name'],
+                    phone_number=form.cleaned_data['phone_number'],
+                    address_line_1=form.cleaned_data['address_line_1'],
 
                     # Nouveaux champs requis (Valeurs par défaut)
                     address_line_2="",
@@ -503,57 +501,29 @@ def checkout(request):
                     payment_method=payment_method,
 
                     # Totaux financiers
-                    total_price=sub_total,
-                    shipping_cost=shipping_cost,
-                    tax=tax,
+                    total_price=totals['sub_total'],
+                    shipping_cost=totals['shipping_cost'],
+                    tax=totals['tax'],
                 )
 
-                # 4. Créer les OrderItems
-                for key, data in products_with_variants.items():
-                    product = data['product']
-                    variant = data['variant']
-
-                    size = variant.size if variant else None
-                    #color = variant.color if variant else None  # Assurez-vous que ProductVariant a un champ 'color' si nécessaire, sinon retirez ceci.
-
-                    color_to_save = None
-
-                    OrderItem.objects.create(
-                        order=new_order,
-                        product=product,
-                        product_name=data['name'],
-                        quantity=data['quantity'],
-                        price=data['price'],
-                        size=size,
-                        color=color_to_save,
-                    )
-
-                    # -----------------------------------------------------------
-                    # CORRECTION MAJEURE: Décrémenter le stock UNIQUEMENT sur la VARIANT
-                    # -----------------------------------------------------------
-                    if variant:
-                        # Décrémenter le stock de la variante
-                        variant.stock = F('stock') - data['quantity']
-                        variant.save()  # Le problème est résolu ici
-                    else:
-                        # Si le produit n'a pas de variante, la transaction NE DEVRAIT PAS arriver ici
-                        # ou cela signifie que le produit n'a pas de stock traçable.
-                        # Pour éviter l'erreur "field 'stock' does not exist", nous allons ignorer la décrémentation
-                        # pour le produit parent, mais c'est un risque si votre logique de panier est imparfaite.
-                        # Mieux vaut Logguer une alerte si cela arrive, car la vente ne devrait pas être possible.
-                        print(
-                            f"ALERTE: Commande #{new_order.id}: Article {product.name} sans variante ignoré pour la décrémentation de stock (pas de champ 'stock' sur Product).")
-                        # messages.warning(request, f"Attention: Le stock de {product.name} n'a pas été mis à jour.")
-
                 # 5. Vider le panier après succès
-                request.session['cart'] = {}
-                request.session.modified = True
+                cart.clear()
 
                 # 6. Rediriger vers la page de confirmation
                 return redirect('confirmation', order_id=new_order.id)
 
+            except InsufficientStock as e:
+                # Aucune écriture n'a eu lieu : le panier est ramené au stock disponible
+                for line in e.lines:
+                    cart.set(line.variant.id, line.available)
+                    messages.error(request,
+                                   f"Stock insuffisant pour {line.name} : {line.quantity} demandé(s), "
+                                   f"{line.available} disponible(s). Votre panier a été ajusté.")
+                if not e.lines:
+                    messages.error(request, "Stock insuffisant pour un article de votre panier. Veuillez réessayer.")
+                return redirect('cart')
+
             except Exception as e:
-                # Cette exception capture aussi l'erreur si F('stock') échoue ou si le stock tombe en négatif (non géré ici)
                 messages.error(request,
                                f"Une erreur s'est produite lors de l'enregistrement de votre commande. Veuillez réessayer. Détail: {e}")
                 print(f"Erreur à la création de la commande: {e}")
@@ -578,12 +548,10 @@ def checkout(request):
 
     context = {
         'form': form,
-        'cart_items': products_with_variants.values(),
-        'sub_total': sub_total,
-        'shipping_cost': shipping_cost,
-        'tax': tax,
-        'total_price_incl_all': total_price_incl_all,
-        'items_in_cart': items_in_cart,
+        # Clé d'idempotence du formulaire : un double envoi ne crée qu'une commande
+        'idempotency_key': new_idempotency_key(request),
+        'cart_items': lines,
+        **totals,
     }
 
     return render(request, 'checkout.html', context)
@@ -633,6 +601,56 @@ def admin_product_create(request):
     return render(request, 'store/admin_product_form.html', context)
 
 
+@login_required
+@user_passes_test(is_staff_user, login_url='/admin/login/')
+def admin_product_import(request):
+    """
+    Import en masse du catalogue depuis un fichier CSV ou JSON envoyé par l'administrateur.
+    Le fichier est lu en flux et enregistré par lots (store/catalog_import.py) ; la page affiche
+    le nombre de lignes insérées, modifiées et inchangées.
+    """
+    report = None
+    if request.method == 'POST':
+        form = CatalogImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                file_format = form.cleaned_data['file_format'] or detect_format(upload.name)
+                # Décodage au fil de la lecture (le fichier envoyé n'est pas lu en entier)
+                stream = codecs.getreader('utf-8-sig')(upload)
+                report = import_catalog(stream, file_format, dry_run=form.cleaned_data['dry_run'])
+            except CatalogImportError as error:
+                # Interrompu en cours de route : les lots déjà validés restent enregistrés
+                report = None if form.cleaned_data['dry_run'] else error.report
+                if report:
+                    messages.error(
+                        request,
+                        f"Import interrompu après {report['rows']} lignes lues : {error} "
+                        f"Les lignes déjà importées (détail ci-dessous) restent enregistrées.",
+                    )
+                else:
+                    messages.error(request, f"Import impossible : {error}")
+            else:
+                if form.cleaned_data['dry_run']:
+                    messages.info(request, "Simulation : aucune modification n'a été enregistrée.")
+                else:
+                    messages.success(request, f"Catalogue importé : {report['rows']} lignes lues.")
+        else:
+            messages.error(request, "Veuillez choisir un fichier à importer.")
+    else:
+        form = CatalogImportForm()
+
+    context = {
+        'form': form,
+        'report': report,
+        'report_rows': report and [
+            (label, report[name]) for name, label in
+            (('categories', 'Catégories'), ('products', 'Articles'), ('variants', 'Variantes'))
+        ],
+    }
+    return render(request, 'store/admin_product_import.html', context)
+
+
 @login_required
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def admin_product_list(request):
@@ -644,31 +662,45 @@ def admin_product_list(request):
     search_query = request.GET.get('q')
 
     # 2. Construction de la QuerySet de base
-    products = Product.objects.all().prefetch_related('variants')
+    # La catégorie est jointe (affichée sur chaque ligne) ; le stock est annoté plus bas
+    products = Product.objects.all().select_related('category')
 
     # 3. Application du filtre par catégorie
     if category_id:
         products = products.filter(category__id=category_id)
 
-    # 4. Application du filtre de recherche (Nom et Description)
+    # 4. Application du filtre de recherche (Nom et Description, via l'index plein texte)
     if search_query:
-        # Utilisation de Q object pour combiner les conditions avec OR (|)
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = filter_by_search(products, search_query)
 
-    # 5. Annotation et tri (calcul du stock total)
+    # 5. Annotation (calcul du stock total), limitée aux produits de la page courante
     products = products.annotate(
         # total_variant_stock est le nom du champ qui sera utilisé dans le template
         total_variant_stock=Sum('variants__stock')
-    ).order_by('-id')
+    )
 
-    # 6. Récupérer toutes les catégories pour le sélecteur
+    # 6. Pagination par curseur sur l'id décroissant (les derniers produits créés en premier)
+    cursor = request.GET.get('after')
+    try:
+        page = paginate_keyset(products, ('-id',), cursor, settings.ADMIN_PRODUCT_PAGE_SIZE)
+    except InvalidCursor:
+        return redirect('admin_product_list')
+
+    # Liens de navigation conservant les filtres actifs
+    params = {key: value for key, value in (('category', category_id), ('q', search_query)) if value}
+    first_page_url = reverse('admin_product_list') + (f"?{urlencode(params)}" if params else '')
+    next_page_url = None
+    if page.has_next:
+        next_page_url = f"{reverse('admin_product_list')}?{urlencode({**params, 'after': page.next_cursor})}"
+
+    # 7. Récupérer toutes les catégories pour le sélecteur
     categories = Category.objects.all().order_by('name')
 
     context = {
-        'products': products,
+        'products': page,
+        'is_paginated_view': bool(cursor),
+        'first_page_url': first_page_url,
+        'next_page_url': next_page_url,
         'categories': categories,  # Pour la liste déroulante
         'selected_category': category_id,  # Pour maintenir la sélection
         'search_query': search_query,  # Pour pré-remplir la barre de recherche
@@ -817,38 +849,71 @@ def delete_category(request, category_id):
 # VUE AJAX POUR LE POLLING DU STOCK EN TEMPS RÉEL (Modifiée pour supporter l'admin)
 # =========================================================================
 
-def get_all_variant_stocks(request):
+async def get_all_variant_stocks(request):
     """
     Renvoie les données de stock adaptées à la requête (par variante OU agrégées par produit).
     - Par défaut (pas de paramètre `admin`): retourne {variant_id: stock} (pour la boutique front-end)
     - Avec paramètre `admin=true`: retourne {product_id: total_stock} (pour l'admin/catalogue)
+    - Avec `since=<version>`: seules les entrées modifiées depuis cette version sont renvoyées,
+      et une réponse 204 (corps vide) indique qu'aucun stock n'a changé.
+    La réponse contient la `version` à renvoyer dans le prochain `since`.
     """
     is_admin_request = request.GET.get('admin') == 'true'
 
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None  # Premier appel (ou curseur invalide) : état complet
+
+    # Lecture du cache uniquement : c'est tout le coût d'un polling sans changement
+    # (le total réservé est relu quand il expire : une réservation expirée change la version)
+    version = await sync_to_async(availability_version)()
+    if since is not None and since >= version:
+        return HttpResponse(status=204)
+
+    # La réponse est entièrement déterminée par (type, version, since) : si le navigateur
+    # possède déjà cette version (If-None-Match), 304 sans requête ni sérialisation.
+    etag = make_etag('stock', 'admin' if is_admin_request else 'variants', version, since)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
     if is_admin_request:
         # Stock agrégé par PRODUIT (pour la page admin_product_list)
-        product_stocks = ProductVariant.objects.filter(
-            product__is_active=True
-        ).values('product_id').annotate(
-            total_stock=Sum('stock')
-        )
-
-        # Construction du dictionnaire {product_id: total_stock}
-        stock_data = {
-            item['product_id']: item['total_stock']
-            for item in product_stocks
-        }
-
+        stock_data = await sync_to_async(product_stocks)(since)
     else:
         # Stock par VARIANTE (pour la page store/boutique)
-        active_variants = ProductVariant.objects.filter(
-            product__is_active=True
-        ).values('id', 'stock')
-
-        # Construction d'un dictionnaire {variant_id: stock}
-        stock_data = {
-            item['id']: item['stock']
-            for item in active_variants
-        }
+        stock_data = await sync_to_async(variant_stocks)(since)
+
+    response = JsonResponse({'stocks': stock_data, 'version': version})
+    response['ETag'] = etag
+    # Le navigateur garde la réponse mais la revalide à chaque appel
+    response['Cache-Control'] = 'no-cache'
+    return response
 
-    return JsonResponse({'stocks': stock_data})
+
+# =========================================================================
+# FLUX SSE DU STOCK (serveur ASGI uniquement)
+# =========================================================================
+
+async def stock_stream(request):
+    """
+    Pousse les changements de stock des variantes au navigateur (Server-Sent Events).
+    La reprise après reconnexion se fait depuis l'en-tête Last-Event-ID (version de stock).
+    """
+    if not settings.STOCK_STREAM_ENABLED:
+        return JsonResponse({'success': False, 'error': 'Flux de stock désactivé.'}, status=404)
+
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
+
+    response = StreamingHttpResponse(
+        stock_events(since, max_age=settings.STOCK_STREAM_MAX_AGE),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Désactive la mise en tampon des proxys (nginx) pour un envoi immédiat
+    response['X-Accel-Buffering'] = 'no'
+    return response